@@ -1,24 +1,200 @@
-import os
+import time
+import asyncio
+import threading
+from collections import deque
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pymongo import ReadPreference, monitoring
+from pymongo.read_preferences import read_pref_mode_from_name, make_read_preference
+from typing import Any, Dict, Optional
+from app.services.index_manager import (
+    PRODUCT_TEXT_INDEX_NAME,
+    SEARCH_TOKENS_INDEX_NAME,
+    backfill_search_tokens,
+    ensure_product_indexes
+)
+
+class DatabaseSettings(BaseSettings):
+    """MongoDB connection settings, read from MONGODB_* environment variables"""
+    model_config = SettingsConfigDict(env_prefix="MONGODB_", extra="ignore")
+
+    uri: Optional[str] = None
+    database_name: str = "dashboard-ai-data"
+    # Pool sized per worker process; min_pool_size connections are opened at startup
+    max_pool_size: int = 50
+    min_pool_size: int = 5
+    max_idle_time_ms: int = 300000
+    wait_queue_timeout_ms: int = 2000
+    # Fail fast instead of pymongo's 30s default when the cluster is unreachable
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: int = 20000
+    # Comma-separated; snappy/zstd need python-snappy/zstandard installed, zlib is built in
+    compressors: str = "zlib"
+    zlib_compression_level: int = 6
+    # The catalog is read-only for this service, so reads may go to secondaries
+    read_preference: str = "secondaryPreferred"
+
+    def client_options(self) -> Dict[str, Any]:
+        options: Dict[str, Any] = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms
+        }
+        if self.compressors:
+            options["compressors"] = self.compressors
+            options["zlibCompressionLevel"] = self.zlib_compression_level
+        return options
+
+class PoolCheckoutMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection checkout wait times. pymongo emits check-out started and
+    checked-out events on the same (executor) thread, so the start time is
+    kept per thread.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.checkouts = 0
+        self.failures = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _elapsed_ms(self) -> Optional[float]:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return None if started is None else (time.perf_counter() - started) * 1000
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = self._elapsed_ms()
+        if wait_ms is None:
+            return
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+            self._recent.append(wait_ms)
+
+    def connection_check_out_failed(self, event):
+        self._elapsed_ms()
+        with self._lock:
+            self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, failures = self.checkouts, self.failures
+            total, worst = self.total_wait_ms, self.max_wait_ms
+
+        def percentile(fraction: float) -> float:
+            return round(recent[min(len(recent) - 1, int(len(recent) * fraction))], 3) if recent else 0.0
+
+        return {
+            "checkouts": checkouts,
+            "failures": failures,
+            "avgWaitMs": round(total / checkouts, 3) if checkouts else 0.0,
+            "p50WaitMs": percentile(0.5),
+            "p99WaitMs": percentile(0.99),
+            "maxWaitMs": round(worst, 3)
+        }
+
+    # Remaining pool events are not needed for checkout timing
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_checked_in(self, event): pass
+    def connection_closed(self, event): pass
+
+pool_metrics = PoolCheckoutMetrics()
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     database = None
+    # Product reads with the configured read preference; writes, change streams
+    # and index builds go through `database` (primary)
+    products = None
+    text_index_ready: bool = False
+    search_tokens_ready: bool = False
 
 db = Database()
 
 async def get_database():
     return db.database
 
-async def connect_to_mongodb():
+async def ensure_indexes(database) -> bool:
+    """
+    Create the declared product indexes and backfill search tokens (idempotent);
+    returns whether text search is indexed by either the tokens or $text
+    """
+    ready = set()
+    try:
+        ready = await ensure_product_indexes(database["products"])
+    except Exception as error:
+        print(f"Warning: Could not ensure indexes: {error}")
+    db.text_index_ready = PRODUCT_TEXT_INDEX_NAME in ready
+    db.search_tokens_ready = False
+    if SEARCH_TOKENS_INDEX_NAME in ready:
+        try:
+            updated = await backfill_search_tokens(database["products"])
+            db.search_tokens_ready = True
+            if updated:
+                print(f"✅ Backfilled search tokens for {updated} products")
+        except Exception as error:
+            print(f"Warning: Could not backfill search tokens: {error}")
+    if not db.search_tokens_ready and not db.text_index_ready:
+        print("Warning: No search index - text search uses escaped $regex")
+    return db.search_tokens_ready or db.text_index_ready
+
+async def _ping_all(database, count: int) -> int:
+    results = await asyncio.gather(*[database.command("ping") for _ in range(count)], return_exceptions=True)
+    failures = [result for result in results if isinstance(result, Exception)]
+    if failures:
+        print(f"Warning: MongoDB pool warm-up failed: {failures[0]}")
+    return len(results) - len(failures)
+
+async def warm_up_pool(client: AsyncIOMotorClient, connections: int, read_preference=ReadPreference.PRIMARY) -> int:
+    """
+    Open `connections` pooled sockets up front (concurrent pings each check one
+    out). With a non-primary read preference the pings are repeated through it
+    for every secondary, so the servers product reads go to are warm as well.
+    """
+    if connections <= 0:
+        return 0
+    warmed = await _ping_all(client.admin, connections)
+    if read_preference != ReadPreference.PRIMARY:
+        # Known once the pings above have discovered the replica set
+        secondaries = max(1, len(client.secondaries))
+        warmed += await _ping_all(client.get_database("admin", read_preference=read_preference), connections * secondaries)
+    return warmed
+
+async def connect_to_mongodb(settings: Optional[DatabaseSettings] = None):
     """Create database connection"""
-    db.client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
-    db.database = db.client["dashboard-ai-data"]
+    settings = settings or DatabaseSettings()
+    db.client = AsyncIOMotorClient(settings.uri, event_listeners=[pool_metrics], **settings.client_options())
+    read_preference = make_read_preference(read_pref_mode_from_name(settings.read_preference), None)
+    db.database = db.client[settings.database_name]
+    db.products = db.database.get_collection("products", read_preference=read_preference)
     print("Connected to MongoDB")
+    # Pay the TCP/TLS handshakes at startup instead of on the first requests
+    warmed = await warm_up_pool(db.client, settings.min_pool_size, read_preference)
+    if warmed:
+        print(f"✅ Warmed up {warmed} MongoDB connections")
+    await ensure_indexes(db.database)
 
 async def close_mongodb_connection():
     """Close database connection"""
     if db.client:
         db.client.close()
-        print("Disconnected from MongoDB")
\ No newline at end of file
+        print("Disconnected from MongoDB")
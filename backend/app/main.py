@@ -4,15 +4,45 @@ from dotenv import load_dotenv
 # Load environment variables first, before importing other modules
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.routers import chat, recommendations, trending, insights
-from app.database import connect_to_mongodb, close_mongodb_connection
+from app.database import db, connect_to_mongodb, close_mongodb_connection, pool_metrics
+from app.services.two_stage_llm import close_openai_client
+from app.services.catalog_metadata import load_catalog_metadata
+from app.services.cache import start_cache_invalidation, stop_cache_invalidation
+from app.services.catalog_replica import start_catalog_replica, stop_catalog_replica
+from app.services.chatbot import init_chatbot, set_chatbot
+from app.services.metrics import registry, render_metrics
+from app.services.single_flight import chat_coalescer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongodb()
+    # Schema, categories and keyword mapping are read once per process
+    load_catalog_metadata()
+    # One chatbot per process, injected into the routers via get_chatbot
+    init_chatbot(db.database, db.products)
+    # Cached chat responses are dropped when product stock or price changes
+    start_cache_invalidation(db.database)
+    # Optional in-process product snapshot (CATALOG_REPLICA_ENABLED)
+    await start_catalog_replica(db.database)
+    
+    yield
+    
+    await stop_cache_invalidation()
+    await stop_catalog_replica()
+    set_chatbot(None)
+    await close_mongodb_connection()
+    await close_openai_client()
 
 app = FastAPI(
     title="IT Store Chatbot API",
     description="AI-powered chatbot API for IT equipment store",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -28,14 +58,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.on_event("startup")
-async def startup_event():
-    await connect_to_mongodb()
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    await close_mongodb_connection()
-
 # Include routers
 app.include_router(chat.router, prefix="/api", tags=["chat"])
 app.include_router(recommendations.router, prefix="/api", tags=["recommendations"])
@@ -48,4 +70,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy", "mongoPool": pool_metrics.stats()}
+
+# Connection pool checkout stats, read at scrape time
+registry.gauge_callback("mongo_pool_checkouts", "Connection checkouts since start", lambda: pool_metrics.stats()["checkouts"])
+registry.gauge_callback("mongo_pool_checkout_failures", "Failed connection checkouts since start", lambda: pool_metrics.stats()["failures"])
+registry.gauge_callback("mongo_pool_checkout_wait_p99_seconds", "p99 checkout wait over recent checkouts", lambda: pool_metrics.stats()["p99WaitMs"] / 1000)
+# Chat pipeline runs shared by identical concurrent requests
+registry.gauge_callback("chatbot_coalescing_in_flight", "Chat pipeline runs currently shared by identical requests", lambda: chat_coalescer.stats()["inFlight"])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage timings, Mongo query timings and LLM token counts in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
\ No newline at end of file
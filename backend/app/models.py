@@ -60,6 +60,67 @@ class Product(BaseModel):
         populate_by_name = True
         json_encoders = {ObjectId: str}
 
+def _required_text(doc: Dict[str, Any], field: str, default: str = "") -> str:
+    value = doc.get(field, default)
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string, got {type(value).__name__}")
+    return value
+
+class ProductRecord:
+    """
+    Lightweight product row used inside the search/ranking pipeline.
+
+    Built straight from Mongo documents with the same coercions the old
+    Product(**data) path applied, but no Pydantic validation and no nested
+    Images models; images stay raw. Only the products actually returned
+    are converted with to_product().
+    """
+    FIELDS = (
+        "id", "title", "description", "cateName", "price", "salePrice", "stockQuantity",
+        "rating", "totalReviews", "productView", "images", "freeShipping",
+        "product_warranty_2_year", "product_warranty_3_year", "categoryId", "cateId", "productCode"
+    )
+    # complete=False: built from the slim ranking projection (truncated description, no images)
+    __slots__ = FIELDS + ("complete",)
+
+    def __init__(self, complete: bool = True, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        self.complete = complete
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any], complete: bool = True) -> "ProductRecord":
+        """Raises ValueError/TypeError for documents Product would reject"""
+        if doc.get("_id") is None:
+            raise ValueError("product without _id")
+        record = cls.__new__(cls)
+        record.complete = complete
+        record.id = str(doc["_id"])
+        record.title = _required_text(doc, "title")
+        record.description = _required_text(doc, "description")
+        record.cateName = _required_text(doc, "cateName")
+        record.price = float(doc.get("price", 0))
+        record.salePrice = float(doc.get("salePrice", 0))
+        record.stockQuantity = int(doc.get("stockQuantity", 0))
+        record.rating = float(doc.get("rating", 0))
+        record.totalReviews = int(doc.get("totalReviews", 0))
+        record.productView = int(doc.get("productView", 0))
+        record.images = doc.get("images", {})
+        record.freeShipping = doc.get("freeShipping", False)
+        record.product_warranty_2_year = doc.get("product_warranty_2_year")
+        record.product_warranty_3_year = doc.get("product_warranty_3_year")
+        record.categoryId = doc.get("categoryId")
+        record.cateId = doc.get("cateId")
+        record.productCode = doc.get("productCode", "")
+        return record
+
+    def to_product(self) -> Product:
+        """Full Product validation - only at the response boundary"""
+        return Product.model_validate({name: getattr(self, name) for name in self.FIELDS})
+
+    def __repr__(self) -> str:
+        return f"ProductRecord(id={self.id!r}, title={self.title!r})"
+
 class Budget(BaseModel):
     min: Optional[float] = None
     max: Optional[float] = None
@@ -86,6 +147,8 @@ class ChatResponse(BaseModel):
     entities: Optional[ExtractedEntities] = None
     queryReasoning: Optional[str] = None
     mongoQuery: Optional[Dict[str, Any]] = None  # เพิ่ม MongoDB query ที่ LLM สร้างขึ้น
+    stage1Path: Optional[str] = None  # rule_based / llm / memo / fallback
+    searchTier: Optional[str] = None  # primary / no_budget / category / text_search / text_substring
     success: bool
 
 class RecommendationRequest(BaseModel):
@@ -1,7 +1,11 @@
+import json
+from typing import Any, AsyncIterator, Awaitable, Dict
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from app.models import ChatRequest, ChatResponse, ExtractedEntities, Budget
-from app.database import get_database
-from app.services.chatbot import ITStoreChatbot
+from app.services.chatbot import STAGE3_ANSWER_HEADING, ITStoreChatbot, get_chatbot
+from app.services import cache, single_flight
 
 router = APIRouter()
 
@@ -25,32 +29,71 @@ def convert_stage1_to_entities(stage1_data: dict) -> ExtractedEntities:
         intent="two_stage_analysis"
     )
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest, db=Depends(get_database)):
+def build_chat_response(result: Dict[str, Any]) -> ChatResponse:
+    """ChatResponse from a chatbot result dict"""
+    # Convert stage1 data to entities format for backward compatibility
+    entities = None
+    if result.get("stage1"):
+        entities = convert_stage1_to_entities(result["stage1"])
+    
+    return ChatResponse(
+        message=result["response"],
+        products=result["products"],
+        reasoning=result["reasoning"],
+        entities=entities,
+        queryReasoning=result["queryReasoning"],
+        mongoQuery=result["mongoQuery"],
+        stage1Path=result.get("stage1Path"),
+        searchTier=result.get("searchTier"),
+        success=True
+    )
+
+def cache_entry(response: ChatResponse, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cached form of a response. The Stage 3 answer is also kept on its own so a
+    stream replay can send it as answer events, like a live stream does.
+    """
+    return {**response.model_dump(), "stage3Answer": result.get("stage3Answer") or ""}
+
+def is_reusable_result(result: Dict[str, Any]) -> bool:
+    """Error results are neither cached nor handed to coalesced requests after the run"""
+    return result.get("searchMethod") != "error"
+
+# ChatResponse is already validated when built, so FastAPI only serializes it
+# (response_model=None) instead of dumping and re-validating every product
+@router.post("/chat", response_model=None, responses={200: {"model": ChatResponse}})
+async def chat_endpoint(request: ChatRequest, chatbot: ITStoreChatbot = Depends(get_chatbot)):
     try:
         if not request.message:
             raise HTTPException(status_code=400, detail="Message is required")
         
-        # Initialize chatbot with database
-        chatbot = ITStoreChatbot(db)
+        # Repeated queries are answered from the response cache - no Mongo or LLM calls
+        cache_key = None
+        if cache.RESPONSE_CACHE_ENABLED or single_flight.CHAT_COALESCING_ENABLED:
+            cache_key = cache.build_response_cache_key(request.message)
+        if cache.RESPONSE_CACHE_ENABLED:
+            cached = cache.response_cache.get(cache_key)
+            if cached is not None:
+                print("[Cache] Response cache hit")
+                return ChatResponse(**cached)
         
-        # Process user input with comprehensive chatbot system
-        result = await chatbot.process_user_input(request.message)
+        # Process user input with comprehensive chatbot system; identical
+        # concurrent queries share one run
+        if single_flight.CHAT_COALESCING_ENABLED:
+            result = await single_flight.chat_coalescer.run(
+                cache_key,
+                lambda: chatbot.process_user_input(request.message),
+                keep=is_reusable_result
+            )
+        else:
+            result = await chatbot.process_user_input(request.message)
+        response = build_chat_response(result)
         
-        # Convert stage1 data to entities format for backward compatibility
-        entities = None
-        if result.get("stage1"):
-            entities = convert_stage1_to_entities(result["stage1"])
+        # Don't cache the chatbot's error responses
+        if cache.RESPONSE_CACHE_ENABLED and is_reusable_result(result):
+            cache.response_cache.set(cache_key, cache_entry(response, result))
         
-        return ChatResponse(
-            message=result["response"],
-            products=result["products"],
-            reasoning=result["reasoning"],
-            entities=entities,
-            queryReasoning=result["queryReasoning"],
-            mongoQuery=result["mongoQuery"],
-            success=True
-        )
+        return response
     except Exception as error:
         print(f"API Error: {error}")
         return ChatResponse(
@@ -61,4 +104,135 @@ async def chat_endpoint(request: ChatRequest, db=Depends(get_database)):
             queryReasoning=None,
             mongoQuery=None,
             success=False
-        )
\ No newline at end of file
+        )
+
+def sse_event(event: str, data: Any) -> str:
+    """One Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+def stage1_event_data(stage1_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "mongoQuery": stage1_result.get("query"),
+        "entities": convert_stage1_to_entities(stage1_result),
+        "queryReasoning": stage1_result.get("reasoning"),
+        "stage1Path": stage1_result.get("stage1Path")
+    }
+
+def replay_cached_events(cached: ChatResponse, answer: str = "") -> AsyncIterator[str]:
+    """
+    A cached response sent as the same event sequence as a live stream, in one
+    go: the response text as a token event, then the Stage 3 answer (appended
+    to the cached message) as an answer event
+    """
+    text = cached.message
+    if answer and text.endswith(STAGE3_ANSWER_HEADING + answer):
+        text = text[:-len(STAGE3_ANSWER_HEADING + answer)]
+    else:
+        answer = ""
+    
+    async def events():
+        yield sse_event("stage1", {
+            "mongoQuery": cached.mongoQuery,
+            "entities": cached.entities,
+            "queryReasoning": cached.queryReasoning,
+            "stage1Path": cached.stage1Path
+        })
+        yield sse_event("products", {"products": cached.products, "searchTier": cached.searchTier})
+        yield sse_event("token", {"text": text})
+        if answer:
+            yield sse_event("answer", {"text": answer})
+        yield sse_event("done", {"reasoning": cached.reasoning, "success": True, "cached": True})
+    return events()
+
+async def replay_shared_events(shared: Awaitable[Dict[str, Any]]) -> AsyncIterator[str]:
+    """An identical /chat run already in flight, sent as a replayed event sequence when it finishes"""
+    try:
+        result = await shared
+        # The chatbot reports pipeline failures as an error result, not an exception
+        if not is_reusable_result(result):
+            raise RuntimeError(result.get("error") or "shared chat run failed")
+        response = build_chat_response(result)
+    except Exception as error:
+        print(f"API Stream Error: {error}")
+        yield sse_event("error", {
+            "message": "ขออภัย เกิดข้อผิดพลาดในการค้นหาสินค้า กรุณาลองใหม่อีกครั้ง 🔧",
+            "success": False
+        })
+        return
+    async for frame in replay_cached_events(response, result.get("stage3Answer") or ""):
+        yield frame
+
+async def stream_chat_events(message: str, chatbot: ITStoreChatbot) -> AsyncIterator[str]:
+    """
+    Events for /chat/stream: stage1 -> products -> token* -> answer* -> done
+    (or error). The Stage 3 answer chunks follow the response tokens; both
+    are included in the cached /chat message, and the answer is also cached
+    on its own for stream replays.
+    """
+    cache_key = cache.build_response_cache_key(message) if cache.RESPONSE_CACHE_ENABLED else None
+    try:
+        async for event, data in chatbot.stream_user_input(message):
+            if event == "stage1":
+                yield sse_event("stage1", stage1_event_data(data))
+            elif event == "products":
+                yield sse_event("products", data)
+            elif event in ("token", "answer"):
+                yield sse_event(event, {"text": data})
+            elif event == "result":
+                response = build_chat_response(data)
+                if cache_key is not None:
+                    cache.response_cache.set(cache_key, cache_entry(response, data))
+                yield sse_event("done", {"reasoning": response.reasoning, "success": True})
+    except Exception as error:
+        print(f"API Stream Error: {error}")
+        yield sse_event("error", {
+            "message": "ขออภัย เกิดข้อผิดพลาดในการค้นหาสินค้า กรุณาลองใหม่อีกครั้ง 🔧",
+            "success": False
+        })
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, chatbot: ITStoreChatbot = Depends(get_chatbot)):
+    """Server-Sent Events variant of /chat: query, product cards, then streamed text"""
+    if not request.message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    
+    events = None
+    cache_key = None
+    if cache.RESPONSE_CACHE_ENABLED or single_flight.CHAT_COALESCING_ENABLED:
+        cache_key = cache.build_response_cache_key(request.message)
+    if cache.RESPONSE_CACHE_ENABLED:
+        cached = cache.response_cache.get(cache_key)
+        if cached is not None:
+            print("[Cache] Response cache hit (stream)")
+            events = replay_cached_events(ChatResponse(**cached), cached.get("stage3Answer", ""))
+    # Streams don't start shared runs, but join an identical /chat run in flight
+    if events is None and single_flight.CHAT_COALESCING_ENABLED:
+        shared = single_flight.chat_coalescer.join(cache_key)
+        if shared is not None:
+            print("[Coalescing] Joined in-flight chat run (stream)")
+            events = replay_shared_events(shared)
+    if events is None:
+        events = stream_chat_events(request.message, chatbot)
+    
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Disable proxy buffering so each event is flushed immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/chat/cache/stats")
+async def chat_cache_stats():
+    """Response cache hit/miss counters"""
+    return cache.response_cache.stats()
+
+@router.get("/chat/coalescing/stats")
+async def chat_coalescing_stats():
+    """Requests collapsed onto an identical in-flight (or just finished) chat run"""
+    return single_flight.chat_coalescer.stats()
+
+@router.delete("/chat/cache")
+async def clear_chat_cache():
+    """Drop every cached chat response"""
+    removed = cache.invalidate_response_cache("api")
+    return {"removed": removed}
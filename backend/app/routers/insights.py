@@ -1,7 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.models import InsightsRequest
-from app.database import get_database
-from app.services.chatbot import ITStoreChatbot
+from app.services.chatbot import ITStoreChatbot, get_chatbot
 from typing import Dict, Any
 
 router = APIRouter()
@@ -9,10 +8,9 @@ router = APIRouter()
 @router.post("/insights")
 async def get_search_insights(
     request: InsightsRequest,
-    db=Depends(get_database)
+    chatbot: ITStoreChatbot = Depends(get_chatbot)
 ) -> Dict[str, Any]:
     try:
-        chatbot = ITStoreChatbot(db)
         insights = await chatbot.get_search_insights(request.query)
         return insights
     except Exception as error:
@@ -1,19 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends
 from app.models import RecommendationRequest, Product
-from app.database import get_database
-from app.services.chatbot import ITStoreChatbot
+from app.services.chatbot import ITStoreChatbot, get_chatbot
 from bson import ObjectId
 from typing import List
 
 router = APIRouter()
 
 @router.post("/recommendations", response_model=List[Product])
-async def get_recommendations(request: RecommendationRequest, db=Depends(get_database)):
+async def get_recommendations(request: RecommendationRequest, chatbot: ITStoreChatbot = Depends(get_chatbot)):
     try:
-        chatbot = ITStoreChatbot(db)
-        
         # Get the current product first
-        current_product_data = await db["product_details"].find_one(
+        current_product_data = await chatbot.database["product_details"].find_one(
             {"_id": ObjectId(request.productId)}
         )
         
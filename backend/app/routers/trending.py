@@ -1,7 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from app.models import Product
-from app.database import get_database
-from app.services.chatbot import ITStoreChatbot
+from app.services.chatbot import ITStoreChatbot, get_chatbot
 from typing import List
 
 router = APIRouter()
@@ -9,10 +8,9 @@ router = APIRouter()
 @router.get("/trending", response_model=List[Product])
 async def get_trending_products(
     limit: int = Query(default=10, ge=1, le=50),
-    db=Depends(get_database)
+    chatbot: ITStoreChatbot = Depends(get_chatbot)
 ):
     try:
-        chatbot = ITStoreChatbot(db)
         trending_products = await chatbot.get_trending_products(limit)
         return trending_products
     except Exception as error:
@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+from app.services.text_normalizer import normalize_text
+from app.services import single_flight
+
+# Full chat response cache settings
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+
+# Product fields whose change makes cached responses stale
+PRICE_STOCK_FIELDS = ("stockQuantity", "salePrice", "price")
+
+class TTLCache:
+    """In-process cache with per-entry TTL and LRU eviction"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        if self._entries.pop(key, None) is None:
+            return False
+        self.invalidations += 1
+        return True
+
+    def clear(self) -> int:
+        """Drop every entry, returning how many were removed"""
+        removed = len(self._entries)
+        self._entries.clear()
+        self.invalidations += removed
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+def build_response_cache_key(user_input: str) -> str:
+    """
+    Cache key for a chat message: the normalized text, so spelling/spacing/case
+    variants share one entry (segmentation is a function of the same text)
+    """
+    return ' '.join(normalize_text(user_input).split())
+
+# Process-wide cache of ChatResponse payloads
+response_cache = TTLCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+
+def invalidate_response_cache(reason: str = "manual") -> int:
+    removed = response_cache.clear()
+    # Results kept for the coalescing window are just as stale
+    single_flight.chat_coalescer.clear()
+    print(f"🔄 Response cache invalidated ({reason}) - {removed} entries removed")
+    return removed
+
+def product_change_pipeline() -> list:
+    """Change stream filter: inserts/deletes/replaces and updates touching price or stock"""
+    return [{
+        "$match": {
+            "$or": [{"operationType": {"$in": ["insert", "delete", "replace"]}}] + [
+                {f"updateDescription.updatedFields.{field}": {"$exists": True}}
+                for field in PRICE_STOCK_FIELDS
+            ]
+        }
+    }]
+
+async def watch_product_changes(collection):
+    """
+    Clear the response cache whenever product stock or price changes.
+    Change streams need a replica set; on a standalone server the watcher
+    stops with a warning and cached entries simply expire by TTL.
+    """
+    try:
+        async with collection.watch(product_change_pipeline()) as stream:
+            print("✅ Watching product changes for response cache invalidation")
+            async for change in stream:
+                invalidate_response_cache(change.get("operationType", "change"))
+    except asyncio.CancelledError:
+        raise
+    except Exception as error:
+        print(f"Warning: Product change stream unavailable ({error}) - response cache relies on TTL only")
+
+_watch_task: Optional[asyncio.Task] = None
+
+def start_cache_invalidation(database):
+    """Start the product change watcher (called at startup)"""
+    global _watch_task
+    if not RESPONSE_CACHE_ENABLED or database is None:
+        return None
+    _watch_task = asyncio.create_task(watch_product_changes(database["products"]))
+    return _watch_task
+
+async def stop_cache_invalidation():
+    global _watch_task
+    if _watch_task is not None:
+        _watch_task.cancel()
+        try:
+            await _watch_task
+        except asyncio.CancelledError:
+            pass
+        _watch_task = None
@@ -0,0 +1,237 @@
+import os
+import json
+import hashlib
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+# backend/ directory - data files are resolved relative to it first, so loading
+# does not depend on the process working directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def _candidate_paths(filename: str) -> List[str]:
+    """Paths probed for a metadata file, most specific first"""
+    return [
+        os.path.join(BACKEND_DIR, filename),
+        f'backend/{filename}',
+        f'../backend/{filename}',
+        f'./{filename}',
+        filename
+    ]
+
+def _load_json_file(filename: str) -> Tuple[Optional[Any], Optional[str]]:
+    """Load the first existing copy of a JSON file, returning (data, path)"""
+    for path in _candidate_paths(filename):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f), path
+        except FileNotFoundError:
+            continue
+    return None, None
+
+# Load database schema and categories
+def load_database_schema():
+    """Load actual database schema and categories"""
+    schema_data = {}
+    categories_data = []
+    keyword_mapping = {}
+
+    # Load schema.json
+    try:
+        data, path = _load_json_file('schema.json')
+        if data is not None:
+            schema_data = data
+            print(f"✅ Loaded schema from {path}")
+    except Exception as e:
+        print(f"Warning: Could not load schema.json: {e}")
+
+    # Load navigation_attributes.json
+    try:
+        data, path = _load_json_file('navigation_attributes.json')
+        if data is not None:
+            categories_data = data.get('cateName', [])
+            print(f"✅ Loaded {len(categories_data)} categories from {path}")
+    except Exception as e:
+        print(f"Warning: Could not load navigation_attributes.json: {e}")
+
+    # Load keyword_to_cateName.json
+    try:
+        data, path = _load_json_file('keyword_to_cateName.json')
+        if data is not None:
+            # ใช้ categoryMapping structure ตาม user requirement
+            keyword_mapping = data.get("categoryMapping", data)
+            print(f"✅ Loaded keyword mapping from {path}")
+    except Exception as e:
+        print(f"Warning: Could not load keyword_to_cateName.json: {e}")
+
+    return schema_data, categories_data, keyword_mapping
+
+# Comprehensive Thai-English category mapping
+def get_comprehensive_category_mapping() -> Dict[str, List[str]]:
+    """Enhanced category mapping with comprehensive Thai terms"""
+    return {
+        # Notebook/Laptop categories
+        'โน้ตบุ๊ก': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
+        'โนตบุ๊ก': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
+        'โน๊ตบุ๊ค': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
+        'โนคบุค': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
+        'laptop': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
+
+        # Computer categories - crucial for Thai context
+        'คอมพิวเตอร์': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
+        'คอม': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
+        'คอมตั้งโต๊ะ': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC'],
+        'เครื่อง': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
+        'desktop': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC'],
+        'pc': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
+
+        # Graphics cards
+        'การ์ดจอ': ['Graphics Cards'],
+        'การ์จอ': ['Graphics Cards'],
+        'กราฟิก': ['Graphics Cards'],
+        'การ์ด': ['Graphics Cards'],
+        'วีจีเอ': ['Graphics Cards'],
+        'vga': ['Graphics Cards'],
+        'graphics': ['Graphics Cards'],
+
+        # Input devices
+        'คีย์บอร์ด': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
+        'คีบอร์ด': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
+        'คีบอด': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
+        'keyboard': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
+
+        'เมาส์': ['Mouse', 'Gaming Mouse', 'Wireless Mouse'],
+        'เม้าส์': ['Mouse', 'Gaming Mouse', 'Wireless Mouse'],
+        'mouse': ['Mouse', 'Gaming Mouse', 'Wireless Mouse'],
+
+        # Display
+        'จอ': ['Monitor'],
+        'มอนิเตอร์': ['Monitor'],
+        'จอมอนิเตอร์': ['Monitor'],
+        'หน้าจอ': ['Monitor'],
+        'monitor': ['Monitor'],
+
+        # Components
+        'ซีพียู': ['CPU'],
+        'โปรเซสเซอร์': ['CPU'],
+        'cpu': ['CPU'],
+        'processor': ['CPU'],
+
+        'แรม': ['RAM'],
+        'หน่วยความจำ': ['RAM'],
+        'ความจำ': ['RAM'],
+        'ram': ['RAM'],
+        'memory': ['RAM'],
+
+        # Audio
+        'หูฟัง': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
+        'เฮดโฟน': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
+        'เฮดเซต': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
+        'headphone': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
+        'headset': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
+
+        'สปีกเกอร์': ['Speaker'],
+        'speaker': ['Speaker'],
+
+        # Storage
+        'ฮาร์ดดิสก์': ['Hard Drive & Solid State Drive'],
+        'ฮาร์ด': ['Hard Drive & Solid State Drive'],
+        'เอสเอสดี': ['Hard Drive & Solid State Drive'],
+        'ssd': ['Hard Drive & Solid State Drive'],
+        'hdd': ['Hard Drive & Solid State Drive']
+    }
+
+def _freeze_mapping(mapping: Dict[str, List[str]]) -> Mapping[str, Tuple[str, ...]]:
+    return MappingProxyType({key: tuple(values) for key, values in mapping.items()})
+
+def build_keyword_index(keyword_mapping: Dict[str, List[str]], category_mapping: Dict[str, List[str]], categories: List[str]) -> Dict[str, Tuple[str, ...]]:
+    """Merge both keyword mappings, dropping categories the catalog doesn't have (unless none are loaded)"""
+    known = set(categories)
+    index: Dict[str, Tuple[str, ...]] = {}
+    for mapping in (keyword_mapping, category_mapping):
+        for keyword, mapped in mapping.items():
+            key = keyword.lower().strip()
+            if not key or key in index:
+                continue
+            kept = tuple(category for category in mapped if not known or category in known)
+            if kept:
+                index[key] = kept
+    return index
+
+@dataclass(frozen=True)
+class CatalogMetadata:
+    """Immutable catalog metadata shared by every request in the process"""
+    schema: Mapping[str, Any]
+    categories: Tuple[str, ...]
+    category_set: FrozenSet[str]
+    keyword_mapping: Mapping[str, Tuple[str, ...]]
+    category_mapping: Mapping[str, Tuple[str, ...]]
+    actual_fields: Tuple[str, ...]
+    # Lowercased keyword -> known categories from both mappings (keyword file wins),
+    # used to preselect the categories a Stage 1 prompt needs
+    keyword_index: Mapping[str, Tuple[str, ...]]
+
+    # Pre-serialized prompt fragments for Stage 1
+    fields_str: str
+    categories_str: str
+    mapping_str: str
+    keyword_str: str
+
+    # Hash of everything above - changes whenever the metadata files change
+    version: str
+
+def build_catalog_metadata() -> CatalogMetadata:
+    """Read schema, categories and keyword mapping from disk and precompute derived data"""
+    schema_data, categories_data, keyword_mapping = load_database_schema()
+    category_mapping = get_comprehensive_category_mapping()
+
+    actual_fields = []
+    if schema_data and 'properties' in schema_data:
+        actual_fields = list(schema_data['properties'].keys())
+
+    keyword_index = build_keyword_index(keyword_mapping, category_mapping, categories_data)
+
+    fields_str = str(actual_fields)
+    categories_str = json.dumps(categories_data, ensure_ascii=False)
+    mapping_str = json.dumps(category_mapping, ensure_ascii=False, indent=2)
+    keyword_str = json.dumps(keyword_mapping, ensure_ascii=False, indent=2)
+
+    digest = hashlib.sha256()
+    for fragment in (json.dumps(schema_data, ensure_ascii=False, sort_keys=True), fields_str, categories_str, mapping_str, keyword_str):
+        digest.update(fragment.encode('utf-8'))
+        digest.update(b'\0')
+
+    return CatalogMetadata(
+        schema=MappingProxyType(schema_data),
+        categories=tuple(categories_data),
+        category_set=frozenset(categories_data),
+        keyword_mapping=_freeze_mapping(keyword_mapping),
+        category_mapping=_freeze_mapping(category_mapping),
+        actual_fields=tuple(actual_fields),
+        keyword_index=MappingProxyType(keyword_index),
+        fields_str=fields_str,
+        categories_str=categories_str,
+        mapping_str=mapping_str,
+        keyword_str=keyword_str,
+        version=digest.hexdigest()[:16]
+    )
+
+_catalog_metadata: Optional[CatalogMetadata] = None
+
+def load_catalog_metadata() -> CatalogMetadata:
+    """Build catalog metadata and install it as the process-wide instance (called at startup)"""
+    global _catalog_metadata
+    _catalog_metadata = build_catalog_metadata()
+    return _catalog_metadata
+
+def reload_catalog_metadata() -> CatalogMetadata:
+    """Explicit reload hook - re-read the metadata files and swap in a new instance"""
+    metadata = load_catalog_metadata()
+    print(f"🔄 Reloaded catalog metadata ({len(metadata.categories)} categories)")
+    return metadata
+
+def get_catalog_metadata() -> CatalogMetadata:
+    """Return the process-wide catalog metadata, loading it on first use"""
+    if _catalog_metadata is None:
+        return load_catalog_metadata()
+    return _catalog_metadata
@@ -0,0 +1,234 @@
+import os
+import re
+import asyncio
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Optional in-process catalog snapshot - off unless CATALOG_REPLICA_ENABLED=true
+CATALOG_REPLICA_ENABLED = os.getenv("CATALOG_REPLICA_ENABLED", "false").lower() == "true"
+CATALOG_REPLICA_REFRESH_SECONDS = float(os.getenv("CATALOG_REPLICA_REFRESH_SECONDS", "300"))
+
+# Fields kept per product (same projection the chatbot reads from Mongo)
+REPLICA_PROJECTION = {
+    "_id": 1,
+    "title": 1,
+    "description": 1,
+    "cateName": 1,
+    "price": 1,
+    "salePrice": 1,
+    "stockQuantity": 1,
+    "rating": 1,
+    "totalReviews": 1,
+    "productView": 1,
+    "images": 1,
+    "freeShipping": 1,
+    "product_warranty_2_year": 1,
+    "product_warranty_3_year": 1,
+    "categoryId": 1,
+    "cateId": 1,
+    "productCode": 1
+}
+
+_TOKEN = re.compile(r'[a-z0-9\u0e00-\u0e7f]+')
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+class UnsupportedQuery(Exception):
+    """Query uses operators the replica does not evaluate - run it against Mongo instead"""
+
+class CatalogReplica:
+    """
+    Read-only product snapshot with secondary indexes.
+
+    Documents are stored in popularity order (productView, rating,
+    totalReviews - the chatbot's Mongo sort), so every index is a set of
+    positions and a query result is just its smallest positions.
+    """
+
+    def __init__(self, documents: Iterable[Dict[str, Any]]):
+        self.documents = sorted(
+            documents,
+            key=lambda doc: (_number(doc.get("productView")), _number(doc.get("rating")), _number(doc.get("totalReviews"))),
+            reverse=True
+        )
+        self.in_stock: Set[int] = set()
+        self.by_category: Dict[str, Set[int]] = {}
+        self.tokens: Dict[str, Set[int]] = {}
+        self.search_text: List[str] = []
+
+        for position, doc in enumerate(self.documents):
+            if _number(doc.get("stockQuantity")) > 0:
+                self.in_stock.add(position)
+            self.by_category.setdefault(doc.get("cateName", ""), set()).add(position)
+
+            text = f"{doc.get('title', '')}\n{doc.get('description', '')}".lower()
+            self.search_text.append(text)
+            for token in _TOKEN.findall(text):
+                self.tokens.setdefault(token, set()).add(position)
+
+        # Sorted salePrice array for range lookups
+        by_price = sorted(range(len(self.documents)), key=lambda position: _number(self.documents[position].get("salePrice")))
+        self.price_positions = by_price
+        self.prices = [_number(self.documents[position].get("salePrice")) for position in by_price]
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    # --- clause evaluation ---
+
+    def _stock_clause(self, condition: Any) -> Set[int]:
+        if condition == {"$gt": 0} or condition == {"$gte": 1}:
+            return self.in_stock
+        raise UnsupportedQuery(f"stockQuantity {condition}")
+
+    def _category_clause(self, condition: Any) -> Set[int]:
+        if isinstance(condition, str):
+            return self.by_category.get(condition, set())
+        if isinstance(condition, dict) and set(condition) == {"$in"}:
+            positions: Set[int] = set()
+            for category in condition["$in"]:
+                positions |= self.by_category.get(category, set())
+            return positions
+        raise UnsupportedQuery(f"cateName {condition}")
+
+    def _price_clause(self, condition: Any) -> Set[int]:
+        if not isinstance(condition, dict) or not condition or not set(condition) <= {"$lte", "$lt", "$gte", "$gt"}:
+            raise UnsupportedQuery(f"salePrice {condition}")
+        low, high = 0, len(self.prices)
+        if "$gte" in condition:
+            low = max(low, bisect_left(self.prices, float(condition["$gte"])))
+        if "$gt" in condition:
+            low = max(low, bisect_right(self.prices, float(condition["$gt"])))
+        if "$lte" in condition:
+            high = min(high, bisect_right(self.prices, float(condition["$lte"])))
+        if "$lt" in condition:
+            high = min(high, bisect_left(self.prices, float(condition["$lt"])))
+        return set(self.price_positions[low:high])
+
+    def _regex_positions(self, pattern: str) -> Set[int]:
+        """Positions whose title/description matches a case-insensitive pattern"""
+        alternatives = pattern.lower().split('|')
+        if not all(_TOKEN.fullmatch(alternative) for alternative in alternatives):
+            compiled = re.compile(pattern, re.IGNORECASE)
+            return {position for position, text in enumerate(self.search_text) if compiled.search(text)}
+
+        # Plain words can't span tokens - scan the vocabulary, not the documents
+        positions: Set[int] = set()
+        for token, postings in self.tokens.items():
+            if any(alternative in token for alternative in alternatives):
+                positions |= postings
+        return positions
+
+    def _text_clause(self, alternatives: Any) -> Set[int]:
+        """The fallback text-search shape: $or of title/description $regex with the "i" option"""
+        positions: Set[int] = set()
+        for clause in alternatives:
+            if not isinstance(clause, dict) or len(clause) != 1:
+                raise UnsupportedQuery("$or clause")
+            (field, condition), = clause.items()
+            if field not in ("title", "description") or not isinstance(condition, dict) \
+                    or set(condition) - {"$regex", "$options"} or condition.get("$options", "i") != "i":
+                raise UnsupportedQuery(f"$or {field}")
+            positions |= self._regex_positions(condition["$regex"])
+        return positions
+
+    def _text_search_clause(self, condition: Any) -> Set[int]:
+        """$text search: any search word equal to a title/description token"""
+        if not isinstance(condition, dict) or set(condition) != {"$search"}:
+            raise UnsupportedQuery(f"$text {condition}")
+        positions: Set[int] = set()
+        for word in _TOKEN.findall(condition["$search"].lower()):
+            positions |= self.tokens.get(word, set())
+        return positions
+
+    def _search_tokens_clause(self, condition: Any) -> Set[int]:
+        """searchTokens $in: title/description words containing any of the trigrams"""
+        if not isinstance(condition, dict) or set(condition) != {"$in"}:
+            raise UnsupportedQuery(f"searchTokens {condition}")
+        grams = [gram for gram in condition["$in"] if gram is not None]
+        if not all(_TOKEN.fullmatch(gram) for gram in grams):
+            return {position for position, text in enumerate(self.search_text) if any(gram in text for gram in grams)}
+        positions: Set[int] = set()
+        for token, postings in self.tokens.items():
+            if any(gram in token for gram in grams):
+                positions |= postings
+        return positions
+
+    def match(self, query: Dict[str, Any]) -> List[int]:
+        """Positions matching the query, most popular first (raises UnsupportedQuery)"""
+        clauses = []
+        for field, condition in query.items():
+            if field == "stockQuantity":
+                clauses.append(self._stock_clause(condition))
+            elif field == "cateName":
+                clauses.append(self._category_clause(condition))
+            elif field == "salePrice":
+                clauses.append(self._price_clause(condition))
+            elif field == "$or":
+                clauses.append(self._text_clause(condition))
+            elif field == "$text":
+                clauses.append(self._text_search_clause(condition))
+            elif field == "searchTokens":
+                clauses.append(self._search_tokens_clause(condition))
+            else:
+                raise UnsupportedQuery(field)
+
+        if not clauses:
+            return list(range(len(self.documents)))
+        clauses.sort(key=len)
+        positions = set(clauses[0])
+        for clause in clauses[1:]:
+            positions &= clause
+        return sorted(positions)
+
+    def find(self, query: Dict[str, Any], limit: int = 50) -> List[Dict[str, Any]]:
+        return [self.documents[position] for position in self.match(query)[:limit]]
+
+_catalog_replica: Optional[CatalogReplica] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+def get_catalog_replica() -> Optional[CatalogReplica]:
+    """Current snapshot, or None when the replica is disabled or not loaded yet"""
+    return _catalog_replica
+
+def set_catalog_replica(replica: Optional[CatalogReplica]):
+    global _catalog_replica
+    _catalog_replica = replica
+
+async def load_catalog_replica(collection) -> Optional[CatalogReplica]:
+    """Read the whole catalog and swap in a fresh snapshot; the old one stays on failure"""
+    try:
+        documents = await collection.find({}, REPLICA_PROJECTION).to_list(length=None)
+        set_catalog_replica(CatalogReplica(documents))
+        print(f"✅ Loaded catalog replica ({len(documents)} products)")
+    except Exception as error:
+        print(f"Warning: Could not load catalog replica: {error}")
+    return _catalog_replica
+
+async def refresh_catalog_replica_periodically(collection, interval: float = CATALOG_REPLICA_REFRESH_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        await load_catalog_replica(collection)
+
+async def start_catalog_replica(database):
+    """Load the snapshot and start the refresh loop (called at startup when enabled)"""
+    global _refresh_task
+    if not CATALOG_REPLICA_ENABLED or database is None:
+        return None
+    await load_catalog_replica(database["products"])
+    _refresh_task = asyncio.create_task(refresh_catalog_replica_periodically(database["products"]))
+    return _refresh_task
+
+async def stop_catalog_replica():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
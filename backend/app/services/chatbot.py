@@ -1,84 +1,131 @@
+import os
+import re
+import asyncio
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List, Dict, Any
-from app.models import Product, ExtractedEntities
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
+from app.models import Product, ProductRecord, ExtractedEntities
+from app.database import db
+from app.services.index_manager import SEARCH_TOKENS_FIELD, search_tokens_query
+from app.services.catalog_metadata import CatalogMetadata, get_catalog_metadata
+from app.services.catalog_replica import UnsupportedQuery, get_catalog_replica
+from app.services.metrics import span, mongo_query_span, track_request
 from app.services.two_stage_llm import (
     stage1_context_analysis_and_query_builder,
     stage2_content_analyzer,
     stage3_question_answerer,
     generate_two_stage_response,
+    stream_two_stage_response,
+    stream_two_stage_fallback_response,
+    stream_stage3_answer,
+    stream_stage3_fallback_answer,
+    generate_stage3_fallback_answer,
+    generate_two_stage_fallback_response,
     normalize_text_advanced,
     extract_question_phrases
 )
 
+# Per-branch time budgets for the concurrent Stage 3 / response generation step
+STAGE3_TIMEOUT_SECONDS = float(os.getenv("STAGE3_TIMEOUT_SECONDS", "12"))
+RESPONSE_TIMEOUT_SECONDS = float(os.getenv("RESPONSE_TIMEOUT_SECONDS", "12"))
+
+# Separates the Stage 3 answer appended to the /chat message from the response
+STAGE3_ANSWER_HEADING = "\n\n**💬 คำตอบเพิ่มเติม:**\n"
+
+# Two-phase fetch: rank candidates on a slim projection, then load full
+# documents (images, whole description) only for the returned products
+TWO_PHASE_FETCH_ENABLED = os.getenv("TWO_PHASE_FETCH_ENABLED", "true").lower() == "true"
+# The local Stage 2 scorer matches terms anywhere in the description, so keep
+# more than the 200 characters the Stage 2 LLM prompt shows
+RANKING_DESCRIPTION_CHARS = int(os.getenv("RANKING_DESCRIPTION_CHARS", "400"))
+
+PRODUCT_PROJECTION = {
+    "_id": 1,
+    "title": 1,
+    "description": 1,
+    "cateName": 1,
+    "price": 1,
+    "salePrice": 1,
+    "stockQuantity": 1,
+    "rating": 1,
+    "totalReviews": 1,
+    "productView": 1,
+    "images": 1,
+    "freeShipping": 1,
+    "product_warranty_2_year": 1,
+    "product_warranty_3_year": 1,
+    "categoryId": 1,
+    "cateId": 1,
+    "productCode": 1
+}
+
+# Fields Stage 1 filtering and Stage 2 ranking read ($substrCP needs MongoDB 4.4+)
+RANKING_PROJECTION = {
+    "_id": 1,
+    "title": 1,
+    # $substrCP errors on non-string values, so anything but a string becomes ""
+    "description": {"$cond": [
+        {"$eq": [{"$type": "$description"}, "string"]},
+        {"$substrCP": ["$description", 0, RANKING_DESCRIPTION_CHARS]},
+        ""
+    ]},
+    "cateName": 1,
+    "price": 1,
+    "salePrice": 1,
+    "stockQuantity": 1,
+    "rating": 1,
+    "totalReviews": 1,
+    "productView": 1
+}
+
+# The text index tokenizes on whitespace/punctuation, which never isolates a Thai word
+THAI_TEXT = re.compile(r'[\u0E00-\u0E7F]')
+# Unindexed tiers, run one at a time and only after every other tier found nothing
+DEFERRED_FALLBACK_TIERS = ("text_substring",)
+
+# Fallback tiers run "parallel" (all at once, best non-empty wins) or "sequential"
+FALLBACK_SEARCH_MODE = os.getenv("FALLBACK_SEARCH_MODE", "parallel").lower()
+
 class ITStoreChatbot:
-    def __init__(self, database: AsyncIOMotorDatabase):
-        self.collection = database["products"]  # Fixed to use correct collection name
+    def __init__(self, database: AsyncIOMotorDatabase, metadata: Optional[CatalogMetadata] = None, collection=None):
+        self.database = database
+        # Product reads may come with their own read preference (db.products)
+        self.collection = collection if collection is not None else database["products"]  # Fixed to use correct collection name
+        self._metadata = metadata
+    
+    @property
+    def metadata(self) -> CatalogMetadata:
+        # Resolved per call so a long-lived instance picks up reload_catalog_metadata()
+        return self._metadata or get_catalog_metadata()
     
     async def process_user_input(self, user_input: str):
+        with track_request():
+            return await self._process_user_input(user_input)
+    
+    async def _process_user_input(self, user_input: str):
         try:
             # 1. Normalize text with advanced Thai language processing
             normalized_input = normalize_text_advanced(user_input)
             
             # 2. Stage 1: Context analysis and query building for initial filtering
-            stage1_result = await stage1_context_analysis_and_query_builder(user_input)
-            
-            # 3. Search products with Stage 1 query
-            raw_products = await self.search_products_precise(stage1_result["query"])
+            stage1_result = await self.run_stage1(user_input)
             
-            # 4. If no results, try progressive fallback
-            if len(raw_products) == 0:
-                raw_products = await self.search_with_fallback_two_stage(
-                    stage1_result["processedTerms"], 
-                    stage1_result["query"]
-                )
-            
-            # 5. Stage 2: Deep content analysis and product matching
-            filtered_products = await stage2_content_analyzer(
-                user_input,
-                stage1_result,
-                raw_products
-            )
+            # 3-5. Mongo search with fallback tiers, Stage 2 ranking
+            raw_products, filtered_products, search_tier = await self.find_products(user_input, stage1_result)
             
             # 6. Stage 3: Use question phrases from Stage 1 analysis
-            stage_assignments = stage1_result.get("stageAssignments", {})
-            question_phrases = stage_assignments.get("stage3_questions", [])
-            stage3_answer = ""
-            
-            print(f"[Main] Stage 3 question phrases: {question_phrases}")
-            
-            if question_phrases and len(filtered_products) > 0:
-                stage3_answer = await stage3_question_answerer(
-                    user_input,
-                    stage1_result,
-                    filtered_products,
-                    question_phrases
-                )
+            question_phrases = self.stage3_question_phrases(stage1_result)
             
-            # 7. Generate comprehensive response (now three-stage)
-            response = await generate_two_stage_response(
+            # 7. Run Stage 3 answering and response generation concurrently -
+            # both only depend on filtered_products and stage1_result
+            stage3_answer, response = await self.answer_and_respond(
                 user_input,
                 stage1_result,
-                filtered_products
+                filtered_products,
+                question_phrases
             )
             
-            # Append Stage 3 answer if available
-            if stage3_answer:
-                response += f"\n\n**💬 คำตอบเพิ่มเติม:**\n{stage3_answer}"
-            
-            return {
-                "products": filtered_products,
-                "response": response,
-                "reasoning": self.explain_three_stage_selection(stage1_result, filtered_products, question_phrases, stage3_answer),
-                "stage1": stage1_result,
-                "stage3Questions": question_phrases,
-                "stage3Answer": stage3_answer,
-                "queryReasoning": stage1_result["reasoning"],
-                "mongoQuery": stage1_result["query"],
-                "confidence": stage1_result.get("confidence", 0.8),
-                "rawProductCount": len(raw_products),
-                "filteredProductCount": len(filtered_products),
-                "searchMethod": "three_stage_llm"
-            }
+            return self.build_result(stage1_result, raw_products, filtered_products, search_tier, question_phrases, stage3_answer, response)
         except Exception as error:
             print(f"Chatbot error: {error}")
             return {
@@ -89,12 +136,216 @@ class ITStoreChatbot:
                 "queryReasoning": None,
                 "mongoQuery": None,
                 "confidence": 0.0,
+                "stage1Path": None,
+                "searchTier": None,
                 "rawProductCount": 0,
                 "filteredProductCount": 0,
                 "searchMethod": "error",
                 "error": str(error)
             }
     
+    async def stream_user_input(self, user_input: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        process_user_input as (event, data) pairs, each emitted as soon as it is
+        ready: "stage1" (Stage 1 result), "products" (ranked Product models and
+        search tier), "token" (response text chunks), "answer" (Stage 3 answer
+        chunks, if any) and finally "result" (the dict process_user_input
+        returns). Errors propagate to the caller.
+        """
+        with track_request():
+            async for event in self._stream_user_input(user_input):
+                yield event
+    
+    async def _stream_user_input(self, user_input: str) -> AsyncIterator[Tuple[str, Any]]:
+        stage1_result = await self.run_stage1(user_input)
+        yield "stage1", stage1_result
+        
+        raw_products, filtered_products, search_tier = await self.find_products(user_input, stage1_result)
+        yield "products", {"products": self.to_response_products(filtered_products), "searchTier": search_tier}
+        
+        # Stage 3 streams into a buffer while the response streams; its chunks
+        # follow the response. Both are cancelled if the client goes away.
+        question_phrases = self.stage3_question_phrases(stage1_result)
+        answer_chunks: asyncio.Queue = asyncio.Queue()
+        
+        async def produce_answer():
+            try:
+                if question_phrases and len(filtered_products) > 0:
+                    async for chunk in self.stream_with_fallback(
+                        stream_stage3_answer(user_input, stage1_result, filtered_products, question_phrases),
+                        lambda: stream_stage3_fallback_answer(question_phrases, filtered_products),
+                        STAGE3_TIMEOUT_SECONDS
+                    ):
+                        answer_chunks.put_nowait(chunk)
+            finally:
+                answer_chunks.put_nowait(None)
+        
+        answer_task = asyncio.create_task(produce_answer())
+        try:
+            response_chunks = []
+            async for chunk in self.stream_with_fallback(
+                stream_two_stage_response(user_input, stage1_result, filtered_products),
+                lambda: stream_two_stage_fallback_response(user_input, filtered_products, stage1_result),
+                RESPONSE_TIMEOUT_SECONDS
+            ):
+                response_chunks.append(chunk)
+                yield "token", chunk
+            
+            stage3_chunks = []
+            while (chunk := await answer_chunks.get()) is not None:
+                stage3_chunks.append(chunk)
+                yield "answer", chunk
+            await answer_task
+        finally:
+            if not answer_task.done():
+                answer_task.cancel()
+        
+        response = "".join(response_chunks).strip()
+        stage3_answer = "".join(stage3_chunks).strip()
+        yield "result", self.build_result(stage1_result, raw_products, filtered_products, search_tier, question_phrases, stage3_answer, response)
+    
+    async def stream_with_fallback(
+        self,
+        chunks: AsyncIterator[str],
+        fallback: Callable[[], AsyncIterator[str]],
+        first_chunk_timeout: float
+    ) -> AsyncIterator[str]:
+        """Relay a text stream; if its first chunk doesn't arrive in time (or it fails), stream the fallback instead"""
+        iterator = chunks.__aiter__()
+        try:
+            first = await asyncio.wait_for(iterator.__anext__(), timeout=first_chunk_timeout)
+        except StopAsyncIteration:
+            return
+        except Exception as error:
+            print(f"[Main] Stream failed before first chunk ({type(error).__name__}) - using fallback")
+            await self._close_stream(iterator)
+            async for chunk in fallback():
+                yield chunk
+            return
+        
+        try:
+            yield first
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            await self._close_stream(iterator)
+    
+    @staticmethod
+    async def _close_stream(iterator):
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    
+    async def run_stage1(self, user_input: str) -> Dict[str, Any]:
+        with span("stage1"):
+            return await stage1_context_analysis_and_query_builder(user_input, self.metadata)
+    
+    async def find_products(self, user_input: str, stage1_result: Dict[str, Any]) -> Tuple[List[ProductRecord], List[ProductRecord], Optional[str]]:
+        """Stage 1 query with fallback tiers, then Stage 2 ranking: (raw, ranked, search tier)"""
+        # 3. Search products with Stage 1 query
+        raw_products = await self.search_products_precise(stage1_result["query"])
+        
+        # 4. If no results, try progressive fallback
+        search_tier = "primary"
+        if len(raw_products) == 0:
+            raw_products, search_tier = await self.search_fallback_tiers(
+                stage1_result["processedTerms"], 
+                stage1_result["query"]
+            )
+        
+        # 5. Stage 2: Deep content analysis and product matching
+        with span("stage2"):
+            filtered_products = await stage2_content_analyzer(
+                user_input,
+                stage1_result,
+                raw_products
+            )
+        
+        # Full documents only for the products that are answered about and returned
+        with span("hydrate"):
+            filtered_products = await self.hydrate_products(filtered_products)
+        return raw_products, filtered_products, search_tier
+    
+    def stage3_question_phrases(self, stage1_result: Dict[str, Any]) -> List[str]:
+        stage_assignments = stage1_result.get("stageAssignments", {})
+        question_phrases = stage_assignments.get("stage3_questions", [])
+        print(f"[Main] Stage 3 question phrases: {question_phrases}")
+        return question_phrases
+    
+    def build_result(
+        self,
+        stage1_result: Dict[str, Any],
+        raw_products: List[ProductRecord],
+        filtered_products: List[ProductRecord],
+        search_tier: Optional[str],
+        question_phrases: List[str],
+        stage3_answer: str,
+        response: str
+    ) -> Dict[str, Any]:
+        # Append Stage 3 answer if available
+        if stage3_answer:
+            response += STAGE3_ANSWER_HEADING + stage3_answer
+        
+        return {
+            "products": self.to_response_products(filtered_products),
+            "response": response,
+            "reasoning": self.explain_three_stage_selection(stage1_result, filtered_products, question_phrases, stage3_answer),
+            "stage1": stage1_result,
+            "stage3Questions": question_phrases,
+            "stage3Answer": stage3_answer,
+            "queryReasoning": stage1_result["reasoning"],
+            "mongoQuery": stage1_result["query"],
+            "confidence": stage1_result.get("confidence", 0.8),
+            "stage1Path": stage1_result.get("stage1Path", "llm"),
+            "searchTier": search_tier,
+            "rawProductCount": len(raw_products),
+            "filteredProductCount": len(filtered_products),
+            "searchMethod": "three_stage_llm"
+        }
+    
+    async def answer_questions(
+        self,
+        user_input: str,
+        stage1_result: Dict[str, Any],
+        filtered_products: List[ProductRecord],
+        question_phrases: List[str]
+    ) -> str:
+        """Stage 3 with its timeout and fallback answer"""
+        if not question_phrases or len(filtered_products) == 0:
+            return ""
+        try:
+            return await asyncio.wait_for(
+                stage3_question_answerer(user_input, stage1_result, filtered_products, question_phrases),
+                timeout=STAGE3_TIMEOUT_SECONDS
+            )
+        except Exception as error:
+            print(f"[Main] Stage 3 branch failed ({type(error).__name__}) - using fallback answer")
+            return generate_stage3_fallback_answer(question_phrases, filtered_products)
+    
+    async def answer_and_respond(
+        self,
+        user_input: str,
+        stage1_result: Dict[str, Any],
+        filtered_products: List[Product],
+        question_phrases: List[str]
+    ):
+        """Run Stage 3 and final response generation together, each with its own timeout and fallback"""
+        async def response_branch() -> str:
+            try:
+                return await asyncio.wait_for(
+                    generate_two_stage_response(user_input, stage1_result, filtered_products),
+                    timeout=RESPONSE_TIMEOUT_SECONDS
+                )
+            except Exception as error:
+                print(f"[Main] Response branch failed ({type(error).__name__}) - using fallback response")
+                return generate_two_stage_fallback_response(user_input, filtered_products, stage1_result)
+        
+        stage3_answer, response = await asyncio.gather(
+            self.answer_questions(user_input, stage1_result, filtered_products, question_phrases),
+            response_branch()
+        )
+        return stage3_answer, response
+    
     def explain_three_stage_selection(self, stage1_result: Dict[str, Any], products: List[Product], question_phrases: List[str], stage3_answer: str) -> str:
         """Explain three-stage selection process"""
         if len(products) == 0:
@@ -158,99 +409,110 @@ class ITStoreChatbot:
         
         return reasoning + "\n".join(reasons)
     
-    async def search_products_precise(self, query: Dict[str, Any], limit: int = 50) -> List[Product]:
-        """Execute precise MongoDB query with proper error handling"""
+    async def search_products_precise(self, query: Dict[str, Any], limit: int = 50, tier: str = "primary") -> List[ProductRecord]:
+        """Execute precise MongoDB query with proper error handling; `tier` labels its timing"""
         try:
+            # Restricted Stage 1 / fallback queries can be answered by the in-process replica
+            replica = get_catalog_replica()
+            if replica is not None:
+                try:
+                    with mongo_query_span(tier, "replica"):
+                        results = replica.find(query, limit)
+                    print(f"[DEBUG] Catalog replica answered query: {query} ({len(results)} products)")
+                    return self.parse_products(results)
+                except UnsupportedQuery as unsupported:
+                    print(f"[DEBUG] Catalog replica can't evaluate {unsupported} - querying MongoDB")
+            
             print(f"[DEBUG] Executing MongoDB query: {query}")
             
-            cursor = self.collection.find(
-                query,
-                {
-                    "_id": 1,
-                    "title": 1,
-                    "description": 1,
-                    "cateName": 1,
-                    "price": 1,
-                    "salePrice": 1,
-                    "stockQuantity": 1,
-                    "rating": 1,
-                    "totalReviews": 1,
-                    "productView": 1,
-                    "images": 1,
-                    "freeShipping": 1,
-                    "product_warranty_2_year": 1,
-                    "product_warranty_3_year": 1,
-                    "categoryId": 1,
-                    "cateId": 1,
-                    "productCode": 1
-                }
-            ).sort([
+            projection = dict(RANKING_PROJECTION if TWO_PHASE_FETCH_ENABLED else PRODUCT_PROJECTION)
+            sort = [
                 ("productView", -1),  # Most popular first
                 ("rating", -1),       # Highest rated
                 ("totalReviews", -1)  # Most reviewed
-            ]).limit(limit)
-            
-            results = await cursor.to_list(length=limit)
-            print(f"[DEBUG] Found {len(results)} products from database")
+            ]
             
-            products = []
-            for result in results:
-                try:
-                    # Handle potential data inconsistencies
-                    product_data = {
-                        "id": result.get("_id"),
-                        "title": result.get("title", ""),
-                        "description": result.get("description", ""),
-                        "cateName": result.get("cateName", ""),
-                        "price": float(result.get("price", 0)),
-                        "salePrice": float(result.get("salePrice", 0)),
-                        "stockQuantity": int(result.get("stockQuantity", 0)),
-                        "rating": float(result.get("rating", 0)),
-                        "totalReviews": int(result.get("totalReviews", 0)),
-                        "productView": int(result.get("productView", 0)),
-                        "images": result.get("images", {}),
-                        "freeShipping": result.get("freeShipping", False),
-                        "product_warranty_2_year": result.get("product_warranty_2_year"),
-                        "product_warranty_3_year": result.get("product_warranty_3_year"),
-                        "categoryId": result.get("categoryId"),
-                        "cateId": result.get("cateId"),
-                        "productCode": result.get("productCode", "")
-                    }
-                    
-                    products.append(Product(**product_data))
-                except Exception as product_error:
-                    print(f"[WARNING] Failed to parse product: {product_error}")
-                    continue
+            # Text search results are ranked by relevance first
+            if "$text" in query:
+                projection["score"] = {"$meta": "textScore"}
+                sort.insert(0, ("score", {"$meta": "textScore"}))
             
-            print(f"[DEBUG] Successfully parsed {len(products)} products")
-            return products
+            with mongo_query_span(tier):
+                cursor = self.collection.find(query, projection).sort(sort).limit(limit)
+                results = await cursor.to_list(length=limit)
+            print(f"[DEBUG] Found {len(results)} products from database")
+            return self.parse_products(results, complete=not TWO_PHASE_FETCH_ENABLED)
             
         except Exception as error:
             print(f"[ERROR] Database search error: {error}")
             return []
     
-    async def search_with_fallback_two_stage(self, processed_terms: Dict[str, Any], primary_query: Dict[str, Any]) -> List[Product]:
-        """Progressive fallback strategy using enhanced search methods"""
-        print("[DEBUG] Starting progressive fallback search...")
+    def parse_products(self, results: List[Dict[str, Any]], complete: bool = True) -> List[ProductRecord]:
+        """Convert raw product documents to lightweight records, skipping inconsistent ones"""
+        products = []
+        for result in results:
+            try:
+                products.append(ProductRecord.from_document(result, complete=complete))
+            except Exception as product_error:
+                print(f"[WARNING] Failed to parse product: {product_error}")
+                continue
+        
+        print(f"[DEBUG] Successfully parsed {len(products)} products")
+        return products
+    
+    async def hydrate_products(self, records: List[ProductRecord]) -> List[ProductRecord]:
+        """
+        Replace slim records with full documents in one $in lookup, keeping
+        their order. Products gone since ranking are dropped; on error the
+        slim records are returned as they are.
+        """
+        missing = [record.id for record in records if not getattr(record, "complete", True)]
+        if not missing:
+            return records
+        try:
+            ids = [ObjectId(product_id) if ObjectId.is_valid(product_id) else product_id for product_id in missing]
+            results = await self.collection.find({"_id": {"$in": ids}}, PRODUCT_PROJECTION).to_list(length=len(ids))
+            full = {record.id: record for record in self.parse_products(results)}
+        except Exception as error:
+            print(f"Warning: Could not hydrate products: {error}")
+            return records
+        
+        hydrated = []
+        for record in records:
+            if getattr(record, "complete", True):
+                hydrated.append(record)
+            elif record.id in full:
+                hydrated.append(full[record.id])
+        print(f"[DEBUG] Hydrated {len(full)} of {len(missing)} ranked products")
+        return hydrated
+    
+    def to_response_products(self, records: List[ProductRecord]) -> List[Product]:
+        """Full Product models for the products actually returned to the client"""
+        products = []
+        for record in records:
+            if isinstance(record, Product):
+                products.append(record)
+                continue
+            try:
+                products.append(record.to_product())
+            except Exception as product_error:
+                print(f"[WARNING] Failed to validate product {record.id}: {product_error}")
+        return products
+    
+    def build_fallback_tiers(self, processed_terms: Dict[str, Any], primary_query: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Applicable fallback queries, highest priority first"""
+        tiers = []
         
         # Fallback 1: Remove budget constraint
         if "salePrice" in primary_query:
-            fallback_query = {k: v for k, v in primary_query.items() if k != "salePrice"}
-            products = await self.search_products_precise(fallback_query, limit=20)
-            if len(products) > 0:
-                print(f"[DEBUG] Fallback 1 (no budget) found {len(products)} products")
-                return products
+            tiers.append(("no_budget", {k: v for k, v in primary_query.items() if k != "salePrice"}))
         
         # Fallback 2: Category-only search with broader matching
         if processed_terms.get("category"):
-            fallback_query = {
+            tiers.append(("category", {
                 "stockQuantity": {"$gt": 0},
                 "cateName": processed_terms["category"]
-            }
-            products = await self.search_products_precise(fallback_query, limit=20)
-            if len(products) > 0:
-                print(f"[DEBUG] Fallback 2 (category matching) found {len(products)} products")
-                return products
+            }))
         
         # Fallback 3: Text search in title and description using remaining terms
         remaining_terms = processed_terms.get("remaining", [])
@@ -260,22 +522,101 @@ class ITStoreChatbot:
                 if isinstance(term, str) and len(term.strip()) > 2:
                     search_terms.extend(term.split())
             
+            search_terms = [term.strip('"-') for term in search_terms if len(term.strip('"-')) > 2]
             if search_terms:
-                search_terms = [term for term in search_terms if len(term) > 2]
-                fallback_query = {
-                    "stockQuantity": {"$gt": 0},
-                    "$or": [
-                        {"title": {"$regex": "|".join(search_terms), "$options": "i"}},
-                        {"description": {"$regex": "|".join(search_terms), "$options": "i"}}
-                    ]
-                }
-                products = await self.search_products_precise(fallback_query, limit=20)
-                if len(products) > 0:
-                    print(f"[DEBUG] Fallback 3 (text search) found {len(products)} products")
-                    return products
+                if db.search_tokens_ready:
+                    # Substrings (Thai inside unspaced text, "RTX" in "RTX4060") through the index
+                    tiers.append(("text_search", self.build_token_search_query(search_terms)))
+                else:
+                    # $text only matches whole tokens; the unindexed $regex scan for
+                    # substrings runs only when every other tier came back empty
+                    token_terms = [term for term in search_terms if not THAI_TEXT.search(term)]
+                    if db.text_index_ready and token_terms:
+                        tiers.append(("text_search", self.build_text_search_query(token_terms)))
+                        tiers.append(("text_substring", self.build_regex_search_query(search_terms)))
+                    else:
+                        tiers.append(("text_search", self.build_regex_search_query(search_terms)))
+        
+        return tiers
+    
+    def build_token_search_query(self, search_terms: List[str]) -> Dict[str, Any]:
+        """Candidates from the searchTokens multikey index, checked with the escaped $regex"""
+        query = self.build_regex_search_query(search_terms)
+        query[SEARCH_TOKENS_FIELD] = search_tokens_query(search_terms)
+        return query
+    
+    def build_text_search_query(self, search_terms: List[str]) -> Dict[str, Any]:
+        """Indexed $text search on whole title/description tokens"""
+        return {
+            "stockQuantity": {"$gt": 0},
+            "$text": {"$search": " ".join(search_terms)}
+        }
+    
+    def build_regex_search_query(self, search_terms: List[str]) -> Dict[str, Any]:
+        """Substring search with the user terms escaped before going into $regex"""
+        pattern = "|".join(re.escape(term) for term in search_terms)
+        return {
+            "stockQuantity": {"$gt": 0},
+            "$or": [
+                {"title": {"$regex": pattern, "$options": "i"}},
+                {"description": {"$regex": pattern, "$options": "i"}}
+            ]
+        }
+    
+    async def search_fallback_tiers(self, processed_terms: Dict[str, Any], primary_query: Dict[str, Any]) -> Tuple[List[ProductRecord], Optional[str]]:
+        """
+        Progressive fallback returning (products, winning tier).
+        In parallel mode every tier's query is sent at once; the highest-priority
+        non-empty result wins and the lower tiers still running are cancelled.
+        """
+        tiers = self.build_fallback_tiers(processed_terms, primary_query)
+        print(f"[DEBUG] Starting progressive fallback search ({FALLBACK_SEARCH_MODE}): {[name for name, _ in tiers]}")
+        
+        # Collection scans never join the parallel batch - cancelling a task
+        # doesn't stop its query on the server
+        deferred = [(name, query) for name, query in tiers if name in DEFERRED_FALLBACK_TIERS]
+        tiers = [(name, query) for name, query in tiers if name not in DEFERRED_FALLBACK_TIERS]
         
-        print("[DEBUG] All fallback strategies failed")
-        return []
+        if FALLBACK_SEARCH_MODE != "parallel" or len(tiers) < 2:
+            products, name = await self.search_tiers_in_order(tiers)
+        else:
+            products, name = await self.search_tiers_in_parallel(tiers)
+        if name is None and deferred:
+            products, name = await self.search_tiers_in_order(deferred)
+        
+        if name is None:
+            print("[DEBUG] All fallback strategies failed")
+        return products, name
+    
+    async def search_tiers_in_order(self, tiers: List[Tuple[str, Dict[str, Any]]]) -> Tuple[List[ProductRecord], Optional[str]]:
+        for name, fallback_query in tiers:
+            products = await self.search_products_precise(fallback_query, limit=20, tier=name)
+            if len(products) > 0:
+                print(f"[DEBUG] Fallback tier {name} found {len(products)} products")
+                return products, name
+        return [], None
+    
+    async def search_tiers_in_parallel(self, tiers: List[Tuple[str, Dict[str, Any]]]) -> Tuple[List[ProductRecord], Optional[str]]:
+        tasks = [
+            asyncio.create_task(self.search_products_precise(fallback_query, limit=20, tier=name))
+            for name, fallback_query in tiers
+        ]
+        try:
+            for (name, _), task in zip(tiers, tasks):
+                products = await task
+                if len(products) > 0:
+                    print(f"[DEBUG] Fallback tier {name} found {len(products)} products")
+                    return products, name
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        return [], None
+    
+    async def search_with_fallback_two_stage(self, processed_terms: Dict[str, Any], primary_query: Dict[str, Any]) -> List[ProductRecord]:
+        """Progressive fallback strategy using enhanced search methods"""
+        products, _ = await self.search_fallback_tiers(processed_terms, primary_query)
+        return products
     
     async def search_products(self, query: Dict[str, Any], limit: int = 10) -> List[Product]:
         try:
@@ -450,4 +791,22 @@ class ITStoreChatbot:
                 "priceRange": {"min": 0, "max": 0},
                 "topBrands": [],
                 "categories": []
-            }
\ No newline at end of file
+            }
+
+_chatbot: Optional[ITStoreChatbot] = None
+
+def init_chatbot(database: AsyncIOMotorDatabase, collection=None) -> ITStoreChatbot:
+    """Create the process-wide chatbot (called once from the app lifespan)"""
+    global _chatbot
+    _chatbot = ITStoreChatbot(database, collection=collection)
+    return _chatbot
+
+def set_chatbot(chatbot: Optional[ITStoreChatbot]):
+    global _chatbot
+    _chatbot = chatbot
+
+def get_chatbot() -> ITStoreChatbot:
+    """FastAPI dependency - the shared chatbot, created on first use if the lifespan didn't run"""
+    if _chatbot is None:
+        return init_chatbot(db.database, db.products)
+    return _chatbot
@@ -0,0 +1,208 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+from app.models import Product
+
+# Usage words -> terms that indicate the usage in a title/description.
+# Listings rarely say "เล่นเกม"; they name the GPU or the gaming line instead.
+GAMING_TERMS = ('gaming', 'game', 'เกม', 'rtx', 'gtx', 'radeon rx', 'rog', 'tuf', 'legion', 'loq',
+                'predator', 'nitro', 'omen', 'victus', 'katana', 'aorus')
+CREATOR_TERMS = ('creator', 'studio', 'oled', 'srgb', 'dci-p3', 'rtx', 'graphic', 'กราฟิก', 'design')
+OFFICE_TERMS = ('office', 'business', 'student', 'ทำงาน', 'เรียน', 'thinkpad', 'vostro', 'latitude',
+                'expertbook', 'probook', 'vivobook', 'ideapad', 'aspire', 'modern')
+
+USAGE_LEXICON: Dict[str, Tuple[str, ...]] = {
+    'เกม': GAMING_TERMS,
+    'gaming': GAMING_TERMS,
+    'กราฟิก': CREATOR_TERMS,
+    'ตัดต่อ': CREATOR_TERMS,
+    'ออกแบบ': CREATOR_TERMS,
+    'design': CREATOR_TERMS,
+    'ทำงาน': OFFICE_TERMS,
+    'ออฟฟิศ': OFFICE_TERMS,
+    'office': OFFICE_TERMS,
+    'เอกสาร': OFFICE_TERMS,
+    'เรียน': OFFICE_TERMS
+}
+
+# Thai filler around the meaningful part of a phrase ("สำหรับทำงาน" -> "ทำงาน")
+THAI_FILLER = ('สำหรับ', 'อยากได้', 'ต้องการ', 'ใช้งาน', 'แนะนำ', 'หน่อย', 'เล่น', 'ที่', 'ได้', 'ไหม', 'ดี')
+
+# Scoring rubric (same bands the Stage 2 LLM prompt uses)
+SCORE_TITLE_PHRASE = 100     # whole phrase in the title
+SCORE_TITLE_TERMS = 95       # every term in the title
+SCORE_DESCRIPTION_PHRASE = 80
+SCORE_DESCRIPTION_TERMS = 70
+SCORE_PARTIAL_MIN = 50       # 50-69 by share of terms found
+SCORE_USAGE_MIN = 40         # 40-49 by number of usage indicators found
+MIN_MATCH_SCORE = 30         # below this is "no match"
+
+_LATIN_TOKEN = re.compile(r'[a-z0-9]+')
+_THAI_RUN = re.compile(r'[\u0e00-\u0e7f]+')
+_UNIT_SPACING = re.compile(r'(\d)\s+(gb|tb|hz|ghz|mhz|mp|w|k|นิ้ว)\b')
+_NON_WORD = re.compile(r'[^a-z0-9\u0e00-\u0e7f]+')
+_BARE_NUMBER = re.compile(r'^\d[\d,]*$')
+
+def normalize_for_matching(text: str) -> str:
+    """Lowercase and glue numbers to their units ("16 GB" -> "16gb")"""
+    return _UNIT_SPACING.sub(r'\1\2', text.lower())
+
+def compact(text: str) -> str:
+    """Drop spaces and punctuation so "RTX 4060" matches "RTX4060" or "RTX-4060" """
+    return _NON_WORD.sub('', text)
+
+@dataclass(frozen=True)
+class PhraseQuery:
+    phrase: str
+    compact: str
+    terms: Tuple[str, ...]
+    usage_terms: Tuple[str, ...]
+
+    @property
+    def is_usage(self) -> bool:
+        return bool(self.usage_terms)
+
+@dataclass(frozen=True)
+class ProductText:
+    title: str
+    title_compact: str
+    title_tokens: frozenset
+    description: str
+    description_compact: str
+    description_tokens: frozenset
+
+def _strip_thai_filler(chunk: str) -> str:
+    changed = True
+    while changed and chunk:
+        changed = False
+        for filler in THAI_FILLER:
+            if chunk.startswith(filler) and len(chunk) > len(filler):
+                chunk, changed = chunk[len(filler):], True
+            elif chunk.endswith(filler) and len(chunk) > len(filler):
+                chunk, changed = chunk[:-len(filler)], True
+    return '' if chunk in THAI_FILLER else chunk
+
+def build_phrase_query(phrase: str) -> PhraseQuery:
+    normalized = normalize_for_matching(phrase)
+    terms = list(_LATIN_TOKEN.findall(normalized))
+    usage_terms: List[str] = []
+
+    for chunk in _THAI_RUN.findall(normalized):
+        chunk = _strip_thai_filler(chunk)
+        if not chunk:
+            continue
+        # A Thai usage chunk is matched through its usage word
+        usage_word = next((word for word in USAGE_LEXICON if word in chunk), None)
+        terms.append(usage_word or chunk)
+
+    for term in terms:
+        for indicator in USAGE_LEXICON.get(term, ()):
+            if indicator not in usage_terms:
+                usage_terms.append(indicator)
+
+    return PhraseQuery(
+        phrase=phrase,
+        compact=compact(normalized),
+        terms=tuple(terms),
+        usage_terms=tuple(usage_terms)
+    )
+
+def build_product_text(product: Product) -> ProductText:
+    title = normalize_for_matching(product.title or '')
+    description = normalize_for_matching(product.description or '')
+    return ProductText(
+        title=title,
+        title_compact=compact(title),
+        title_tokens=frozenset(_LATIN_TOKEN.findall(title)),
+        description=description,
+        description_compact=compact(description),
+        description_tokens=frozenset(_LATIN_TOKEN.findall(description))
+    )
+
+def _term_in(term: str, text: str, text_compact: str, tokens: frozenset) -> bool:
+    # Short latin terms ("hp", "i5") must be whole tokens; longer ones and Thai
+    # words can sit inside model numbers or unspaced Thai text
+    if len(term) <= 3 and term.isascii():
+        return term in tokens
+    return term in text_compact or term in text
+
+def _phrase_in(query: PhraseQuery, text_compact: str, tokens: frozenset) -> bool:
+    # Same whole-token rule as _term_in: "hp" must not match inside "chpc" or "hpe"
+    if not query.compact:
+        return False
+    if len(query.compact) <= 3 and query.compact.isascii():
+        return query.compact in tokens
+    return query.compact in text_compact
+
+def score_phrase(query: PhraseQuery, product: ProductText) -> int:
+    """Score one content phrase against one product with the Stage 2 rubric"""
+    if _phrase_in(query, product.title_compact, product.title_tokens):
+        return SCORE_TITLE_PHRASE
+    if not query.terms:
+        return 0
+
+    in_title = [_term_in(term, product.title, product.title_compact, product.title_tokens) for term in query.terms]
+    if all(in_title):
+        return SCORE_TITLE_TERMS
+    if _phrase_in(query, product.description_compact, product.description_tokens):
+        return SCORE_DESCRIPTION_PHRASE
+
+    found = [
+        title_hit or _term_in(term, product.description, product.description_compact, product.description_tokens)
+        for term, title_hit in zip(query.terms, in_title)
+    ]
+    if all(found):
+        return SCORE_DESCRIPTION_TERMS
+
+    matched = sum(found)
+    if matched and not query.is_usage:
+        return SCORE_PARTIAL_MIN + round(19 * matched / len(query.terms)) - 1
+
+    if query.is_usage:
+        indicators = sum(
+            1 for term in query.usage_terms
+            if _term_in(term, product.title, product.title_compact, product.title_tokens)
+            or _term_in(term, product.description, product.description_compact, product.description_tokens)
+        )
+        if indicators:
+            return min(SCORE_USAGE_MIN + 3 * (indicators - 1), SCORE_PARTIAL_MIN - 1)
+    return 0
+
+def popularity_key(product: Product):
+    return (product.productView, product.rating, -product.salePrice)
+
+class ContentScorer:
+    """Local replacement for the Stage 2 LLM re-ranker: string and spec matching with the rubric"""
+
+    def __init__(self, phrases: Sequence[str]):
+        self.queries = [
+            build_phrase_query(phrase) for phrase in phrases
+            if phrase and phrase.strip() and not _BARE_NUMBER.match(phrase.strip())
+        ]
+
+    def score_products(self, products: Sequence[Product]) -> List[Tuple[int, Product]]:
+        """Average phrase score per product (0-100), in input order"""
+        if not self.queries:
+            return [(0, product) for product in products]
+        scored = []
+        for product in products:
+            text = build_product_text(product)
+            total = sum(score_phrase(query, text) for query in self.queries)
+            scored.append((round(total / len(self.queries)), product))
+        return scored
+
+    def unresolved_usage_phrases(self, products: Sequence[Product]) -> List[str]:
+        """Usage phrases no product matched at all - candidates for the opt-in LLM"""
+        texts = [build_product_text(product) for product in products]
+        return [
+            query.phrase for query in self.queries
+            if query.is_usage and not any(score_phrase(query, text) for text in texts)
+        ]
+
+    def rank(self, products: Sequence[Product], limit: int = 8) -> List[Product]:
+        """Products scoring at least a weak match, best first; popularity when nothing matches"""
+        matched = [(score, product) for score, product in self.score_products(products) if score >= MIN_MATCH_SCORE]
+        if not matched:
+            return sorted(products, key=popularity_key, reverse=True)[:limit]
+        matched.sort(key=lambda item: (item[0],) + popularity_key(item[1]), reverse=True)
+        return [product for _, product in matched[:limit]]
@@ -0,0 +1,159 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from pymongo import ASCENDING, DESCENDING, TEXT, UpdateOne
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """One declared index: key pattern, name, creation options and the query shape it serves"""
+    name: str
+    keys: Tuple[Tuple[str, Any], ...]
+    serves: str
+    options: Dict[str, Any] = field(default_factory=dict)
+
+# Popularity sort used by every product listing query
+POPULARITY_SORT = (("productView", DESCENDING), ("rating", DESCENDING), ("totalReviews", DESCENDING))
+
+# Text index backing the title/description fallback search. Thai has no
+# word delimiters, so the index uses the "none" language (no stemming or
+# stop words) and matches whole whitespace/punctuation-separated tokens.
+PRODUCT_TEXT_INDEX_NAME = "products_text_search"
+PRODUCT_TEXT_INDEX_WEIGHTS = {"title": 10, "description": 2}
+
+# Precomputed search tokens: the character trigrams of every lowercased
+# title/description word, under a multikey index. A term found anywhere in a
+# word - Thai inside unspaced Thai text, "rtx" in "rtx4060" - shares all of its
+# trigrams with the product, so one trigram per term narrows the candidates
+# through the index and the escaped $regex only checks those.
+SEARCH_TOKENS_FIELD = "searchTokens"
+SEARCH_TOKENS_VERSION_FIELD = "searchTokensVersion"
+# Bump when the token format changes - the startup backfill rewrites older rows
+SEARCH_TOKENS_VERSION = 1
+SEARCH_GRAM_SIZE = 3
+SEARCH_TOKENS_INDEX_NAME = "products_search_tokens"
+_WORD = re.compile(r'\S+')
+
+# Compound indexes follow Equality, Sort, Range ordering: equality on cateName
+# first, then the popularity sort, then the stockQuantity/salePrice ranges, so
+# the sort comes from the index and the ranges are filtered from index keys.
+PRODUCT_INDEXES: List[IndexSpec] = [
+    IndexSpec(
+        name="products_category_popularity",
+        keys=(("cateName", ASCENDING),) + POPULARITY_SORT + (("stockQuantity", ASCENDING), ("salePrice", ASCENDING)),
+        serves="search_products_precise / fallbacks with cateName (single or $in), recommendations by category"
+    ),
+    IndexSpec(
+        name="products_popularity",
+        keys=POPULARITY_SORT + (("stockQuantity", ASCENDING), ("salePrice", ASCENDING)),
+        serves="queries without cateName (budget only, stock only), recommendations by price band"
+    ),
+    IndexSpec(
+        name="products_trending",
+        keys=(("productView", DESCENDING), ("totalReviews", DESCENDING), ("stockQuantity", ASCENDING), ("rating", ASCENDING)),
+        serves="get_trending_products (sort productView, totalReviews)"
+    ),
+    IndexSpec(
+        name=PRODUCT_TEXT_INDEX_NAME,
+        keys=(("title", TEXT), ("description", TEXT)),
+        serves="text_search fallback tier ($text) while search tokens are not backfilled",
+        options={"weights": PRODUCT_TEXT_INDEX_WEIGHTS, "default_language": "none"}
+    ),
+    IndexSpec(
+        name=SEARCH_TOKENS_INDEX_NAME,
+        keys=((SEARCH_TOKENS_FIELD, ASCENDING),),
+        serves="text_search fallback tier (searchTokens $in, then escaped $regex on the candidates)"
+    )
+]
+
+def word_grams(text: str) -> Set[str]:
+    """Trigrams of each whitespace-separated word (shorter words hold no search term)"""
+    grams: Set[str] = set()
+    for word in _WORD.findall(text.lower()):
+        grams.update(word[start:start + SEARCH_GRAM_SIZE] for start in range(len(word) - SEARCH_GRAM_SIZE + 1))
+    return grams
+
+def product_search_tokens(doc: Dict[str, Any]) -> List[str]:
+    title, description = doc.get("title"), doc.get("description")
+    text = " ".join(value for value in (title, description) if isinstance(value, str))
+    return sorted(word_grams(text))
+
+def search_term_gram(term: str) -> str:
+    """
+    The trigram a term is looked up by. Any of its trigrams finds every match;
+    prefer ones with digits or more distinct characters, which are rarer.
+    """
+    grams = sorted(word_grams(term))
+    return max(grams, key=lambda gram: (any(char.isdigit() for char in gram), len(set(gram))))
+
+def search_tokens_query(search_terms: Iterable[str]) -> Dict[str, Any]:
+    """
+    searchTokens condition for the terms. null also selects products inserted
+    since the last backfill (no tokens yet), leaving them to the $regex check.
+    """
+    grams = sorted({search_term_gram(term) for term in search_terms if len(term) >= SEARCH_GRAM_SIZE})
+    return {"$in": grams + [None]}
+
+async def backfill_search_tokens(collection, batch_size: int = 500) -> int:
+    """
+    Store search tokens on products without current ones (idempotent; run at
+    startup). Products inserted later are still searched through the null
+    match; a title/description edited elsewhere keeps its old tokens until
+    its searchTokensVersion is unset or SEARCH_TOKENS_VERSION is bumped.
+    Returns the number of products updated.
+    """
+    cursor = collection.find(
+        {SEARCH_TOKENS_VERSION_FIELD: {"$ne": SEARCH_TOKENS_VERSION}},
+        {"title": 1, "description": 1}
+    )
+    updated = 0
+    batch: List[UpdateOne] = []
+    async for doc in cursor:
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {
+            SEARCH_TOKENS_FIELD: product_search_tokens(doc),
+            SEARCH_TOKENS_VERSION_FIELD: SEARCH_TOKENS_VERSION
+        }}))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    return updated
+
+def _is_text(keys) -> bool:
+    return any(kind == TEXT for _, kind in keys)
+
+def _normalize_keys(keys) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((name, int(kind) if isinstance(kind, (int, float)) else kind) for name, kind in keys)
+
+def index_satisfied(spec: IndexSpec, existing: Dict[str, Dict[str, Any]]) -> bool:
+    """An index with the same key pattern exists (under any name); any text index counts for text specs"""
+    for info in existing.values():
+        keys = info.get("key", [])
+        if _is_text(spec.keys):
+            if _is_text(keys):
+                return True
+        elif _normalize_keys(keys) == _normalize_keys(spec.keys):
+            return True
+    return False
+
+async def ensure_product_indexes(collection, specs: List[IndexSpec] = PRODUCT_INDEXES) -> Set[str]:
+    """
+    Create the declared indexes that don't exist yet (idempotent, safe to run
+    at every startup). Returns the names of specs that are in place; a spec
+    that fails to build is reported and skipped.
+    """
+    existing = await collection.index_information()
+    ready = set()
+    for spec in specs:
+        if index_satisfied(spec, existing):
+            ready.add(spec.name)
+            continue
+        try:
+            await collection.create_index(list(spec.keys), name=spec.name, **spec.options)
+            ready.add(spec.name)
+            print(f"✅ Created index {spec.name}")
+        except Exception as error:
+            print(f"Warning: Could not create index {spec.name}: {error}")
+    return ready
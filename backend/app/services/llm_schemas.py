@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional, Type, Union
+
+from pydantic import BaseModel, ConfigDict, Field
+
+# Typed Stage 1 / Stage 2 LLM outputs. The same models produce the JSON
+# schema sent as response_format and parse the reply, so there is no
+# fence-stripping or free-form json.loads on the way in.
+
+class _Output(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
+class CategoryIn(_Output):
+    values: List[str] = Field(alias="$in")
+
+class PriceRange(_Output):
+    gte: Optional[int] = Field(None, alias="$gte")
+    gt: Optional[int] = Field(None, alias="$gt")
+    lte: Optional[int] = Field(None, alias="$lte")
+    lt: Optional[int] = Field(None, alias="$lt")
+
+class Stage1Query(_Output):
+    cateName: Optional[Union[str, CategoryIn]] = Field(None, description="หมวดหมู่เดียว หรือ {\"$in\": [...]} เมื่อหลายหมวด")
+    salePrice: Optional[PriceRange] = None
+
+    def to_mongo(self) -> Dict[str, Any]:
+        """
+        Mongo filter with unset operators dropped (stockQuantity is added by
+        validation). A field left with no operator, an empty $in or an empty
+        category name is dropped too - each would match no product.
+        """
+        query = self.model_dump(by_alias=True, exclude_none=True)
+        if query.get("salePrice") == {}:
+            del query["salePrice"]
+        category = query.get("cateName")
+        if isinstance(category, dict):
+            category["$in"] = [name for name in category["$in"] if name.strip()]
+            if not category["$in"]:
+                del query["cateName"]
+        elif category is not None and not category.strip():
+            del query["cateName"]
+        return query
+
+class Budget(_Output):
+    max: Optional[int] = None
+    min: Optional[int] = None
+
+class ProcessedTerms(_Output):
+    stage1_filter_used: List[str] = Field(default_factory=list, description="วลี stage1_filter ที่ใช้ทำ query")
+    stage1_inference_used: List[str] = Field(default_factory=list, description="วลี stage1_inference ที่อนุมานและใช้ทำ query")
+    stage2_content_phrases: List[str] = Field(default_factory=list, description="วลีส่งไป Stage 2")
+    stage3_question_phrases: List[str] = Field(default_factory=list, description="วลีส่งไป Stage 3")
+    category: Optional[str] = Field(None, description="หมวดหมู่ที่ระบุได้")
+    budget: Optional[Budget] = None
+    used: List[str] = Field(default_factory=list, description="รวมวลีที่ใช้ใน Stage 1")
+    remaining: List[str] = Field(default_factory=list, description="รวมวลีส่งไป Stage 2+3")
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The processedTerms dict the rest of the pipeline reads (unset keys absent)"""
+        terms = self.model_dump(exclude_none=True)
+        if terms.get("budget") == {}:
+            del terms["budget"]
+        return terms
+
+class Stage1Output(_Output):
+    mongoQuery: Stage1Query = Field(default_factory=Stage1Query)
+    processedTerms: ProcessedTerms = Field(default_factory=ProcessedTerms)
+    reasoning: str = Field("Stage 1 three-stage analysis", description="อธิบายการวิเคราะห์แต่ละวลีและการตัดสินใจ")
+    queryType: str = "three_stage_analysis"
+
+class MatchDetails(_Output):
+    titleMatches: List[str] = Field(default_factory=list)
+    descriptionMatches: List[str] = Field(default_factory=list)
+    reasoning: str = ""
+
+class SelectedProduct(_Output):
+    index: int = Field(description="ลำดับสินค้าใน PRODUCTS TO ANALYZE เริ่มที่ 0")
+    score: int = Field(description="คะแนนความเหมาะสม 0-100")
+    matchDetails: MatchDetails = Field(default_factory=MatchDetails)
+
+class Stage2Output(_Output):
+    selectedProducts: List[SelectedProduct] = Field(default_factory=list)
+    analysisSummary: str = Field("", description="สรุปการวิเคราะห์ content phrases")
+    unmatchedTerms: List[str] = Field(default_factory=list, description="คำที่ไม่พบในสินค้าใดเลย")
+
+def _make_strict(node: Any):
+    """Strict structured-output rules: every property required, no extras, no defaults or titles"""
+    if isinstance(node, list):
+        for value in node:
+            _make_strict(value)
+    elif isinstance(node, dict):
+        node.pop("title", None)
+        node.pop("default", None)
+        if "properties" in node:
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+            for value in node["properties"].values():
+                _make_strict(value)
+        for key, value in node.items():
+            if key != "properties":
+                _make_strict(value)
+    return node
+
+def strict_json_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    return _make_strict(model.model_json_schema(by_alias=True))
+
+def json_schema_format(model: Type[BaseModel], name: str) -> Dict[str, Any]:
+    """response_format for the API's JSON-schema (structured output) mode"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "strict": True, "schema": strict_json_schema(model)}
+    }
+
+STAGE1_RESPONSE_FORMAT = json_schema_format(Stage1Output, "stage1_query")
+STAGE2_RESPONSE_FORMAT = json_schema_format(Stage2Output, "stage2_selection")
@@ -0,0 +1,280 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Pipeline timing spans and LLM token counts, exposed on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Pipeline stages take milliseconds (local ranking) to several seconds (LLM calls)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+PROMPT_CHAR_BUCKETS = (500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Counter:
+    """Monotonic counter with a fixed label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in values
+        ]
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[2] if series else 0
+
+    def total(self, **labels) -> float:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return series[1] if series else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = []
+        for key, (counts, total, count) in series:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(pairs)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Named metrics plus gauge callbacks, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Optional[float]]]] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, read: Callable[[], Optional[float]]):
+        """Gauge whose value is read at scrape time (e.g. from an existing stats() dict)"""
+        self._gauges[name] = (documentation, read)
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for name, (documentation, read) in self._gauges.items():
+            try:
+                value = read()
+            except Exception as error:
+                print(f"Warning: Could not read gauge {name}: {error}")
+                continue
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "chatbot_stage_duration_seconds",
+    "Duration of each chat pipeline stage",
+    ["stage"]
+)
+mongo_query_duration = registry.histogram(
+    "chatbot_mongo_query_duration_seconds",
+    "Duration of product searches by fallback tier and source (mongo or replica)",
+    ["tier", "source"]
+)
+llm_first_chunk = registry.histogram(
+    "chatbot_llm_first_chunk_seconds",
+    "Time to the first streamed chunk of an LLM completion",
+    ["stage"]
+)
+llm_tokens = registry.histogram(
+    "chatbot_llm_tokens",
+    "Tokens per LLM call from response.usage (cached = prompt tokens served from the prefix cache)",
+    ["stage", "kind"],
+    buckets=TOKEN_BUCKETS
+)
+llm_tokens_total = registry.counter(
+    "chatbot_llm_tokens_total",
+    "Tokens spent on LLM calls from response.usage",
+    ["stage", "kind"]
+)
+prompt_chars = registry.histogram(
+    "chatbot_llm_prompt_chars",
+    "Characters of prompt text sent per LLM call",
+    ["stage"],
+    buckets=PROMPT_CHAR_BUCKETS
+)
+coalesced_requests = registry.counter(
+    "chatbot_coalesced_requests_total",
+    "Chat requests answered by an identical request's pipeline run (in_flight or window)",
+    ["when"]
+)
+request_tokens = registry.histogram(
+    "chatbot_request_tokens",
+    "LLM tokens spent per chat request (all stages)",
+    ["kind"],
+    buckets=TOKEN_BUCKETS
+)
+
+# Token totals of the chat request being processed; child tasks share the dict
+_request_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("request_usage", default=None)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into chatbot_stage_duration_seconds, errors included"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if METRICS_ENABLED:
+            stage_duration.observe(time.perf_counter() - started, stage=stage)
+
+@contextmanager
+def mongo_query_span(tier: str, source: str = "mongo") -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if METRICS_ENABLED:
+            mongo_query_duration.observe(time.perf_counter() - started, tier=tier, source=source)
+
+def usage_counts(usage: Any) -> Tuple[int, int]:
+    """(prompt, completion) tokens from a usage object, or the plain dict streamed chunks carry"""
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return int(usage.get("prompt_tokens") or 0), int(usage.get("completion_tokens") or 0)
+    return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+def cached_prompt_tokens(usage: Any) -> int:
+    """Prompt tokens served from the provider's prefix cache (usage.prompt_tokens_details.cached_tokens)"""
+    if usage is None:
+        return 0
+    if isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details") or {}
+    else:
+        details = getattr(usage, "prompt_tokens_details", None) or {}
+    if isinstance(details, dict):
+        return int(details.get("cached_tokens") or 0)
+    return int(getattr(details, "cached_tokens", 0) or 0)
+
+def record_llm_usage(stage: str, usage: Any):
+    """Record response.usage of one LLM call for its stage and the current request"""
+    prompt_tokens, completion_tokens = usage_counts(usage)
+    if not METRICS_ENABLED or not (prompt_tokens or completion_tokens):
+        return
+    cached_tokens = cached_prompt_tokens(usage)
+    for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens), ("cached", cached_tokens)):
+        llm_tokens.observe(tokens, stage=stage, kind=kind)
+        llm_tokens_total.inc(tokens, stage=stage, kind=kind)
+    current = _request_usage.get()
+    if current is not None:
+        current["prompt"] += prompt_tokens
+        current["completion"] += completion_tokens
+        current["cached"] += cached_tokens
+
+def record_prompt_size(stage: str, prompt: Union[str, List[Dict[str, str]]]):
+    """Characters sent for one call; a message list counts every message's content"""
+    if METRICS_ENABLED:
+        if not isinstance(prompt, str):
+            prompt = "".join(message.get("content") or "" for message in prompt)
+        prompt_chars.observe(len(prompt), stage=stage)
+
+def record_first_chunk(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        llm_first_chunk.observe(seconds, stage=stage)
+
+@contextmanager
+def track_request() -> Iterator[Dict[str, int]]:
+    """
+    Scope one chat request: times it as the "request" stage and sums the
+    tokens of every LLM call made inside it (including tasks it spawns)
+    """
+    previous = _request_usage.get()
+    usage = {"prompt": 0, "completion": 0, "cached": 0}
+    _request_usage.set(usage)
+    try:
+        with span("request"):
+            yield usage
+    finally:
+        # set() rather than reset(): async generators may finish in another context
+        _request_usage.set(previous)
+        if METRICS_ENABLED and (usage["prompt"] or usage["completion"]):
+            for kind, tokens in usage.items():
+                request_tokens.observe(tokens, kind=kind)
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,287 @@
+import re
+from bisect import bisect_left
+from typing import Any, Dict, List, Tuple
+from app.services.text_normalizer import normalize_text
+
+# Enhanced phrase patterns with context awareness and priority
+PHRASE_PATTERNS: List[Dict[str, Any]] = [
+    # HIGH PRIORITY: Clear filter phrases (Stage 1 - Direct filtering)
+    {
+        "pattern": r'(?:อยากได้|ต้องการ|หา|ซื้อ)\s*(โน้ตบุ๊ก|คอมพิวเตอร์|คอม|การ์ดจอ|เมาส์|คีย์บอร์ด|หูฟัง|จอ|ซีพียู|แรม)',
+        "type": "PRODUCT_DESIRE_FILTER",
+        "stage": "stage1_filter",
+        "priority": 10
+    },
+    {
+        "pattern": r'(โน้?[ตด]บุ๊?[กค]|คอมพิวเตอร์|คอมตั้งโต๊ะ|การ์ดจอ|เมาส์|คีย์บอร์ด|หูฟัง|จอมอนิเตอร์|ซีพียู|แรม|เครื่องพิมพ์)(?!\s*[เล่นทำใช้])',
+        "type": "CATEGORY_FILTER",
+        "stage": "stage1_filter",
+        "priority": 9
+    },
+    {
+        "pattern": r'(?:งบ|ไม่เกิน|ประมาณ|ราคา|budget)[\s\w]*?(\d{1,3}(?:,\d{3})*|\d+)(?:\s*บาท|$)',
+        "type": "BUDGET_FILTER",
+        "stage": "stage1_filter",
+        "priority": 9
+    },
+    {
+        "pattern": r'ราคา[\s\w]*?(\d{1,3}(?:,\d{3})*|\d+)',
+        "type": "BUDGET_FILTER",
+        "stage": "stage1_filter",
+        "priority": 9
+    },
+
+    # MEDIUM PRIORITY: Specific product names (Stage 1 - Category inference + Stage 2)
+    {
+        "pattern": r'(Ryzen\s*\d+\s*\d+\w*|Intel\s*Core\s*i\d+|RTX\s*\d+\w*|GTX\s*\d+\w*|AMD\s*\w*\d+\w*)',
+        "type": "SPECIFIC_PRODUCT_NAME",
+        "stage": "stage1_inference",  # อนุมานหมวดหมู่ + ส่งไป Stage 2
+        "priority": 8
+    },
+    {
+        "pattern": r'(ASUS|HP|Dell|MSI|Acer|Lenovo|Apple|Razer|Logitech|Corsair|Gigabyte|EVGA)\s*[\w\s]*',
+        "type": "BRAND_PRODUCT",
+        "stage": "stage2_content",
+        "priority": 7
+    },
+
+    # CONTENT ANALYSIS: Usage and application phrases (Stage 2)
+    {
+        "pattern": r'ทำงานกราฟิก',
+        "type": "USAGE_GRAPHICS",
+        "stage": "stage2_content",
+        "priority": 9  # เพิ่ม priority เพื่อจับก่อน pattern อื่น
+    },
+    {
+        "pattern": r'เล่นเกม\s*(?!ได้ไหม)[\w\s]*',
+        "type": "USAGE_GAMING",
+        "stage": "stage2_content",
+        "priority": 8
+    },
+    {
+        "pattern": r'(?:ทำงาน|ใช้งาน|สำหรับ)(?!กราฟิก)[\w\s]*(?=\s|$)',
+        "type": "USAGE_GENERAL",
+        "stage": "stage2_content",
+        "priority": 6
+    },
+    {
+        "pattern": r'(?:ออฟฟิศ|เอกสาร|โปรแกรม|ซอฟต์แวร์)[\w\s]*',
+        "type": "USAGE_OFFICE",
+        "stage": "stage2_content",
+        "priority": 6
+    },
+
+    # QUESTIONS: Request and question phrases (Stage 3)
+    {
+        "pattern": r'เล่นเกมได้ไหม',
+        "type": "GAMING_QUESTION",
+        "stage": "stage3_questions",
+        "priority": 9
+    },
+    {
+        "pattern": r'(?:แนะนำ|recommend)(?:\s*หน่อย|\s*ได้ไหม|\s*ดี)*',
+        "type": "RECOMMENDATION_REQUEST",
+        "stage": "stage3_questions",
+        "priority": 8
+    },
+    {
+        "pattern": r'ดีไหม|เป็นอย่างไร|ใช้ได้ไหม',
+        "type": "GENERAL_QUESTION",
+        "stage": "stage3_questions",
+        "priority": 8  # เพิ่ม priority ให้สูงกว่า budget pattern
+    },
+    {
+        "pattern": r'(?:รุ่นไหนดี|มีอะไรบ้าง|มีไหม)',
+        "type": "PRODUCT_INQUIRY",
+        "stage": "stage3_questions",
+        "priority": 7
+    },
+
+    # SPECIFICATIONS (Stage 2)
+    {
+        "pattern": r'(?:\d+GB\s*(?:RAM|แรม)|mechanical|ไร้สาย|RGB|wireless)',
+        "type": "SPECIFICATION",
+        "stage": "stage2_content",
+        "priority": 6
+    }
+]
+
+# คำสำคัญที่ยังไม่ถูกจับ แต่ควรส่งไป Stage 2
+IMPORTANT_FALLBACK_WORDS = frozenset(['ryzen', 'intel', 'rtx', 'gtx', 'asus', 'hp', 'dell', 'msi'])
+
+STAGE_CLASSIFICATION = {
+    "stage1_filter": "filter_phrases",
+    "stage1_inference": "context_inferred_phrases",
+    "stage2_content": "content_analysis_phrases",
+    "stage3_questions": "question_phrases"
+}
+
+class ConsumedSpans:
+    """Sorted, non-overlapping character intervals already claimed by a phrase"""
+
+    def __init__(self):
+        self._starts: List[int] = []
+        self._spans: List[Tuple[int, int]] = []
+
+    def add(self, start: int, end: int):
+        """Claim [start, end), merging with any interval it touches or overlaps"""
+        low = bisect_left(self._starts, start)
+        if low > 0 and self._spans[low - 1][1] >= start:
+            low -= 1
+        high = low
+        while high < len(self._spans) and self._spans[high][0] <= end:
+            high += 1
+        if high > low:
+            start = min(start, self._spans[low][0])
+            end = max(end, self._spans[high - 1][1])
+        self._starts[low:high] = [start]
+        self._spans[low:high] = [(start, end)]
+
+    def overlaps(self, start: int, end: int) -> bool:
+        index = bisect_left(self._starts, end)
+        return index > 0 and self._spans[index - 1][1] > start
+
+    def mask(self, text: str) -> str:
+        """Text with every consumed interval blanked out with spaces"""
+        pieces = []
+        last = 0
+        for start, end in self._spans:
+            pieces.append(text[last:start])
+            pieces.append(' ' * (end - start))
+            last = end
+        pieces.append(text[last:])
+        return ''.join(pieces)
+
+class PhraseSegmenter:
+    """
+    Compiled contextual phrase segmenter.
+
+    The prioritized pattern table is sorted and compiled once. Text consumed
+    by a phrase is tracked as intervals rather than rewritten match by
+    match; the masked text later patterns run against is rebuilt once per
+    pattern that claimed something.
+    """
+
+    def __init__(self, patterns: List[Dict[str, Any]] = PHRASE_PATTERNS):
+        # Sort patterns by priority (highest first) - stable, so table order breaks ties
+        ordered = sorted(patterns, key=lambda x: x['priority'], reverse=True)
+        self._patterns = [
+            (re.compile(p['pattern'], re.IGNORECASE), p['type'], p['stage'])
+            for p in ordered
+        ]
+        self._whitespace = re.compile(r'\s+')
+        self._important_word = re.compile(r'\b\w{4,}\b')
+        self._long_number = re.compile(r'\d{4,}')
+        self._basic_word = re.compile(r'\b\w{2,}\b')
+
+    @staticmethod
+    def _overlaps_found(phrase: str, exact: set, long_phrases: List[str]) -> bool:
+        """Same phrase already found, or substring overlap between phrases longer than 5 chars"""
+        if phrase in exact:
+            return True
+        if len(phrase) > 5:
+            for existing in long_phrases:
+                if phrase in existing or existing in phrase:
+                    return True
+        return False
+
+    def _extract_phrases(self, source: str) -> Tuple[List[Tuple[str, str, str]], str]:
+        found_phrases = []
+        exact = set()
+        long_phrases = []
+        consumed = ConsumedSpans()
+        masked = source
+
+        for regex, phrase_type, stage in self._patterns:
+            claimed = False
+            claimed_now = ConsumedSpans()
+
+            for match in regex.finditer(masked):
+                phrase = match.group().strip()
+                if not phrase or len(phrase) <= 1:
+                    continue
+
+                phrase_lower = phrase.lower()
+                if self._overlaps_found(phrase_lower, exact, long_phrases):
+                    continue
+
+                found_phrases.append((phrase, phrase_type, stage))
+                exact.add(phrase_lower)
+                if len(phrase_lower) > 5:
+                    long_phrases.append(phrase_lower)
+
+                # Claim the first occurrence of the phrase not already claimed in this pass
+                position = masked.find(phrase_lower)
+                while position >= 0 and claimed_now.overlaps(position, position + len(phrase_lower)):
+                    position = masked.find(phrase_lower, position + 1)
+                if position >= 0:
+                    consumed.add(position, position + len(phrase_lower))
+                    claimed_now.add(position, position + len(phrase_lower))
+                    claimed = True
+
+            if claimed:
+                masked = consumed.mask(source)
+
+        return found_phrases, masked
+
+    def segment(self, text: str) -> Dict[str, Any]:
+        """Segment text into phrases with their types and processing stage assignments"""
+        normalized = normalize_text(text)
+
+        result = {
+            "original_text": text,
+            "normalized_text": normalized,
+            "segmented_phrases": [],
+            "phrase_classification": {
+                "filter_phrases": [],           # วลีที่ระบุ filter ได้ชัดเจน (Stage 1 only)
+                "content_analysis_phrases": [], # วลีระบุสินค้าด้วยเนื้อหา (Stage 2)
+                "question_phrases": [],         # วลีคำถาม/คำแนะนำ (Stage 3)
+                "context_inferred_phrases": []  # วลีที่ต้องอนุมานจากบริบท (Stage 1 inference)
+            },
+            "stage_assignments": {
+                "stage1_filter": [],
+                "stage1_inference": [],
+                "stage2_content": [],
+                "stage3_questions": []
+            }
+        }
+
+        # ใช้ original text สำหรับ matching เพื่อให้จับ "ทำงานกราฟิก" ได้
+        found_phrases, masked = self._extract_phrases(text.lower())
+
+        # Limited fallback: เฉพาะคำสำคัญที่ไม่ได้ถูกจับ
+        remaining_text = self._whitespace.sub(' ', masked).strip()
+        existing_phrases_lower = set(p[0].lower() for p in found_phrases)
+        for word in self._important_word.findall(remaining_text):
+            if len(word) > 3 and word.lower() not in existing_phrases_lower:
+                if word in IMPORTANT_FALLBACK_WORDS or self._long_number.match(word):
+                    found_phrases.append((word, "IMPORTANT_FALLBACK", "stage2_content"))
+
+        for phrase, phrase_type, stage in found_phrases:
+            result["segmented_phrases"].append({
+                "phrase": phrase,
+                "type": phrase_type,
+                "stage": stage,
+                "original_text": phrase
+            })
+            if stage in STAGE_CLASSIFICATION:
+                result["phrase_classification"][STAGE_CLASSIFICATION[stage]].append(phrase)
+                result["stage_assignments"][stage].append(phrase)
+
+        # Final fallback: if still no phrases found, create basic segmentation
+        if not found_phrases:
+            words = self._basic_word.findall(normalized)
+            if words:
+                basic_phrase = ' '.join(words)
+                result["segmented_phrases"].append({
+                    "phrase": basic_phrase,
+                    "type": "FALLBACK_ANALYSIS",
+                    "stage": "stage2_content",
+                    "original_text": basic_phrase
+                })
+                result["phrase_classification"]["content_analysis_phrases"].append(basic_phrase)
+                result["stage_assignments"]["stage2_content"].append(basic_phrase)
+
+        return result
+
+default_segmenter = PhraseSegmenter()
@@ -0,0 +1,110 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from app.services.metrics import METRICS_ENABLED, coalesced_requests
+
+# Identical concurrent chat queries share one pipeline run
+CHAT_COALESCING_ENABLED = os.getenv("CHAT_COALESCING_ENABLED", "true").lower() == "true"
+# After the shared run finishes its result is still handed to identical queries
+# arriving within this many seconds (0 = share only while in flight)
+CHAT_COALESCING_WINDOW_SECONDS = float(os.getenv("CHAT_COALESCING_WINDOW_SECONDS", "1"))
+
+def _keep_all(result: Any) -> bool:
+    return True
+
+class SingleFlight:
+    """
+    Per-key request coalescing: the first caller (leader) starts the
+    computation as a task and identical callers await the same task. The
+    task is shielded, so a disconnecting caller never cancels the run the
+    others are waiting on. Failures reach every waiter and are not kept.
+    """
+
+    def __init__(self, window_seconds: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        # key -> (expires_at, result) for runs that finished within the window
+        self._recent: Dict[Hashable, Tuple[float, Any]] = {}
+        self.leaders = 0
+        self.collapsed_in_flight = 0
+        self.collapsed_window = 0
+
+    def join(self, key: Hashable) -> Optional[Awaitable[Any]]:
+        """The result of an identical run in flight or finished within the window, or None"""
+        entry = self._recent.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > self._clock():
+                self._count("window")
+                future = asyncio.get_running_loop().create_future()
+                future.set_result(result)
+                return future
+            del self._recent[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._count("in_flight")
+            return asyncio.shield(task)
+        return None
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]], keep: Callable[[Any], bool] = _keep_all) -> Any:
+        """
+        compute() once for concurrent callers with the same key. `keep` decides
+        whether a finished result may be reused within the window.
+        """
+        shared = self.join(key)
+        if shared is not None:
+            return await shared
+
+        self.leaders += 1
+        task = asyncio.ensure_future(compute())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done, keep))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task, keep: Callable[[Any], bool]):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # exception() also marks a failure as retrieved when every waiter left
+        if task.cancelled() or task.exception() is not None:
+            return
+        now = self._clock()
+        for stale in [stale for stale, (expires_at, _) in self._recent.items() if expires_at <= now]:
+            del self._recent[stale]
+        if self.window_seconds > 0:
+            try:
+                reusable = keep(task.result())
+            except Exception as error:
+                print(f"Warning: Could not check coalesced result: {error}")
+                reusable = False
+            if reusable:
+                self._recent[key] = (now + self.window_seconds, task.result())
+
+    def _count(self, when: str):
+        if when == "window":
+            self.collapsed_window += 1
+        else:
+            self.collapsed_in_flight += 1
+        if METRICS_ENABLED:
+            coalesced_requests.inc(when=when)
+
+    def clear(self):
+        """Forget finished results (in-flight runs still complete for their waiters)"""
+        self._recent.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        collapsed = self.collapsed_in_flight + self.collapsed_window
+        total = self.leaders + collapsed
+        return {
+            "inFlight": len(self._in_flight),
+            "windowSeconds": self.window_seconds,
+            "leaders": self.leaders,
+            "collapsedInFlight": self.collapsed_in_flight,
+            "collapsedWindow": self.collapsed_window,
+            "collapseRate": round(collapsed / total, 4) if total else 0.0
+        }
+
+# Process-wide coalescer for /chat, keyed by the response cache key
+chat_coalescer = SingleFlight(window_seconds=CHAT_COALESCING_WINDOW_SECONDS)
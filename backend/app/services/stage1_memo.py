@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from app.services.cache import TTLCache
+from app.services.catalog_metadata import BACKEND_DIR, CatalogMetadata
+from app.services.text_normalizer import normalize_text
+
+# Stage 1 memo settings - backend is "memory", "sqlite" or "off"
+STAGE1_MEMO_BACKEND = os.getenv("STAGE1_MEMO_BACKEND", "memory").lower()
+STAGE1_MEMO_PATH = os.getenv("STAGE1_MEMO_PATH", os.path.join(BACKEND_DIR, "stage1_memo.sqlite3"))
+STAGE1_MEMO_TTL_SECONDS = float(os.getenv("STAGE1_MEMO_TTL_SECONDS", "86400"))
+STAGE1_MEMO_MAX_ENTRIES = int(os.getenv("STAGE1_MEMO_MAX_ENTRIES", "4096"))
+# How long a SQLite call waits for another worker's write lock before the
+# lookup counts as a miss (or the write is skipped)
+STAGE1_MEMO_BUSY_TIMEOUT_SECONDS = float(os.getenv("STAGE1_MEMO_BUSY_TIMEOUT_SECONDS", "0.05"))
+
+def stage1_memo_key(user_input: str, metadata: CatalogMetadata) -> str:
+    """Stage 1 output depends only on the normalized text and the catalog metadata version"""
+    return metadata.version + "\n" + ' '.join(normalize_text(user_input).split())
+
+class MemoryStage1Store:
+    """Per-process memo; values are kept as JSON so callers never share mutable results"""
+    blocking = False
+
+    def __init__(self, max_entries: int = STAGE1_MEMO_MAX_ENTRIES, ttl_seconds: float = STAGE1_MEMO_TTL_SECONDS):
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._cache.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self._cache.set(key, json.dumps(value, ensure_ascii=False))
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self._cache.stats()}
+
+class SQLiteStage1Store:
+    """
+    File-backed memo shared by every worker on the host and kept across restarts.
+    Entries expire by TTL; the least recently used rows are pruned past max_entries.
+    Calls do file I/O (blocking = True, so async callers run them in a thread)
+    and give up after busy_timeout when another worker holds the write lock.
+    """
+    blocking = True
+
+    def __init__(self, path: str = STAGE1_MEMO_PATH, max_entries: int = STAGE1_MEMO_MAX_ENTRIES, ttl_seconds: float = STAGE1_MEMO_TTL_SECONDS,
+                 busy_timeout: float = STAGE1_MEMO_BUSY_TIMEOUT_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.locked = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # WAL lets several uvicorn workers read while one writes
+        self._connection = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS stage1_memo ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS stage1_memo_last_used ON stage1_memo (last_used)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._connection.execute(
+                    "SELECT value, expires_at FROM stage1_memo WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.OperationalError as error:
+                # "database is locked" - another worker is writing; ask the LLM instead of waiting
+                self._count_locked(error)
+                self.misses += 1
+                return None
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._write("DELETE FROM stage1_memo WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            # The LRU bump is best effort - the row is returned either way
+            self._write("UPDATE stage1_memo SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            if self._write(
+                "INSERT OR REPLACE INTO stage1_memo (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl_seconds, now)
+            ):
+                self._write(
+                    "DELETE FROM stage1_memo WHERE key IN ("
+                    "SELECT key FROM stage1_memo ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def _write(self, statement: str, parameters: tuple) -> bool:
+        """Run a write, skipping it when the lock isn't free within busy_timeout"""
+        try:
+            self._connection.execute(statement, parameters)
+            return True
+        except sqlite3.OperationalError as error:
+            self._count_locked(error)
+            return False
+
+    def _count_locked(self, error: sqlite3.OperationalError):
+        if "locked" not in str(error) and "busy" not in str(error):
+            raise error
+        self.locked += 1
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM stage1_memo")
+
+    def close(self):
+        self._connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM stage1_memo").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "locked": self.locked
+        }
+
+async def memo_get(store, key: str) -> Optional[Dict[str, Any]]:
+    """store.get, off the event loop for stores doing file I/O"""
+    if getattr(store, "blocking", False):
+        return await asyncio.to_thread(store.get, key)
+    return store.get(key)
+
+async def memo_set(store, key: str, value: Dict[str, Any]):
+    """store.set, off the event loop for stores doing file I/O"""
+    if getattr(store, "blocking", False):
+        await asyncio.to_thread(store.set, key, value)
+    else:
+        store.set(key, value)
+
+def create_stage1_store(backend: str = STAGE1_MEMO_BACKEND):
+    """Build the configured store; a SQLite store that cannot be opened falls back to memory"""
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        try:
+            return SQLiteStage1Store()
+        except Exception as error:
+            print(f"Warning: Could not open Stage 1 memo at {STAGE1_MEMO_PATH}: {error} - using in-memory memo")
+    return MemoryStage1Store()
+
+_stage1_store = None
+_stage1_store_ready = False
+
+def get_stage1_memo():
+    """Process-wide Stage 1 memo store (None when disabled)"""
+    global _stage1_store, _stage1_store_ready
+    if not _stage1_store_ready:
+        _stage1_store = create_stage1_store()
+        _stage1_store_ready = True
+    return _stage1_store
+
+def set_stage1_memo(store):
+    """Swap the memo store (tests, or a custom backend)"""
+    global _stage1_store, _stage1_store_ready
+    _stage1_store = store
+    _stage1_store_ready = True
@@ -0,0 +1,164 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+# Normalization rule table, in application order. The order is part of the
+# semantics: every rule sees the text produced by the rules before it, e.g.
+# "vga" -> "การ์ดจอ" is later rewritten by the "จอ" rule.
+NORMALIZATION_RULES: List[Tuple[str, str]] = [
+    # Notebook variations - comprehensive patterns
+    (r'โน้?[ดต๊]บุ๊?[คก]', 'โน้ตบุ๊ก'),
+    (r'โนต?บุ[๊ค]+', 'โน้ตบุ๊ก'),
+    (r'โน๊ตบุ[๊ค]+', 'โน้ตบุ๊ก'),
+    (r'โนคบุค', 'โน้ตบุ๊ก'),
+    (r'โน้ตบุค', 'โน้ตบุ๊ก'),
+    (r'laptop', 'โน้ตบุ๊ก'),
+    (r'notebook', 'โน้ตบุ๊ก'),
+
+    # Graphics card variations
+    (r'การ์[จด]อ', 'การ์ดจอ'),
+    (r'[วฟ]ีจีเอ', 'การ์ดจอ'),
+    (r'กราฟิ?[คกข]', 'การ์ดจอ'),
+    (r'vga', 'การ์ดจอ'),
+    (r'graphics', 'การ์ดจอ'),
+
+    # Computer variations - important for Thai context
+    (r'คอมพิ?วเ?ตอร์', 'คอมพิวเตอร์'),
+    (r'คอม(?!พิ)', 'คอมพิวเตอร์'),  # "คอม" but not "คอมพิ"
+    (r'เครื่อง(?=.*คอม|.*pc)', 'คอมพิวเตอร์'),
+    (r'desktop', 'คอมตั้งโต๊ะ'),
+    (r'pc', 'คอมพิวเตอร์'),
+
+    # Other components
+    (r'คีบอร์?ด', 'คีย์บอร์ด'),
+    (r'เม้าส์', 'เมาส์'),
+    (r'ซีพียู', 'ซีพียู'),
+    (r'cpu', 'ซีพียู'),
+    (r'แรม', 'แรม'),
+    (r'ram', 'แรม'),
+    (r'memory', 'แรม'),
+    (r'หูฟัง', 'หูฟัง'),
+    (r'headphone', 'หูฟัง'),
+    (r'จอ(?!คอม)', 'มอนิเตอร์'),
+    (r'monitor', 'มอนิเตอร์'),
+    (r'โปรเซส[เซส]อร์', 'ซีพียู')
+]
+
+# Inputs where rules interact across match boundaries, so a single left-to-right
+# pass could disagree with applying the rules one after another:
+# - a notebook/graphics match swallowing the "ค" of a following "คอม"
+# - "laptop" swallowing the "p" of a following "pc" ("เครื่อง" lookahead)
+# - "monitor" overlapping a later "ram" (the earlier rule wins sequentially)
+# - a rewritten "จอ" followed by text that only becomes "คอม..." after rewriting
+# - a notebook rewrite ending in "ก" that completes a graphics-card pattern
+# - "กราฟ"/"กราฟิ" directly before a graphics alias whose rewrite "การ์ดจอ"
+#   completes "กราฟิก"
+# These are rare typos/concatenations; they take the sequential path.
+NORMALIZATION_HAZARDS: List[str] = [
+    r'(?:บุ[๊ค]*|กราฟิ?)คอม',
+    r'laptopc',
+    r'monitoram',
+    r'(?:จอ|vga|graphics|[วฟ]ีจีเอ|กราฟิ?[คกข])(?:desktop|pc|เครื่อง)',
+    r'(?:[คก๊]|laptop|notebook)(?:าร์[จด]อ|ราฟิ?[คกข])',
+    r'กราฟิ?(?:vga|graphics|[วฟ]ีจีเอ|การ์[จด]อ)'
+]
+
+def _first_chars(pattern: str) -> str:
+    """Characters a table pattern can start with (literal, class or leading group)"""
+    if pattern.startswith('(?:'):
+        return ''.join(_first_chars(branch) for branch in pattern[3:pattern.index(')')].split('|'))
+    if pattern.startswith('['):
+        return pattern[1:pattern.index(']')]
+    return pattern[0]
+
+def _first_char_class(patterns: Iterable[str]) -> str:
+    """Character class of every character a pattern in the table can start with"""
+    return '[' + ''.join(sorted(set(''.join(_first_chars(pattern) for pattern in patterns)))) + ']'
+
+class ThaiTextNormalizer:
+    """
+    Compiled normalization engine for Thai/English product queries.
+
+    The rule table is compiled once into a single alternation; one
+    ``re.sub`` pass dispatches each match to its rule's replacement. When a
+    replacement would itself be rewritten by later rules (e.g. "การ์ดจอ"
+    by the "จอ" rule) the follow-up rules are applied to it in the dispatch
+    step, so the output matches sequential rule application.
+    """
+
+    def __init__(self, rules: List[Tuple[str, str]] = NORMALIZATION_RULES, hazards: List[str] = NORMALIZATION_HAZARDS):
+        self._rules = [(re.compile(pattern, re.IGNORECASE), replacement) for pattern, replacement in rules]
+
+        # The leading lookahead lets the scanner skip positions where no rule can
+        # start without trying every alternative
+        self._combined = re.compile(
+            '(?=' + _first_char_class(pattern for pattern, _ in rules) + ')(?:'
+            + '|'.join(f'(?P<r{i}>{pattern})' for i, (pattern, _) in enumerate(rules)) + ')',
+            re.IGNORECASE
+        )
+        self._hazards = re.compile(
+            '(?=' + _first_char_class(hazards) + ')(?:' + '|'.join(hazards) + ')',
+            re.IGNORECASE
+        )
+
+        # For each rule, the later rules that can still match inside its replacement
+        self._followups = []
+        for i, (_, replacement) in enumerate(self._rules):
+            self._followups.append([
+                (regex, later_replacement)
+                for regex, later_replacement in self._rules[i + 1:]
+                if regex.search(replacement)
+            ])
+
+    def _dispatch(self, match: re.Match) -> str:
+        index = int(match.lastgroup[1:])
+        output = self._rules[index][1]
+        followups = self._followups[index]
+        if not followups:
+            return output
+
+        # Apply later rules to the replacement, with the rest of the input as
+        # right context for lookaheads
+        tail = match.string[match.end():]
+        for regex, later_replacement in followups:
+            text = output + tail
+            pieces = []
+            last = 0
+            for later_match in regex.finditer(text):
+                if later_match.end() > len(output):
+                    break
+                pieces.append(text[last:later_match.start()])
+                pieces.append(later_replacement)
+                last = later_match.end()
+            output = ''.join(pieces) + output[last:]
+        return output
+
+    def normalize_sequential(self, text: str) -> str:
+        """Apply the compiled rules one after another (reference semantics)"""
+        normalized = text.lower()
+        for regex, replacement in self._rules:
+            normalized = regex.sub(replacement, normalized)
+        return normalized
+
+    def normalize(self, text: str) -> str:
+        """Normalize one text in a single combined pass"""
+        normalized = text.lower()
+        if self._hazards.search(normalized):
+            return self.normalize_sequential(normalized)
+        return self._combined.sub(self._dispatch, normalized)
+
+    def normalize_many(self, texts: Iterable[str]) -> List[str]:
+        """Batch normalization for offline jobs"""
+        normalize = self.normalize
+        return [normalize(text) for text in texts]
+
+default_normalizer = ThaiTextNormalizer()
+
+@lru_cache(maxsize=2048)
+def normalize_text(text: str) -> str:
+    """Normalize with the shared engine; repeated calls for the same text are cached"""
+    return default_normalizer.normalize(text)
+
+def normalize_many(texts: Iterable[str]) -> List[str]:
+    """Batch normalization with the shared engine"""
+    return default_normalizer.normalize_many(texts)
@@ -1,516 +1,45 @@
 import os
 import json
 import re
-from openai import OpenAI
-from typing import List, Dict, Any, Tuple
+import time
+import httpx
+from openai import AsyncOpenAI
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
 from app.models import Product
-
-# Initialize OpenAI client with error handling
-def get_openai_client():
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is required")
-    return OpenAI(api_key=api_key)
-
-client = None
-
-# Enhanced text normalization for better Thai language processing
-def normalize_text_advanced(text: str) -> str:
-    """Advanced text normalization with comprehensive Thai language support"""
-    normalized = text.lower()
-    
-    # Notebook variations - comprehensive patterns
-    notebook_patterns = [
-        (r'โน้?[ดต๊]บุ๊?[คก]', 'โน้ตบุ๊ก'),
-        (r'โนต?บุ[๊ค]+', 'โน้ตบุ๊ก'),
-        (r'โน๊ตบุ[๊ค]+', 'โน้ตบุ๊ก'),
-        (r'โนคบุค', 'โน้ตบุ๊ก'),
-        (r'โน้ตบุค', 'โน้ตบุ๊ก'),
-        (r'laptop', 'โน้ตบุ๊ก'),
-        (r'notebook', 'โน้ตบุ๊ก')
-    ]
-    
-    # Graphics card variations
-    graphics_patterns = [
-        (r'การ์[จด]อ', 'การ์ดจอ'),
-        (r'[วฟ]ีจีเอ', 'การ์ดจอ'),
-        (r'กราฟิ?[คกข]', 'การ์ดจอ'),
-        (r'vga', 'การ์ดจอ'),
-        (r'graphics', 'การ์ดจอ')
-    ]
-    
-    # Computer variations - important for Thai context
-    computer_patterns = [
-        (r'คอมพิ?วเ?ตอร์', 'คอมพิวเตอร์'),
-        (r'คอม(?!พิ)', 'คอมพิวเตอร์'),  # "คอม" but not "คอมพิ"
-        (r'เครื่อง(?=.*คอม|.*pc)', 'คอมพิวเตอร์'),
-        (r'desktop', 'คอมตั้งโต๊ะ'),
-        (r'pc', 'คอมพิวเตอร์')
-    ]
-    
-    # Other components
-    component_patterns = [
-        (r'คีบอร์?ด', 'คีย์บอร์ด'),
-        (r'เม้าส์', 'เมาส์'),
-        (r'ซีพียู', 'ซีพียู'),
-        (r'cpu', 'ซีพียู'),
-        (r'แรม', 'แรม'),
-        (r'ram', 'แรม'),
-        (r'memory', 'แรม'),
-        (r'หูฟัง', 'หูฟัง'),
-        (r'headphone', 'หูฟัง'),
-        (r'จอ(?!คอม)', 'มอนิเตอร์'),
-        (r'monitor', 'มอนิเตอร์'),
-        (r'โปรเซส[เซส]อร์', 'ซีพียู')
-    ]
-    
-    # Apply all patterns
-    all_patterns = notebook_patterns + graphics_patterns + computer_patterns + component_patterns
-    
-    for pattern, replacement in all_patterns:
-        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
-    
-    return normalized
-
-# Enhanced contextual phrase segmentation with better context analysis
-def enhanced_contextual_phrase_segmentation(text: str) -> Dict[str, Any]:
-    """
-    Enhanced phrase segmentation with context analysis and phrase classification
-    Returns segmented phrases with their types and processing stage assignments
-    """
-    import re
-    
-    # Normalize first
-    normalized = normalize_text_advanced(text)
-    
-    # Initialize result structure
-    result = {
-        "original_text": text,
-        "normalized_text": normalized,
-        "segmented_phrases": [],
-        "phrase_classification": {
-            "filter_phrases": [],           # วลีที่ระบุ filter ได้ชัดเจน (Stage 1 only)
-            "content_analysis_phrases": [], # วลีระบุสินค้าด้วยเนื้อหา (Stage 2)
-            "question_phrases": [],         # วลีคำถาม/คำแนะนำ (Stage 3)
-            "context_inferred_phrases": []  # วลีที่ต้องอนุมานจากบริบท (Stage 1 inference)
-        },
-        "stage_assignments": {
-            "stage1_filter": [],
-            "stage1_inference": [],
-            "stage2_content": [],
-            "stage3_questions": []
-        }
-    }
-    
-    # Enhanced phrase patterns with context awareness and priority
-    phrase_patterns = [
-        # HIGH PRIORITY: Clear filter phrases (Stage 1 - Direct filtering)
-        {
-            "pattern": r'(?:อยากได้|ต้องการ|หา|ซื้อ)\s*(โน้ตบุ๊ก|คอมพิวเตอร์|คอม|การ์ดจอ|เมาส์|คีย์บอร์ด|หูฟัง|จอ|ซีพียู|แรม)',
-            "type": "PRODUCT_DESIRE_FILTER",
-            "stage": "stage1_filter",
-            "priority": 10
-        },
-        {
-            "pattern": r'(โน้?[ตด]บุ๊?[กค]|คอมพิวเตอร์|คอมตั้งโต๊ะ|การ์ดจอ|เมาส์|คีย์บอร์ด|หูฟัง|จอมอนิเตอร์|ซีพียู|แรม|เครื่องพิมพ์)(?!\s*[เล่นทำใช้])',
-            "type": "CATEGORY_FILTER",
-            "stage": "stage1_filter", 
-            "priority": 9
-        },
-        {
-            "pattern": r'(?:งบ|ไม่เกิน|ประมาณ|ราคา|budget)[\s\w]*?(\d{1,3}(?:,\d{3})*|\d+)(?:\s*บาท|$)',
-            "type": "BUDGET_FILTER",
-            "stage": "stage1_filter",
-            "priority": 9
-        },
-        {
-            "pattern": r'ราคา[\s\w]*?(\d{1,3}(?:,\d{3})*|\d+)',
-            "type": "BUDGET_FILTER",
-            "stage": "stage1_filter",
-            "priority": 9
-        },
-        
-        # MEDIUM PRIORITY: Specific product names (Stage 1 - Category inference + Stage 2)
-        {
-            "pattern": r'(Ryzen\s*\d+\s*\d+\w*|Intel\s*Core\s*i\d+|RTX\s*\d+\w*|GTX\s*\d+\w*|AMD\s*\w*\d+\w*)',
-            "type": "SPECIFIC_PRODUCT_NAME",
-            "stage": "stage1_inference", # อนุมานหมวดหมู่ + ส่งไป Stage 2
-            "priority": 8
-        },
-        {
-            "pattern": r'(ASUS|HP|Dell|MSI|Acer|Lenovo|Apple|Razer|Logitech|Corsair|Gigabyte|EVGA)\s*[\w\s]*',
-            "type": "BRAND_PRODUCT",
-            "stage": "stage2_content",
-            "priority": 7
-        },
-        
-        # CONTENT ANALYSIS: Usage and application phrases (Stage 2)
-        {
-            "pattern": r'ทำงานกราฟิก',
-            "type": "USAGE_GRAPHICS",
-            "stage": "stage2_content",
-            "priority": 9  # เพิ่ม priority เพื่อจับก่อน pattern อื่น
-        },
-        {
-            "pattern": r'เล่นเกม\s*(?!ได้ไหม)[\w\s]*',
-            "type": "USAGE_GAMING",
-            "stage": "stage2_content",
-            "priority": 8
-        },
-        {
-            "pattern": r'(?:ทำงาน|ใช้งาน|สำหรับ)(?!กราฟิก)[\w\s]*(?=\s|$)',
-            "type": "USAGE_GENERAL",
-            "stage": "stage2_content", 
-            "priority": 6
-        },
-        {
-            "pattern": r'(?:ออฟฟิศ|เอกสาร|โปรแกรม|ซอฟต์แวร์)[\w\s]*',
-            "type": "USAGE_OFFICE",
-            "stage": "stage2_content",
-            "priority": 6
-        },
-        
-        # QUESTIONS: Request and question phrases (Stage 3)
-        {
-            "pattern": r'เล่นเกมได้ไหม',
-            "type": "GAMING_QUESTION",
-            "stage": "stage3_questions",
-            "priority": 9
-        },
-        {
-            "pattern": r'(?:แนะนำ|recommend)(?:\s*หน่อย|\s*ได้ไหม|\s*ดี)*',
-            "type": "RECOMMENDATION_REQUEST",
-            "stage": "stage3_questions",
-            "priority": 8
-        },
-        {
-            "pattern": r'ดีไหม|เป็นอย่างไร|ใช้ได้ไหม',
-            "type": "GENERAL_QUESTION",
-            "stage": "stage3_questions",
-            "priority": 8  # เพิ่ม priority ให้สูงกว่า budget pattern
-        },
-        {
-            "pattern": r'(?:รุ่นไหนดี|มีอะไรบ้าง|มีไหม)',
-            "type": "PRODUCT_INQUIRY",
-            "stage": "stage3_questions",
-            "priority": 7
-        },
-        
-        # SPECIFICATIONS (Stage 2)
-        {
-            "pattern": r'(?:\d+GB\s*(?:RAM|แรม)|mechanical|ไร้สาย|RGB|wireless)',
-            "type": "SPECIFICATION",
-            "stage": "stage2_content",
-            "priority": 6
-        }
-    ]
-    
-    # Track processed text to avoid overlapping matches
-    processed_text = normalized.lower()
-    found_phrases = []
-    
-    # Sort patterns by priority (highest first)
-    sorted_patterns = sorted(phrase_patterns, key=lambda x: x['priority'], reverse=True)
-    
-    # Extract phrases using prioritized patterns - เก็บ original text สำหรับ matching แต่ใช้ normalized text สำหรับ pattern
-    original_text = text.lower()
-    
-    # Extract phrases using prioritized patterns
-    for pattern_info in sorted_patterns:
-        # ใช้ original text สำหรับ matching เพื่อให้จับ "ทำงานกราฟิก" ได้
-        matches = re.finditer(pattern_info['pattern'], original_text, re.IGNORECASE)
-        for match in matches:
-            phrase = match.group().strip()
-            if phrase and len(phrase) > 1:
-                # Check for overlaps with higher priority phrases
-                overlap = False
-                for existing_phrase, _, _ in found_phrases:
-                    # More strict overlap detection
-                    if (len(phrase) > 5 and len(existing_phrase) > 5):
-                        if (phrase.lower() in existing_phrase.lower() or 
-                            existing_phrase.lower() in phrase.lower()):
-                            overlap = True
-                            break
-                    elif phrase.lower() == existing_phrase.lower():
-                        overlap = True
-                        break
-                
-                if not overlap:
-                    found_phrases.append((phrase, pattern_info['type'], pattern_info['stage']))
-                    # Mark this position as used in original text
-                    original_text = re.sub(re.escape(phrase.lower()), ' ' * len(phrase), original_text, count=1)
-    
-    # Initial processing of found phrases (will be overwritten by enhanced fallback)
-    initial_phrases = found_phrases.copy()
-    
-    # Limited fallback: เฉพาะคำสำคัญที่ไม่ได้ถูกจับ
-    remaining_text = re.sub(r'\s+', ' ', original_text).strip()
-    important_words = re.findall(r'\b\w{4,}\b', remaining_text)  # เพิ่มความยาวขั้นต่ำ
-    
-    # Look for important unmatched terms - ลดจำนวน fallback
-    existing_phrases_lower = [p[0].lower() for p in found_phrases]
-    
-    for word in important_words:
-        if len(word) > 3 and word.lower() not in existing_phrases_lower:
-            # เฉพาะคำที่สำคัญจริงๆ เท่านั้น
-            if (word in ['ryzen', 'intel', 'rtx', 'gtx', 'asus', 'hp', 'dell', 'msi'] or
-                re.match(r'\d{4,}', word)):  # ตัวเลข 4 หลักขึ้นไป (ราคา/รุ่น)
-                found_phrases.append((word, "IMPORTANT_FALLBACK", "stage2_content"))
-    
-    # Re-process found phrases including fallbacks
-    for phrase, phrase_type, stage in found_phrases:
-        result["segmented_phrases"].append({
-            "phrase": phrase,
-            "type": phrase_type,
-            "stage": stage,
-            "original_text": phrase
-        })
-        
-        # Classify by type
-        if stage == "stage1_filter":
-            result["phrase_classification"]["filter_phrases"].append(phrase)
-            result["stage_assignments"]["stage1_filter"].append(phrase)
-        elif stage == "stage1_inference":
-            result["phrase_classification"]["context_inferred_phrases"].append(phrase) 
-            result["stage_assignments"]["stage1_inference"].append(phrase)
-        elif stage == "stage2_content":
-            result["phrase_classification"]["content_analysis_phrases"].append(phrase)
-            result["stage_assignments"]["stage2_content"].append(phrase)
-        elif stage == "stage3_questions":
-            result["phrase_classification"]["question_phrases"].append(phrase)
-            result["stage_assignments"]["stage3_questions"].append(phrase)
-    
-    # Final fallback: if still no phrases found, create basic segmentation
-    if not found_phrases:
-        words = re.findall(r'\b\w{2,}\b', normalized)
-        if words:
-            # Try to identify at least one phrase for each potential stage
-            basic_phrase = ' '.join(words)
-            result["segmented_phrases"].append({
-                "phrase": basic_phrase,
-                "type": "FALLBACK_ANALYSIS",
-                "stage": "stage2_content",
-                "original_text": basic_phrase
-            })
-            result["phrase_classification"]["content_analysis_phrases"].append(basic_phrase)
-            result["stage_assignments"]["stage2_content"].append(basic_phrase)
-    
-    return result
-
-# Updated contextual_phrase_segmentation for backward compatibility
-def contextual_phrase_segmentation(text: str) -> List[str]:
-    """
-    Backward compatible version - returns just the phrase list
-    """
-    analysis = enhanced_contextual_phrase_segmentation(text)
-    return [item["phrase"] for item in analysis["segmented_phrases"]]
-
-# Load database schema and categories
-def load_database_schema():
-    """Load actual database schema and categories"""
-    schema_data = {}
-    categories_data = []
-    keyword_mapping = {}
-    
-    # Load schema.json
-    try:
-        schema_paths = ['backend/schema.json', '../backend/schema.json', './schema.json', 'schema.json']
-        
-        for path in schema_paths:
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    schema_data = json.load(f)
-                    print(f"✅ Loaded schema from {path}")
-                    break
-            except FileNotFoundError:
-                continue
-    except Exception as e:
-        print(f"Warning: Could not load schema.json: {e}")
-    
-    # Load navigation_attributes.json
-    try:
-        nav_paths = ['backend/navigation_attributes.json', '../backend/navigation_attributes.json', './navigation_attributes.json', 'navigation_attributes.json']
-        
-        for path in nav_paths:
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    nav_data = json.load(f)
-                    categories_data = nav_data.get('cateName', [])
-                    print(f"✅ Loaded {len(categories_data)} categories from {path}")
-                    break
-            except FileNotFoundError:
-                continue
-    except Exception as e:
-        print(f"Warning: Could not load navigation_attributes.json: {e}")
-    
-    # Load keyword_to_cateName.json (NEW!)
-    try:
-        keyword_paths = ['backend/keyword_to_cateName.json', '../backend/keyword_to_cateName.json', './keyword_to_cateName.json', 'keyword_to_cateName.json']
-        
-        for path in keyword_paths:
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    keyword_data = json.load(f)
-                    # ใช้ categoryMapping structure ตาม user requirement
-                    keyword_mapping = keyword_data.get("categoryMapping", keyword_data)
-                    print(f"✅ Loaded keyword mapping from {path}")
-                    break
-            except FileNotFoundError:
-                continue
-    except Exception as e:
-        print(f"Warning: Could not load keyword_to_cateName.json: {e}")
-    
-    return schema_data, categories_data, keyword_mapping
-
-# Comprehensive Thai-English category mapping
-def get_comprehensive_category_mapping() -> Dict[str, List[str]]:
-    """Enhanced category mapping with comprehensive Thai terms"""
-    return {
-        # Notebook/Laptop categories
-        'โน้ตบุ๊ก': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
-        'โนตบุ๊ก': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],  
-        'โน๊ตบุ๊ค': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
-        'โนคบุค': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
-        'laptop': ['Notebooks', 'Gaming Notebooks', 'Ultrathin Notebooks', '2 in 1 Notebooks'],
-        
-        # Computer categories - crucial for Thai context
-        'คอมพิวเตอร์': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
-        'คอม': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
-        'คอมตั้งโต๊ะ': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC'],
-        'เครื่อง': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
-        'desktop': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC'],
-        'pc': ['Desktop PC', 'All in One PC (AIO)', 'Mini PC', 'Notebooks'],
-        
-        # Graphics cards
-        'การ์ดจอ': ['Graphics Cards'],
-        'การ์จอ': ['Graphics Cards'],
-        'กราฟิก': ['Graphics Cards'], 
-        'การ์ด': ['Graphics Cards'],
-        'วีจีเอ': ['Graphics Cards'],
-        'vga': ['Graphics Cards'],
-        'graphics': ['Graphics Cards'],
-        
-        # Input devices
-        'คีย์บอร์ด': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
-        'คีบอร์ด': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
-        'คีบอด': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
-        'keyboard': ['Keyboard', 'Mechanical & Gaming Keyboard', 'Wireless Keyboard'],
-        
-        'เมาส์': ['Mouse', 'Gaming Mouse', 'Wireless Mouse'],
-        'เม้าส์': ['Mouse', 'Gaming Mouse', 'Wireless Mouse'],
-        'mouse': ['Mouse', 'Gaming Mouse', 'Wireless Mouse'],
-        
-        # Display
-        'จอ': ['Monitor'],
-        'มอนิเตอร์': ['Monitor'],
-        'จอมอนิเตอร์': ['Monitor'],
-        'หน้าจอ': ['Monitor'],
-        'monitor': ['Monitor'],
-        
-        # Components
-        'ซีพียู': ['CPU'],
-        'โปรเซสเซอร์': ['CPU'],
-        'cpu': ['CPU'],
-        'processor': ['CPU'],
-        
-        'แรม': ['RAM'],
-        'หน่วยความจำ': ['RAM'],
-        'ความจำ': ['RAM'],
-        'ram': ['RAM'],
-        'memory': ['RAM'],
-        
-        # Audio
-        'หูฟัง': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
-        'เฮดโฟน': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
-        'เฮดเซต': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
-        'headphone': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
-        'headset': ['Headphone', 'Headset', 'In Ear Headphone', 'True Wireless Headphone'],
-        
-        'สปีกเกอร์': ['Speaker'],
-        'speaker': ['Speaker'],
-        
-        # Storage
-        'ฮาร์ดดิสก์': ['Hard Drive & Solid State Drive'],
-        'ฮาร์ด': ['Hard Drive & Solid State Drive'],
-        'เอสเอสดี': ['Hard Drive & Solid State Drive'],
-        'ssd': ['Hard Drive & Solid State Drive'],
-        'hdd': ['Hard Drive & Solid State Drive']
-    }
-
-# LLM Stage 1: Context Analysis and Basic Query Builder
-async def stage1_context_analysis_and_query_builder(user_input: str) -> Dict[str, Any]:
-    """
-    Stage 1 LLM: Context Analysis and Basic MongoDB Query Building
-    
-    NEW RESPONSIBILITIES:
-    1. แยกวลีตามบริบท (Contextual Phrase Segmentation)
-    2. วิเคราะห์แต่ละวลีและจัดหมวดหมู่:
-       - วลีที่ระบุ filter ได้ชัดเจน → ใช้ทำ query
-       - วลีที่ต้องอนุมานจากบริบท → อนุมานแล้วใช้ทำ query
-       - วลีที่เป็นเนื้อหาสินค้า → ส่งไป Stage 2
-       - วลีที่เป็นคำถาม/คำแนะนำ → ส่งไป Stage 3
-    3. สร้าง MongoDB query จากวลีที่ระบุ filter ได้
-    4. ส่งวลีที่เหลือไปให้ Stage อื่นๆ
-    """
-    print(f"[Stage 1] Processing input: {user_input}")
-    
-    # Enhanced phrase segmentation and analysis
-    phrase_analysis = enhanced_contextual_phrase_segmentation(user_input)
-    
-    # Load database information
-    schema_data, categories_data, keyword_mapping = load_database_schema()
-    category_mapping = get_comprehensive_category_mapping()
-    
-    # Get actual database fields
-    actual_fields = []
-    if schema_data and 'properties' in schema_data:
-        actual_fields = list(schema_data['properties'].keys())
-    
-    # Extract phrases for each stage
-    stage1_filter_phrases = phrase_analysis["stage_assignments"]["stage1_filter"]
-    stage1_inference_phrases = phrase_analysis["stage_assignments"]["stage1_inference"]
-    stage2_content_phrases = phrase_analysis["stage_assignments"]["stage2_content"]
-    stage3_question_phrases = phrase_analysis["stage_assignments"]["stage3_questions"]
-    
-    print(f"[Stage 1] Phrase Analysis:")
-    print(f"  - Filter phrases: {stage1_filter_phrases}")
-    print(f"  - Inference phrases: {stage1_inference_phrases}")
-    print(f"  - Content phrases: {stage2_content_phrases}")
-    print(f"  - Question phrases: {stage3_question_phrases}")
-    
-    # Convert data to strings to avoid f-string issues
-    fields_str = str(actual_fields)
-    categories_str = json.dumps(categories_data, ensure_ascii=False)
-    mapping_str = json.dumps(category_mapping, ensure_ascii=False, indent=2)
-    keyword_str = json.dumps(keyword_mapping, ensure_ascii=False, indent=2)
-    
-    # Create analysis summary for the LLM
-    phrase_summary = {
-        "stage1_filter": stage1_filter_phrases,
-        "stage1_inference": stage1_inference_phrases,
-        "stage2_content": stage2_content_phrases,
-        "stage3_questions": stage3_question_phrases
-    }
-    phrase_summary_str = json.dumps(phrase_summary, ensure_ascii=False, indent=2)
-    
-    prompt = """
-คุณคือ Stage 1 Context Analyzer และ Query Builder - วิเคราะห์บริบทและสร้าง MongoDB Query
-
-**USER INPUT:** "{user_input}"
-
-**PHRASE ANALYSIS RESULT:** {phrase_summary_str}
-
-**DATABASE FIELDS:** {fields_str}
-**AVAILABLE CATEGORIES:** {categories_str}
-**CATEGORY MAPPING:** {mapping_str}
-**KEYWORD TO CATEGORY MAPPING:** {keyword_str}""".format(
-        user_input=user_input,
-        phrase_summary_str=phrase_summary_str,
-        fields_str=fields_str,
-        categories_str=categories_str,
-        mapping_str=mapping_str,
-        keyword_str=keyword_str
-    ) + """
+from app.services.text_normalizer import normalize_text
+from app.services.phrase_segmenter import default_segmenter
+from app.services.catalog_metadata import (
+    CatalogMetadata,
+    get_catalog_metadata,
+    get_comprehensive_category_mapping
+)
+from app.services.stage1_memo import get_stage1_memo, memo_get, memo_set, stage1_memo_key
+from app.services.content_scorer import ContentScorer
+from app.services.metrics import span, record_llm_usage, record_first_chunk, record_prompt_size
+from app.services.llm_schemas import (
+    STAGE1_RESPONSE_FORMAT,
+    STAGE2_RESPONSE_FORMAT,
+    Stage1Output,
+    Stage2Output
+)
+
+# Rule-based Stage 1: answer simple filter-only queries without the LLM
+STAGE1_FAST_PATH_ENABLED = os.getenv("STAGE1_FAST_PATH_ENABLED", "true").lower() == "true"
+STAGE1_FAST_PATH_MIN_CONFIDENCE = float(os.getenv("STAGE1_FAST_PATH_MIN_CONFIDENCE", "0.8"))
+
+# Stage 1 prompt: embed only the categories/keywords the input mentions, as compact JSON
+# ("false" restores the full category list and both mappings)
+STAGE1_COMPACT_PROMPT = os.getenv("STAGE1_COMPACT_PROMPT", "true").lower() == "true"
+
+# Stage 2 LLM re-rank: "off" (local scorer only) or "usage" (LLM for unresolved usage phrases)
+STAGE2_LLM_MODE = os.getenv("STAGE2_LLM_MODE", "off").lower()
+
+# Stage 1/2 output format: "json_schema" (strict structured output) or "json_object"
+# for OpenAI-compatible endpoints without schema support (JSON example in the prompt)
+LLM_RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "json_schema").lower()
+
+# Static Stage 1 instructions and examples (end of the system prompt)
+STAGE1_INSTRUCTIONS = """
 
 **NEW STAGE 1 RESPONSIBILITIES:**
 1. **รับผลการแยกวลี** - จากระบบ enhanced phrase segmentation
@@ -560,7 +89,10 @@ Input: "Ryzen 5 5600G เล่นเกมได้ไหม"
 Analysis:
 - stage1_inference: ["Ryzen 5 5600G"] → อนุมาน cateName: {"$in": ["CPU", "Desktop PC", "Notebooks"]}
 - stage2_content: ["Ryzen 5 5600G"] → ส่งไป Stage 2 ด้วย (ชื่อเฉพาะ)
-- stage3_questions: ["เล่นเกมได้ไหม"] → ส่งไป Stage 3
+- stage3_questions: ["เล่นเกมได้ไหม"] → ส่งไป Stage 3"""
+
+# JSON example for the json_object mode (the schema carries the shape otherwise)
+STAGE1_JSON_FORMAT = """
 
 ตอบใน JSON:
 {
@@ -580,38 +112,162 @@ Analysis:
   },
   "reasoning": "อธิบายการวิเคราะห์แต่ละวลีและการตัดสินใจ",
   "queryType": "three_stage_analysis"
-}
-"""
+}"""
+
+# Initialize OpenAI client with error handling
+def get_openai_client() -> AsyncOpenAI:
+    """Create the async OpenAI client backed by a pooled HTTP transport"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable is required")
+    
+    # One connection pool shared by every stage, so concurrent chats reuse
+    # keep-alive connections instead of blocking the event loop
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        ),
+        timeout=httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")), connect=5.0)
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=http_client
+    )
+
+client = None
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared async OpenAI client, creating it on first use"""
+    global client
+    if client is None:
+        client = get_openai_client()
+    return client
+
+async def close_openai_client():
+    """Close the shared OpenAI client and its connection pool"""
+    global client
+    if client is not None:
+        await client.close()
+        client = None
+
+def response_format(schema_format: Dict[str, Any]) -> Dict[str, Any]:
+    """The stage's JSON-schema response_format, or plain JSON mode when configured"""
+    if LLM_RESPONSE_FORMAT == "json_schema":
+        return schema_format
+    return {"type": "json_object"}
+
+# Enhanced text normalization for better Thai language processing
+def normalize_text_advanced(text: str) -> str:
+    """Advanced text normalization with comprehensive Thai language support"""
+    # Rule table is compiled once and applied in a single pass (see text_normalizer)
+    return normalize_text(text)
+
+# Enhanced contextual phrase segmentation with better context analysis
+def enhanced_contextual_phrase_segmentation(text: str) -> Dict[str, Any]:
+    """
+    Enhanced phrase segmentation with context analysis and phrase classification
+    Returns segmented phrases with their types and processing stage assignments
+    """
+    # Pattern table is sorted and compiled once (see phrase_segmenter)
+    return default_segmenter.segment(text)
+
+# Updated contextual_phrase_segmentation for backward compatibility
+def contextual_phrase_segmentation(text: str) -> List[str]:
+    """
+    Backward compatible version - returns just the phrase list
+    """
+    analysis = enhanced_contextual_phrase_segmentation(text)
+    return [item["phrase"] for item in analysis["segmented_phrases"]]
+
+# LLM Stage 1: Context Analysis and Basic Query Builder
+async def stage1_context_analysis_and_query_builder(user_input: str, metadata: Optional[CatalogMetadata] = None) -> Dict[str, Any]:
+    """
+    Stage 1 LLM: Context Analysis and Basic MongoDB Query Building
+    
+    NEW RESPONSIBILITIES:
+    1. แยกวลีตามบริบท (Contextual Phrase Segmentation)
+    2. วิเคราะห์แต่ละวลีและจัดหมวดหมู่:
+       - วลีที่ระบุ filter ได้ชัดเจน → ใช้ทำ query
+       - วลีที่ต้องอนุมานจากบริบท → อนุมานแล้วใช้ทำ query
+       - วลีที่เป็นเนื้อหาสินค้า → ส่งไป Stage 2
+       - วลีที่เป็นคำถาม/คำแนะนำ → ส่งไป Stage 3
+    3. สร้าง MongoDB query จากวลีที่ระบุ filter ได้
+    4. ส่งวลีที่เหลือไปให้ Stage อื่นๆ
+    """
+    print(f"[Stage 1] Processing input: {user_input}")
+    
+    # Enhanced phrase segmentation and analysis
+    with span("segmentation"):
+        phrase_analysis = enhanced_contextual_phrase_segmentation(user_input)
+    
+    # Catalog metadata is loaded once at startup; prompt fragments are pre-serialized
+    metadata = metadata or get_catalog_metadata()
+    actual_fields = metadata.actual_fields
+    
+    # Extract phrases for each stage
+    stage1_filter_phrases = phrase_analysis["stage_assignments"]["stage1_filter"]
+    stage1_inference_phrases = phrase_analysis["stage_assignments"]["stage1_inference"]
+    stage2_content_phrases = phrase_analysis["stage_assignments"]["stage2_content"]
+    stage3_question_phrases = phrase_analysis["stage_assignments"]["stage3_questions"]
+    
+    print(f"[Stage 1] Phrase Analysis:")
+    print(f"  - Filter phrases: {stage1_filter_phrases}")
+    print(f"  - Inference phrases: {stage1_inference_phrases}")
+    print(f"  - Content phrases: {stage2_content_phrases}")
+    print(f"  - Question phrases: {stage3_question_phrases}")
+    
+    # Deterministic fast path - skip the LLM when the rules resolve every filter phrase
+    if STAGE1_FAST_PATH_ENABLED:
+        rule_result = rule_based_stage1_analysis(user_input, phrase_analysis, metadata)
+        if rule_result and rule_result["confidence"] >= STAGE1_FAST_PATH_MIN_CONFIDENCE:
+            print(f"[Stage 1] Rule-based fast path (confidence {rule_result['confidence']:.2f}) - skipping LLM")
+            return rule_result
+    
+    # Memoized LLM result for the same normalized text and catalog metadata version
+    memo = get_stage1_memo()
+    memo_key = stage1_memo_key(user_input, metadata)
+    if memo is not None:
+        try:
+            memoized = await memo_get(memo, memo_key)
+            if memoized is not None:
+                print("[Stage 1] Memo hit - skipping LLM")
+                memoized["phraseAnalysis"] = phrase_analysis
+                memoized["stage1Path"] = "memo"
+                return memoized
+        except Exception as error:
+            print(f"Warning: Stage 1 memo lookup failed: {error}")
+    
+    # Create analysis summary for the LLM
+    phrase_summary = {
+        "stage1_filter": stage1_filter_phrases,
+        "stage1_inference": stage1_inference_phrases,
+        "stage2_content": stage2_content_phrases,
+        "stage3_questions": stage3_question_phrases
+    }
+    messages = build_stage1_messages(user_input, phrase_analysis, phrase_summary, metadata)
+    record_prompt_size("stage1", messages)
 
     try:
-        global client
-        if client is None:
-            client = get_openai_client()
-            
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-        )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Clean JSON response
-        if content.startswith('```json'):
-            content = content.replace('```json', '').replace('```', '').strip()
-        elif content.startswith('```'):
-            content = content.replace('```', '').strip()
+        with span("stage1_llm"):
+            response = await get_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.1,
+                response_format=response_format(STAGE1_RESPONSE_FORMAT)
+            )
+        record_llm_usage("stage1", getattr(response, "usage", None))
         
-        result = json.loads(content)
+        result = Stage1Output.model_validate_json(response.choices[0].message.content)
         
         # Validate query structure
-        query = result["mongoQuery"]
-        validated_query = validate_stage1_query(query, actual_fields)
+        validated_query = validate_stage1_query(result.mongoQuery.to_mongo(), actual_fields)
         
         # Enhanced return structure for 3-stage system
-        processed_terms = result["processedTerms"]
+        processed_terms = result.processedTerms.to_dict()
         
-        return {
+        stage1_result = {
             "query": validated_query,
             "processedTerms": processed_terms,
             "phraseAnalysis": phrase_analysis,
@@ -621,15 +277,24 @@ Analysis:
                 "stage2_content": processed_terms.get("stage2_content_phrases", []),
                 "stage3_questions": processed_terms.get("stage3_question_phrases", [])
             },
-            "reasoning": result.get("reasoning", "Stage 1 three-stage analysis"),
-            "queryType": result.get("queryType", "three_stage_analysis"),
-            "confidence": 0.8
+            "reasoning": result.reasoning,
+            "queryType": result.queryType,
+            "confidence": 0.8,
+            "stage1Path": "llm"
         }
         
+        if memo is not None:
+            try:
+                await memo_set(memo, memo_key, stage1_result)
+            except Exception as error:
+                print(f"Warning: Could not store Stage 1 memo: {error}")
+        
+        return stage1_result
+        
     except Exception as error:
         print(f"Stage 1 query generation error: {error}")
         # Enhanced fallback that includes phrase analysis
-        fallback_result = generate_stage1_fallback_enhanced(user_input, phrase_analysis, categories_data)
+        fallback_result = generate_stage1_fallback_enhanced(user_input, phrase_analysis, metadata.category_set, metadata)
         return fallback_result
 
 def validate_stage1_query(query: Dict[str, Any], actual_fields: List[str]) -> Dict[str, Any]:
@@ -645,9 +310,9 @@ def validate_stage1_query(query: Dict[str, Any], actual_fields: List[str]) -> Di
     
     return validated_query
 
-def generate_stage1_fallback_enhanced(input_text: str, phrase_analysis: Dict[str, Any], categories_data: List[str]) -> Dict[str, Any]:
+def generate_stage1_fallback_enhanced(input_text: str, phrase_analysis: Dict[str, Any], categories_data: List[str], metadata: Optional[CatalogMetadata] = None) -> Dict[str, Any]:
     """Enhanced fallback for Stage 1 when LLM fails"""
-    processed_terms = extract_basic_entities(input_text, categories_data)
+    processed_terms = extract_basic_entities(input_text, categories_data, metadata)
     query = build_basic_query(processed_terms)
     
     # Try to extract stage assignments from phrase analysis if available
@@ -668,7 +333,8 @@ def generate_stage1_fallback_enhanced(input_text: str, phrase_analysis: Dict[str
         "stageAssignments": stage_assignments,
         "reasoning": "Stage 1 fallback - basic pattern matching with phrase analysis",
         "queryType": "three_stage_fallback",
-        "confidence": 0.6
+        "confidence": 0.6,
+        "stage1Path": "fallback"
     }
 
 def generate_stage1_fallback(input_text: str, categories_data: List[str]) -> Dict[str, Any]:
@@ -684,16 +350,246 @@ def generate_stage1_fallback(input_text: str, categories_data: List[str]) -> Dic
         "confidence": 0.6
     }
 
-def extract_basic_entities(input_text: str, categories_data: List[str]) -> Dict[str, Any]:
+def parse_budget_phrase(phrase: str, text: str) -> Optional[int]:
+    """Budget amount of a stage1_filter budget phrase, or None if it is not one / is ambiguous"""
+    phrase_lower = phrase.lower()
+    if not re.match(r'(?:งบ|ไม่เกิน|ประมาณ|ราคา|budget)', phrase_lower) and not re.search(r'\d\s*บาท', phrase_lower):
+        return None
+    
+    matches = re.findall(r'\d{1,3}(?:,\d{3})+|\d+', phrase_lower)
+    if len(matches) != 1:
+        return None
+    
+    # The segmenter can cut a number short ("ราคา 8000" -> "ราคา 800"); only trust
+    # the amount when the phrase is not followed by more digits in the input
+    if not re.search(re.escape(phrase_lower) + r'(?![\d,])', text.lower()):
+        return None
+    
+    budget = int(matches[0].replace(',', ''))
+    return budget if budget >= 1000 else None
+
+# Words a filter-only query may contain besides its phrases ("ขอโน้ตบุ๊ค งบ 20000 บาท ครับ")
+FAST_PATH_FILLER = ('อยากได้', 'ต้องการ', 'แนะนำ', 'หน่อย', 'ราคา', 'ไม่เกิน', 'ประมาณ', 'งบ', 'บาท', 'ครับ', 'ค่ะ', 'คะ', 'ขอ', 'หา')
+
+def uncovered_input_text(user_input: str, phrases: List[str]) -> str:
+    """Text of the input left over once the given phrases and filler words are removed"""
+    remaining = normalize_text_advanced(user_input)
+    variants = {variant for phrase in phrases for variant in (phrase.lower(), normalize_text_advanced(phrase))}
+    for variant in sorted(variants, key=len, reverse=True):
+        remaining = remaining.replace(variant, ' ')
+    for filler in FAST_PATH_FILLER:
+        remaining = remaining.replace(filler, ' ')
+    return re.sub(r'[\s,.!?]+', ' ', remaining).strip()
+
+def resolve_phrase_categories(phrase: str, metadata: CatalogMetadata) -> List[str]:
+    """Categories for a filter phrase via keyword/category mapping (longest keyword wins)"""
+    candidates = [phrase.lower()]
+    normalized = normalize_text_advanced(phrase)
+    if normalized not in candidates:
+        candidates.append(normalized)
+    
+    for mapping in (metadata.keyword_mapping, metadata.category_mapping):
+        for candidate in candidates:
+            matched = [keyword for keyword in mapping if keyword.lower() in candidate]
+            if not matched:
+                continue
+            keyword = max(matched, key=len)
+            categories = [cat for cat in mapping[keyword] if cat in metadata.category_set]
+            if categories:
+                return categories
+    return []
+
+_ASCII_KEYWORD = re.compile(r'[a-z0-9 .&+-]+')
+
+def _mentions(text: str, keyword: str) -> bool:
+    """Substring match for Thai keywords; ASCII keywords must not sit inside another word ("ram" in "program")"""
+    if not _ASCII_KEYWORD.fullmatch(keyword):
+        return keyword in text
+    return re.search(r'(?<![a-z0-9])' + re.escape(keyword) + r'(?![a-z0-9])', text) is not None
+
+def preselect_categories(user_input: str, phrase_analysis: Dict[str, Any], metadata: CatalogMetadata) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Candidate categories for the Stage 1 prompt from the local keyword index:
+    (matched keyword -> categories, candidate categories in first-seen order).
+    Category names typed directly and product names (Ryzen, RTX...) count too.
+    """
+    texts = {user_input.lower(), normalize_text_advanced(user_input)}
+    matched: Dict[str, List[str]] = {}
+    for keyword, categories in metadata.keyword_index.items():
+        if any(_mentions(text, keyword) for text in texts):
+            matched[keyword] = list(categories)
+    
+    candidates: List[str] = []
+    for categories in matched.values():
+        candidates.extend(category for category in categories if category not in candidates)
+    for category in metadata.categories:
+        if category not in candidates and any(_mentions(text, category.lower()) for text in texts):
+            candidates.append(category)
+    
+    assignments = phrase_analysis.get("stage_assignments", {})
+    for phrase in assignments.get("stage1_inference", []) + assignments.get("stage1_filter", []):
+        if is_specific_product_name(phrase):
+            candidates.extend(category for category in infer_categories_from_product_name(phrase, metadata.category_set) if category not in candidates)
+    return matched, candidates
+
+def _compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+# Static Stage 1 system prompts by (metadata version, compact mode, output format) - built once,
+# byte-identical across requests so the provider can cache the prefix
+_stage1_system_prompts: Dict[Tuple[str, bool, str], str] = {}
+
+def stage1_system_prompt(metadata: CatalogMetadata) -> str:
+    """
+    Rules, examples, fields and the category list. Compact mode lists the
+    categories as compact JSON and leaves the keyword mappings to the user
+    message; the legacy mode embeds both mappings in full.
+    """
+    key = (metadata.version, STAGE1_COMPACT_PROMPT, LLM_RESPONSE_FORMAT)
+    prompt = _stage1_system_prompts.get(key)
+    if prompt is None:
+        prompt = "คุณคือ Stage 1 Context Analyzer และ Query Builder - วิเคราะห์บริบทและสร้าง MongoDB Query\n\n"
+        prompt += "ข้อความของผู้ใช้มี USER INPUT และ PHRASE ANALYSIS RESULT ของคำขอนั้น\n\n"
+        prompt += f"**DATABASE FIELDS:** {metadata.fields_str}\n"
+        if STAGE1_COMPACT_PROMPT:
+            prompt += f"**AVAILABLE CATEGORIES:** {_compact_json(list(metadata.categories))}"
+        else:
+            prompt += f"**AVAILABLE CATEGORIES:** {metadata.categories_str}\n"
+            prompt += f"**CATEGORY MAPPING:** {metadata.mapping_str}\n"
+            prompt += f"**KEYWORD TO CATEGORY MAPPING:** {metadata.keyword_str}"
+        prompt += STAGE1_INSTRUCTIONS
+        if LLM_RESPONSE_FORMAT != "json_schema":
+            prompt += STAGE1_JSON_FORMAT
+        _stage1_system_prompts[key] = prompt
+    return prompt
+
+def build_stage1_messages(user_input: str, phrase_analysis: Dict[str, Any], phrase_summary: Dict[str, List[str]], metadata: CatalogMetadata) -> List[Dict[str, str]]:
+    """
+    Static system prompt plus a small per-request user message. In compact
+    mode the user message also carries the preselected candidate categories
+    and the keyword mapping entries the input matched.
+    """
+    if not STAGE1_COMPACT_PROMPT:
+        user_message = f'**USER INPUT:** "{user_input}"\n\n'
+        user_message += f"**PHRASE ANALYSIS RESULT:** {json.dumps(phrase_summary, ensure_ascii=False, indent=2)}"
+    else:
+        matched, candidates = preselect_categories(user_input, phrase_analysis, metadata)
+        print(f"[Stage 1] Candidate categories: {candidates or 'all'}")
+        user_message = f'**USER INPUT:** "{user_input}"\n\n'
+        user_message += f"**PHRASE ANALYSIS RESULT:** {_compact_json(phrase_summary)}\n\n"
+        if candidates:
+            user_message += f"**CANDIDATE CATEGORIES (คัดจากคำในข้อความ):** {_compact_json(candidates)}\n"
+            user_message += f"**KEYWORD TO CATEGORY MAPPING:** {_compact_json(matched)}"
+        else:
+            user_message += "**CANDIDATE CATEGORIES:** ไม่พบคำที่ตรงกับ mapping - เลือกจาก AVAILABLE CATEGORIES"
+    return [
+        {"role": "system", "content": stage1_system_prompt(metadata)},
+        {"role": "user", "content": user_message}
+    ]
+
+def rule_based_stage1_analysis(user_input: str, phrase_analysis: Dict[str, Any], metadata: Optional[CatalogMetadata] = None) -> Optional[Dict[str, Any]]:
+    """
+    Rule-based Stage 1 for simple filter-only queries
+    
+    Returns a Stage 1 result (same shape as the LLM path) with a confidence
+    score, or None when the query needs the LLM: content phrases for Stage 2,
+    input words no phrase covers, a filter phrase the mappings cannot
+    resolve, conflicting budgets, or a product name without an explicit
+    category.
+    """
+    metadata = metadata or get_catalog_metadata()
+    assignments = phrase_analysis["stage_assignments"]
+    filter_phrases = assignments["stage1_filter"]
+    inference_phrases = assignments["stage1_inference"]
+    question_phrases = assignments["stage3_questions"]
+    
+    if assignments["stage2_content"] or not filter_phrases:
+        return None
+    
+    # Words the segmenter left unclassified ("ssd งบ 3000" -> only "งบ 3000")
+    # may name the product; answering from the rest would drop them
+    leftover = uncovered_input_text(user_input, filter_phrases + inference_phrases + question_phrases)
+    if leftover:
+        return None
+    
+    confidence = 1.0
+    budget = None
+    category_groups = []
+    
+    for phrase in filter_phrases:
+        amount = parse_budget_phrase(phrase, user_input)
+        if amount is not None:
+            if budget is not None and budget != amount:
+                return None
+            budget = amount
+            continue
+        
+        categories = resolve_phrase_categories(phrase, metadata)
+        if not categories:
+            return None
+        category_groups.append(categories)
+    
+    categories = []
+    for group in category_groups:
+        categories.extend(cat for cat in group if cat not in categories)
+    
+    # Several product types in one query - the LLM may split them differently
+    if len(category_groups) > 1:
+        confidence -= 0.1 * (len(category_groups) - 1)
+    
+    # Product names only narrow an explicit category ("การ์ดจอ RTX 4060")
+    if inference_phrases:
+        if not categories:
+            return None
+        for phrase in inference_phrases:
+            inferred = infer_categories_from_product_name(phrase, metadata.category_set)
+            narrowed = [cat for cat in categories if cat in inferred]
+            if not narrowed:
+                return None
+            categories = narrowed
+        confidence -= 0.1
+    
+    processed_terms = {
+        "segmentedPhrases": filter_phrases + inference_phrases + question_phrases,
+        "stage1_filter_used": filter_phrases,
+        "stage1_inference_used": inference_phrases,
+        "stage2_content_phrases": inference_phrases,
+        "stage3_question_phrases": question_phrases,
+        "used": filter_phrases + inference_phrases,
+        "remaining": inference_phrases + question_phrases,
+        "analysis": "Rule-based Stage 1 - every filter phrase resolved by keyword mapping"
+    }
+    if len(categories) == 1:
+        processed_terms["category"] = categories[0]
+    elif categories:
+        processed_terms["categories"] = categories
+    if budget is not None:
+        processed_terms["budget"] = {"max": budget}
+    
+    return {
+        "query": build_basic_query(processed_terms),
+        "processedTerms": processed_terms,
+        "phraseAnalysis": phrase_analysis,
+        "stageAssignments": {
+            "stage1_filter": filter_phrases,
+            "stage1_inference": inference_phrases,
+            "stage2_content": inference_phrases,
+            "stage3_questions": question_phrases
+        },
+        "reasoning": "Stage 1 rule-based analysis - filter phrases resolved without LLM",
+        "queryType": "rule_based_filter",
+        "confidence": round(confidence, 2),
+        "stage1Path": "rule_based"
+    }
+
+def extract_basic_entities(input_text: str, categories_data: List[str], metadata: Optional[CatalogMetadata] = None) -> Dict[str, Any]:
     """Extract basic entities for Stage 1 fallback with improved phrase segmentation"""
     normalized_input = normalize_text_advanced(input_text.lower())
-    category_mapping = get_comprehensive_category_mapping()
     
-    # Load keyword mapping from file
-    try:
-        _, _, keyword_mapping = load_database_schema()
-    except:
-        keyword_mapping = {}
+    # Mappings come from the shared catalog metadata instead of re-reading files
+    metadata = metadata or get_catalog_metadata()
+    category_mapping = metadata.category_mapping
+    keyword_mapping = metadata.keyword_mapping
     
     # Improved contextual phrase segmentation
     segmented_phrases = contextual_phrase_segmentation(input_text)
@@ -898,8 +794,9 @@ async def stage2_content_analyzer(
     products: List[Product]
 ) -> List[Product]:
     """
-    Stage 2 LLM: Deep content analysis and product matching
-    Analyzes content-related phrases from Stage 1 and matches against title/description
+    Stage 2: Deep content analysis and product matching
+    Matches content-related phrases from Stage 1 against title/description
+    with the local scorer (see content_scorer)
     """
     if len(products) == 0:
         return []
@@ -928,45 +825,26 @@ async def stage2_content_analyzer(
                      key=lambda p: (p.productView, p.rating, -p.salePrice), 
                      reverse=True)[:8]
     
-    print(f"[Stage 2] Analyzing {len(products)} products for content phrases: {content_phrases}")
+    # Local lexical/spec scoring replaces the LLM re-rank; question phrases carry nothing to match
+    content_phrases = [phrase for phrase in content_phrases if not is_question_phrase(phrase)]
+    scorer = ContentScorer(content_phrases)
     
-    # Prepare products info for LLM analysis
-    products_info = ""
-    for i, p in enumerate(products[:15]):  # Limit to 15 products for token efficiency
-        discount = p.price - p.salePrice
-        discount_text = ""
-        if discount > 0:
-            discount_percent = round((discount / p.price) * 100)
-            discount_text = f" (ลด {discount_percent}%)"
-        
-        price_formatted = f"฿{p.salePrice:,}"
-        views_formatted = f"{p.productView:,}"
-        
-        products_info += f"""
-Product {i + 1}:
-Title: {p.title}
-Description: {p.description[:200]}...
-Category: {p.cateName}
-Price: {price_formatted}{discount_text}
-Rating: {p.rating}/5 ({p.totalReviews})
-Views: {views_formatted}
-Stock: {p.stockQuantity}
-"""
+    if STAGE2_LLM_MODE == "usage":
+        unresolved = scorer.unresolved_usage_phrases(products)
+        if unresolved:
+            print(f"[Stage 2] Usage phrases not resolved locally: {unresolved} - using LLM")
+            return await stage2_llm_content_analyzer(
+                user_input, stage1_result, products, content_phrases, used_terms, stage_assignments
+            )
     
-    prompt = f"""
-คุณคือ Stage 2 Content Analyzer - เชี่ยวชาญในการวิเคราะห์เนื้อหาสินค้าให้ตรงกับความต้องการ
+    ranked = scorer.rank(products, limit=8)
+    print(f"[Stage 2] Local scorer ranked {len(ranked)} of {len(products)} products for: {content_phrases}")
+    return ranked
 
-**ORIGINAL USER INPUT:** "{user_input}"
+# Static Stage 2 system prompt; the per-request context goes in the user message
+STAGE2_SYSTEM_PROMPT = """คุณคือ Stage 2 Content Analyzer - เชี่ยวชาญในการวิเคราะห์เนื้อหาสินค้าให้ตรงกับความต้องการ
 
-**STAGE 1 PROCESSING RESULTS:**
-- **Stage Assignments:** {json.dumps(stage_assignments, ensure_ascii=False, indent=2)}
-- **Used Phrases (Stage 1 กรองแล้ว):** {used_terms}
-- **Content Phrases (ให้ Stage 2 วิเคราะห์):** {content_phrases}
-- **MongoDB Query Applied:** {json.dumps(stage1_result.get('query', {}), ensure_ascii=False)}
-- **Stage 1 Reasoning:** {stage1_result.get('reasoning', 'N/A')}
-
-**PRODUCTS TO ANALYZE:**
-{products_info}
+ข้อความของผู้ใช้มี ORIGINAL USER INPUT, STAGE 1 PROCESSING RESULTS และ PRODUCTS TO ANALYZE
 
 **STAGE 2 ANALYSIS MISSION:**
 1. **วิเคราะห์ Content Phrases** - วลีที่ Stage 1 ส่งมาให้วิเคราะห์เนื้อหา
@@ -1019,52 +897,102 @@ Content: ["RTX 4060"] → ดู title ว่าผลิตภัณฑ์ไ
 3. **ถ้าไม่เจอใน Title**: ลองค้นหาใน description 
 4. **ให้คะแนนสูง**: ถ้าเจอใน title = 95-100 คะแนน, ใน description = 70-80 คะแนน
 
+**สำคัญ:** วิเคราะห์เฉพาะ content phrases ที่ Stage 1 ส่งมาให้วิเคราะห์เนื้อหา!"""
+
+STAGE2_JSON_FORMAT = """
+
 ตอบใน JSON:
-{{
+{
   "selectedProducts": [
-    {{
+    {
       "index": 0,
       "score": 95,
-      "matchDetails": {{
+      "matchDetails": {
         "titleMatches": ["คำที่พบใน title"],
         "descriptionMatches": ["คำที่พบใน description"],  
         "reasoning": "เหตุผลที่ให้คะแนนนี้"
-      }}
-    }}
+      }
+    }
   ],
   "analysisSummary": "สรุปการวิเคราะห์ content phrases",
   "unmatchedTerms": ["คำที่ไม่พบในสินค้าใดเลย"]
-}}
+}"""
 
-**สำคัญ:** วิเคราะห์เฉพาะ content phrases ที่ Stage 1 ส่งมาให้วิเคราะห์เนื้อหา!
-"""
+def stage2_system_prompt() -> str:
+    if LLM_RESPONSE_FORMAT == "json_schema":
+        return STAGE2_SYSTEM_PROMPT
+    return STAGE2_SYSTEM_PROMPT + STAGE2_JSON_FORMAT
 
-    try:
-        global client
-        if client is None:
-            client = get_openai_client()
-            
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-        )
+async def stage2_llm_content_analyzer(
+    user_input: str,
+    stage1_result: Dict[str, Any],
+    products: List[Product],
+    content_phrases: List[str],
+    used_terms: List[str],
+    stage_assignments: Dict[str, Any]
+) -> List[Product]:
+    """
+    Stage 2 LLM re-rank - opt-in (STAGE2_LLM_MODE=usage) for usage phrases
+    the local scorer cannot resolve
+    """
+    print(f"[Stage 2] Analyzing {len(products)} products for content phrases: {content_phrases}")
+    
+    # Prepare products info for LLM analysis
+    products_info = ""
+    for i, p in enumerate(products[:15]):  # Limit to 15 products for token efficiency
+        discount = p.price - p.salePrice
+        discount_text = ""
+        if discount > 0:
+            discount_percent = round((discount / p.price) * 100)
+            discount_text = f" (ลด {discount_percent}%)"
         
-        content = response.choices[0].message.content.strip()
+        price_formatted = f"฿{p.salePrice:,}"
+        views_formatted = f"{p.productView:,}"
         
-        # Clean JSON response
-        if content.startswith('```json'):
-            content = content.replace('```json', '').replace('```', '').strip()
-        elif content.startswith('```'):
-            content = content.replace('```', '').strip()
+        products_info += f"""
+Product {i + 1}:
+Title: {p.title}
+Description: {p.description[:200]}...
+Category: {p.cateName}
+Price: {price_formatted}{discount_text}
+Rating: {p.rating}/5 ({p.totalReviews})
+Views: {views_formatted}
+Stock: {p.stockQuantity}
+"""
+    
+    user_message = f"""**ORIGINAL USER INPUT:** "{user_input}"
+
+**STAGE 1 PROCESSING RESULTS:**
+- **Stage Assignments:** {json.dumps(stage_assignments, ensure_ascii=False, indent=2)}
+- **Used Phrases (Stage 1 กรองแล้ว):** {used_terms}
+- **Content Phrases (ให้ Stage 2 วิเคราะห์):** {content_phrases}
+- **MongoDB Query Applied:** {json.dumps(stage1_result.get('query', {}), ensure_ascii=False)}
+- **Stage 1 Reasoning:** {stage1_result.get('reasoning', 'N/A')}
+
+**PRODUCTS TO ANALYZE:**
+{products_info}"""
+    messages = [
+        {"role": "system", "content": stage2_system_prompt()},
+        {"role": "user", "content": user_message}
+    ]
+
+    try:
+        record_prompt_size("stage2", messages)
+        with span("stage2_llm"):
+            response = await get_client().chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.2,
+                response_format=response_format(STAGE2_RESPONSE_FORMAT)
+            )
+        record_llm_usage("stage2", getattr(response, "usage", None))
         
-        result = json.loads(content)
-        selected_products_data = result.get("selectedProducts", [])
+        result = Stage2Output.model_validate_json(response.choices[0].message.content)
         
         # Build filtered and ranked products list
         filtered_products = []
-        for item in selected_products_data:
-            idx = item.get("index", -1)
+        for item in result.selectedProducts:
+            idx = item.index
             if 0 <= idx < len(products):
                 filtered_products.append(products[idx])
         
@@ -1086,18 +1014,32 @@ Content: ["RTX 4060"] → ดู title ว่าผลิตภัณฑ์ไ
                      key=lambda p: (p.productView, p.rating, -p.salePrice), 
                      reverse=True)[:8]
 
-# Combined two-stage response generator
-async def generate_two_stage_response(
-    user_input: str,
-    stage1_result: Dict[str, Any],
-    products: List[Product],
-    stage2_analysis: Dict[str, Any] = None
-) -> str:
-    """Generate natural language response explaining the two-stage process"""
-    
-    if len(products) == 0:
-        return await generate_two_stage_no_results(user_input, stage1_result)
-    
+# Static response system prompt; used/remaining terms for the search-process
+# footer come with the per-request results
+RESPONSE_SYSTEM_PROMPT = """คุณคือ Professional IT Sales Assistant ที่เชี่ยวชาญการแนะนำสินค้าด้วยระบบ Two-Stage Analysis
+
+ข้อความของผู้ใช้มี USER INPUT, TWO-STAGE PROCESSING RESULTS และ TOP RECOMMENDATIONS
+
+**RESPONSE INSTRUCTIONS:**
+1. สร้างการแนะนำที่เป็นธรรมชาติ เหมือนพนักงานขายมืออาชีพ
+2. อธิบายว่าทำไมแนะนำสินค้านี้ (highlight key selling points)
+3. เปรียบเทียบตัวเลือกหากมีหลายตัว
+4. ระบุข้อดี: ราคา, คะแนน, ความนิยม, ส่วนลด, สต็อก
+5. ใช้ emoji เพื่อให้น่าสนใจ แต่ไม่มากเกินไป
+6. **อธิบายกระบวนการค้นหา 2 ขั้นตอนในส่วนท้าย** (สำหรับความโปร่งใส)
+
+**FORMAT:**
+[การแนะนำสินค้าตามปกติ]
+
+---
+🔍 **Search Process:**
+- **Stage 1:** กรอง <Stage 1 Used Terms หรือ ไม่มี> → MongoDB Query
+- **Stage 2:** วิเคราะห์ <Stage 2 Remaining Terms หรือ ไม่มี> → Content Matching
+
+สร้างการแนะนำที่เป็นธรรมชาติ เป็นกันเอง และมีประโยชน์!"""
+
+def build_two_stage_response_messages(user_input: str, stage1_result: Dict[str, Any], products: List[Product]) -> List[Dict[str, str]]:
+    """Messages for the final recommendation text (shared by the joined and streamed variants)"""
     processed_terms = stage1_result.get("processedTerms", {})
     used_terms = processed_terms.get("used", [])
     remaining_terms = processed_terms.get("remaining", [])
@@ -1127,61 +1069,106 @@ async def generate_two_stage_response(
    - หมวด: {p.cateName or 'N/A'}
    - ส่งฟรี: {shipping_text}"""
     
-    prompt = f"""
-คุณคือ Professional IT Sales Assistant ที่เชี่ยวชาญการแนะนำสินค้าด้วยระบบ Two-Stage Analysis
-
-**USER INPUT:** "{user_input}"
+    user_message = f"""**USER INPUT:** "{user_input}"
 
 **TWO-STAGE PROCESSING RESULTS:**
 
 **Stage 1 - Basic Filtering:**
-- **Used Terms:** {used_terms} 
+- **Used Terms:** {', '.join(used_terms) if used_terms else 'ไม่มี'}
 - **MongoDB Query:** {json.dumps(stage1_result.get('query', {}), ensure_ascii=False)}
 - **Reasoning:** {stage1_result.get('reasoning', 'N/A')}
 
 **Stage 2 - Content Analysis:**
-- **Remaining Terms:** {remaining_terms}
+- **Remaining Terms:** {', '.join(remaining_terms) if remaining_terms else 'ไม่มี'}
 - **Products Found:** {total_results} รายการ
 - **Analysis Method:** {"Deep Content Analysis" if remaining_terms else "Popularity Sorting"}
 
 **TOP RECOMMENDATIONS:**
-{products_info}
+{products_info}"""
+    return [
+        {"role": "system", "content": RESPONSE_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
 
-**RESPONSE INSTRUCTIONS:**
-1. สร้างการแนะนำที่เป็นธรรมชาติ เหมือนพนักงานขายมืออาชีพ
-2. อธิบายว่าทำไมแนะนำสินค้านี้ (highlight key selling points)
-3. เปรียบเทียบตัวเลือกหากมีหลายตัว
-4. ระบุข้อดี: ราคา, คะแนน, ความนิยม, ส่วนลด, สต็อก
-5. ใช้ emoji เพื่อให้น่าสนใจ แต่ไม่มากเกินไป
-6. **อธิบายกระบวนการค้นหา 2 ขั้นตอนในส่วนท้าย** (สำหรับความโปร่งใส)
+async def iterate_text(text: str) -> AsyncIterator[str]:
+    """A ready-made text as a one-chunk stream, so fallbacks share the streaming interface"""
+    if text:
+        yield text
 
-**FORMAT:**
-[การแนะนำสินค้าตามปกติ]
+async def join_text_stream(chunks: AsyncIterator[str]) -> str:
+    """Collect a text stream into the string the non-streaming APIs return"""
+    return "".join([chunk async for chunk in chunks]).strip()
 
----
-🔍 **Search Process:**
-- **Stage 1:** กรอง {', '.join(used_terms) if used_terms else 'ไม่มี'} → MongoDB Query
-- **Stage 2:** วิเคราะห์ {', '.join(remaining_terms) if remaining_terms else 'ไม่มี'} → Content Matching
+async def stream_completion(messages: List[Dict[str, str]], temperature: float, stage: str) -> AsyncIterator[str]:
+    """
+    Content deltas of a streamed gpt-4o-mini completion. The HTTP response
+    is closed when the consumer stops early (client disconnect, timeout),
+    which ends generation on the API side. Token usage arrives in a final
+    chunk without choices and is recorded under `stage`.
+    """
+    record_prompt_size(stage, messages)
+    started = time.perf_counter()
+    stream = await get_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        temperature=temperature,
+        stream=True,
+        # Not a named argument in this SDK version; the API accepts it
+        extra_body={"stream_options": {"include_usage": True}}
+    )
+    first_chunk = True
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_chunk:
+                    record_first_chunk(stage, time.perf_counter() - started)
+                    first_chunk = False
+                yield chunk.choices[0].delta.content
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                record_llm_usage(stage, usage)
+    finally:
+        response = getattr(stream, "response", None)
+        if response is not None:
+            await response.aclose()
 
-สร้างการแนะนำที่เป็นธรรมชาติ เป็นกันเอง และมีประโยชน์!
-"""
+# Combined two-stage response generator
+async def generate_two_stage_response(
+    user_input: str,
+    stage1_result: Dict[str, Any],
+    products: List[Product],
+    stage2_analysis: Dict[str, Any] = None
+) -> str:
+    """Generate natural language response explaining the two-stage process"""
+    return await join_text_stream(stream_two_stage_response(user_input, stage1_result, products))
 
-    try:
-        global client
-        if client is None:
-            client = get_openai_client()
-            
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-        )
-        
-        return response.choices[0].message.content.strip()
-        
-    except Exception as error:
-        print(f"Two-stage response generation error: {error}")
-        return generate_two_stage_fallback_response(user_input, products, stage1_result)
+async def stream_two_stage_response(
+    user_input: str,
+    stage1_result: Dict[str, Any],
+    products: List[Product]
+) -> AsyncIterator[str]:
+    """
+    generate_two_stage_response as text chunks. If the LLM fails before the
+    first chunk the fallback response is streamed instead; a failure
+    mid-stream ends the text where it stopped.
+    """
+    if len(products) == 0:
+        async for chunk in stream_two_stage_no_results(user_input, stage1_result):
+            yield chunk
+        return
+    
+    messages = build_two_stage_response_messages(user_input, stage1_result, products)
+    started = False
+    with span("response"):
+        try:
+            async for chunk in stream_completion(messages, temperature=0.7, stage="response"):
+                started = True
+                yield chunk
+        except Exception as error:
+            print(f"Two-stage response generation error: {error}")
+            if not started:
+                async for chunk in stream_two_stage_fallback_response(user_input, products, stage1_result):
+                    yield chunk
 
 async def generate_two_stage_no_results(user_input: str, stage1_result: Dict[str, Any]) -> str:
     """Generate no results response with two-stage explanation"""
@@ -1205,6 +1192,14 @@ async def generate_two_stage_no_results(user_input: str, stage1_result: Dict[str
     
     return response
 
+def stream_two_stage_no_results(user_input: str, stage1_result: Dict[str, Any]) -> AsyncIterator[str]:
+    async def chunks():
+        yield await generate_two_stage_no_results(user_input, stage1_result)
+    return chunks()
+
+def stream_two_stage_fallback_response(user_input: str, products: List[Product], stage1_result: Dict[str, Any]) -> AsyncIterator[str]:
+    return iterate_text(generate_two_stage_fallback_response(user_input, products, stage1_result))
+
 def generate_two_stage_fallback_response(user_input: str, products: List[Product], stage1_result: Dict[str, Any]) -> str:
     """Fallback response generator for two-stage system"""
     if len(products) == 0:
@@ -1245,43 +1240,10 @@ def generate_two_stage_fallback_response(user_input: str, products: List[Product
     
     return response
 
-# LLM Stage 3: Question Answerer for remaining question phrases
-async def stage3_question_answerer(
-    user_input: str,
-    stage1_result: Dict[str, Any],
-    selected_products: List[Product],
-    remaining_questions: List[str]
-) -> str:
-    """
-    Stage 3 LLM: Answer questions based on selected products
-    Analyzes remaining question phrases and provides answers using product information
-    """
-    if not remaining_questions or len(selected_products) == 0:
-        return ""
-    
-    print(f"[Stage 3] Answering questions: {remaining_questions}")
-    
-    # Prepare products info for analysis
-    top_products = selected_products[:3]  # Analyze top 3 products
-    products_info = ""
-    for i, p in enumerate(top_products):
-        products_info += f"""
-Product {i + 1}: {p.title}
-Price: ฿{p.salePrice:,}
-Category: {p.cateName}
-Description: {p.description[:300]}...
-Rating: {p.rating}/5 ({p.totalReviews} reviews)
-Stock: {p.stockQuantity}
-"""
-    
-    prompt = f"""
-คุณคือ IT Product Expert ที่เชี่ยวชาญในการตอบคำถามเกี่ยวกับสินค้า IT
+# Static Stage 3 system prompt; questions and products go in the user message
+STAGE3_SYSTEM_PROMPT = """คุณคือ IT Product Expert ที่เชี่ยวชาญในการตอบคำถามเกี่ยวกับสินค้า IT
 
-**USER INPUT:** "{user_input}"
-**QUESTION PHRASES TO ANSWER:** {remaining_questions}
-
-**SELECTED PRODUCTS FOR ANALYSIS:**
-{products_info}
+ข้อความของผู้ใช้มี USER INPUT, QUESTION PHRASES TO ANSWER (remaining_questions) และ SELECTED PRODUCTS FOR ANALYSIS
 
 **STAGE 3 MISSION:**
 1. วิเคราะห์แต่ละคำถามใน remaining_questions
@@ -1308,27 +1270,74 @@ Stock: {p.stockQuantity}
 - เปรียบเทียบกับสินค้าอื่น
 
 **ANSWER FORMAT:**
-ตอบแต่ละคำถามในรูปแบบย่อหน้าที่ชัดเจน เป็นธรรมชาติ และให้ข้อมูลที่เป็นประโยชน์
+ตอบแต่ละคำถามในรูปแบบย่อหน้าที่ชัดเจน เป็นธรรมชาติ และให้ข้อมูลที่เป็นประโยชน์"""
 
-ตอบคำถามที่ถูกถาม โดยใช้ข้อมูลจากสินค้าที่คัดเลือกมา:
+def build_stage3_messages(user_input: str, selected_products: List[Product], remaining_questions: List[str]) -> List[Dict[str, str]]:
+    """Messages for the Stage 3 answer (shared by the joined and streamed variants)"""
+    # Prepare products info for analysis
+    top_products = selected_products[:3]  # Analyze top 3 products
+    products_info = ""
+    for i, p in enumerate(top_products):
+        products_info += f"""
+Product {i + 1}: {p.title}
+Price: ฿{p.salePrice:,}
+Category: {p.cateName}
+Description: {p.description[:300]}...
+Rating: {p.rating}/5 ({p.totalReviews} reviews)
+Stock: {p.stockQuantity}
 """
+    
+    user_message = f"""**USER INPUT:** "{user_input}"
+**QUESTION PHRASES TO ANSWER:** {remaining_questions}
 
-    try:
-        global client
-        if client is None:
-            client = get_openai_client()
-            
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-        )
-        
-        return response.choices[0].message.content.strip()
-        
-    except Exception as error:
-        print(f"Stage 3 question answering error: {error}")
-        return generate_stage3_fallback_answer(remaining_questions, selected_products)
+**SELECTED PRODUCTS FOR ANALYSIS:**
+{products_info}
+ตอบคำถามที่ถูกถาม โดยใช้ข้อมูลจากสินค้าที่คัดเลือกมา:"""
+    return [
+        {"role": "system", "content": STAGE3_SYSTEM_PROMPT},
+        {"role": "user", "content": user_message}
+    ]
+
+# LLM Stage 3: Question Answerer for remaining question phrases
+async def stage3_question_answerer(
+    user_input: str,
+    stage1_result: Dict[str, Any],
+    selected_products: List[Product],
+    remaining_questions: List[str]
+) -> str:
+    """
+    Stage 3 LLM: Answer questions based on selected products
+    Analyzes remaining question phrases and provides answers using product information
+    """
+    return await join_text_stream(stream_stage3_answer(user_input, stage1_result, selected_products, remaining_questions))
+
+async def stream_stage3_answer(
+    user_input: str,
+    stage1_result: Dict[str, Any],
+    selected_products: List[Product],
+    remaining_questions: List[str]
+) -> AsyncIterator[str]:
+    """stage3_question_answerer as text chunks, with the same fallback rules as stream_two_stage_response"""
+    if not remaining_questions or len(selected_products) == 0:
+        return
+    
+    print(f"[Stage 3] Answering questions: {remaining_questions}")
+    
+    messages = build_stage3_messages(user_input, selected_products, remaining_questions)
+    started = False
+    with span("stage3"):
+        try:
+            async for chunk in stream_completion(messages, temperature=0.3, stage="stage3"):
+                started = True
+                yield chunk
+        except Exception as error:
+            print(f"Stage 3 question answering error: {error}")
+            if not started:
+                async for chunk in stream_stage3_fallback_answer(remaining_questions, selected_products):
+                    yield chunk
+
+def stream_stage3_fallback_answer(questions: List[str], products: List[Product]) -> AsyncIterator[str]:
+    return iterate_text(generate_stage3_fallback_answer(questions, products))
 
 def generate_stage3_fallback_answer(questions: List[str], products: List[Product]) -> str:
     """Fallback answer generator for Stage 3"""
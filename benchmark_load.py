@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the chat API
+
+Boots app.main:app in-process (httpx ASGI transport), points the OpenAI
+client at a local fake completion server with configurable latency and
+canned output for each stage, and serves MongoDB reads from an in-memory
+stand-in seeded from dashboard-ai-data.products.json. Runs a fixed query
+mix at fixed concurrency and reports p50/p95/p99 latency and requests/s
+for /api/chat, /api/trending and /api/recommendations.
+
+    python benchmark_load.py --concurrency 20 --requests 400 --llm-latency 0.4
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import httpx
+import uvicorn
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from app.main import app
+from app.services import cache, metrics, single_flight, two_stage_llm
+from app.services.catalog_metadata import load_catalog_metadata
+from app.services.catalog_replica import CatalogReplica, set_catalog_replica
+from app.services.chatbot import ITStoreChatbot, set_chatbot
+from app.services.stage1_memo import get_stage1_memo, set_stage1_memo
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), 'dashboard-ai-data.products.json')
+
+def stage1_output(query: Dict[str, Any], used: List[str], remaining: List[str], questions: List[str] = (), category: str = "Notebooks") -> Dict[str, Any]:
+    """Canned Stage 1 LLM JSON in the shape the prompt asks for"""
+    return {
+        "mongoQuery": {"stockQuantity": {"$gt": 0}, **query},
+        "processedTerms": {
+            "stage1_filter_used": used,
+            "stage1_inference_used": [],
+            "stage2_content_phrases": [phrase for phrase in remaining if phrase not in questions],
+            "stage3_question_phrases": list(questions),
+            "category": category,
+            "used": used,
+            "remaining": remaining
+        },
+        "reasoning": "canned load-test output",
+        "queryType": "three_stage_analysis"
+    }
+
+# Chat messages with the Stage 1 output the fake LLM returns for each
+# (messages the rule-based fast path resolves never reach it)
+CHAT_SCENARIOS = [
+    {
+        "message": "โน้ตบุ๊ค ASUS งบ 15000",
+        "stage1": stage1_output({"cateName": "Notebooks", "salePrice": {"$lte": 15000}}, ["โน้ตบุ๊ค", "งบ 15000"], ["ASUS"])
+    },
+    {
+        "message": "โน้ตบุ๊คทำงาน แนะนำหน่อย",
+        "stage1": stage1_output({"cateName": {"$in": ["Notebooks", "Ultrathin Notebooks"]}}, ["โน้ตบุ๊ค"], ["ทำงาน", "แนะนำหน่อย"], ["แนะนำหน่อย"])
+    },
+    {
+        "message": "โน้ตบุ๊ค Lenovo เล่นเกมได้ไหม",
+        "stage1": stage1_output({"cateName": "Notebooks"}, ["โน้ตบุ๊ค"], ["Lenovo", "เล่นเกมได้ไหม"], ["เล่นเกมได้ไหม"])
+    },
+    {
+        "message": "อยากได้โน้ตบุ๊คบางเบา ราคาไม่เกิน 14000",
+        "stage1": stage1_output({"cateName": "Ultrathin Notebooks", "salePrice": {"$lte": 14000}}, ["โน้ตบุ๊คบางเบา", "ราคาไม่เกิน 14000"], [], category="Ultrathin Notebooks")
+    }
+]
+
+DEFAULT_STAGE1 = stage1_output({"cateName": "Notebooks"}, ["โน้ตบุ๊ค"], [])
+
+RESPONSE_TEXT = (
+    "จากที่ค้นหา แนะนำ ASUS VIVOBOOK 15 ครับ ราคาอยู่ในงบ สเปคเหมาะกับงานเอกสาร "
+    "และเรียนออนไลน์ แบตเตอรี่ใช้งานได้ทั้งวัน ถ้าต้องการจอใหญ่ขึ้นดูรุ่น 16 นิ้วเพิ่มได้ครับ"
+)
+
+# Stages reported from the /metrics registry (added by the pipeline spans)
+REPORTED_STAGES = ("request", "stage1", "stage1_llm", "stage2", "hydrate", "stage3", "response")
+
+# --- fake OpenAI server ---
+
+def canned_completion(prompt: str, schema_name: str = "") -> str:
+    """JSON for the non-streamed stages: Stage 2 re-rank or Stage 1 by message"""
+    if schema_name == "stage2_selection" or "selectedProducts" in prompt:
+        return json.dumps({"selectedProducts": [{"index": index, "score": 90 - index} for index in range(5)]})
+    for scenario in CHAT_SCENARIOS:
+        if scenario["message"] in prompt:
+            return json.dumps(scenario["stage1"], ensure_ascii=False)
+    return json.dumps(DEFAULT_STAGE1, ensure_ascii=False)
+
+def fake_usage(prompt: str, completion: str, system: str = "") -> Dict[str, Any]:
+    """
+    Rough token counts; like the real API, a static system prefix of 1024+
+    tokens is reported as cached in 128-token steps
+    """
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(completion) // 4
+    system_tokens = len(system) // 4
+    cached_tokens = system_tokens // 128 * 128 if system_tokens >= 1024 else 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens}
+    }
+
+def system_text(messages: List[Dict[str, Any]]) -> str:
+    return str(messages[0].get("content", "")) if messages and messages[0].get("role") == "system" else ""
+
+def create_fake_openai_app(latency: float, chunk_delay: float) -> FastAPI:
+    """
+    /v1/chat/completions stand-in: `latency` seconds before the first byte,
+    then `chunk_delay` between streamed chunks
+    """
+    fake = FastAPI()
+
+    @fake.post("/v1/chat/completions")
+    async def chat_completions(payload: dict):
+        messages = payload.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        model = payload.get("model", "gpt-4o-mini")
+        await asyncio.sleep(latency)
+        if payload.get("stream"):
+            include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(stream_chunks(model, prompt, system_text(messages), chunk_delay, include_usage), media_type="text/event-stream")
+
+        schema_name = ((payload.get("response_format") or {}).get("json_schema") or {}).get("name", "")
+        content = canned_completion(prompt, schema_name)
+        return {
+            "id": "chatcmpl-load-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": fake_usage(prompt, content, system_text(messages))
+        }
+
+    return fake
+
+async def stream_chunks(model: str, prompt: str, system: str, chunk_delay: float, include_usage: bool):
+    def event(choices, **extra):
+        chunk = {"id": "chatcmpl-load-test", "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": choices, **extra}
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    for index, word in enumerate(RESPONSE_TEXT.split(" ")):
+        if index:
+            await asyncio.sleep(chunk_delay)
+        yield event([{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+    yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+    if include_usage:
+        yield event([], usage=fake_usage(prompt, RESPONSE_TEXT, system))
+    yield "data: [DONE]\n\n"
+
+def start_fake_openai_server(latency: float, chunk_delay: float):
+    """Run the fake server on a free port in a background thread: (server, base_url)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(create_fake_openai_app(latency, chunk_delay), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Fake OpenAI server did not start")
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}/v1"
+
+# --- in-memory MongoDB stand-in ---
+
+_TOKEN = re.compile(r'[a-z0-9\u0e00-\u0e7f]+')
+
+def _compare(value: Any, operator: str, operand: Any) -> bool:
+    try:
+        if operator == "$gt":
+            return value is not None and value > operand
+        if operator == "$gte":
+            return value is not None and value >= operand
+        if operator == "$lt":
+            return value is not None and value < operand
+        if operator == "$lte":
+            return value is not None and value <= operand
+    except TypeError:
+        return False
+    raise ValueError(f"Unsupported operator {operator}")
+
+def match_condition(value: Any, condition: Any) -> bool:
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return value == condition
+    for operator, operand in condition.items():
+        if operator == "$options":
+            continue
+        if operator == "$in":
+            matched = value in operand
+        elif operator == "$nin":
+            matched = value not in operand
+        elif operator == "$ne":
+            matched = value != operand
+        elif operator == "$exists":
+            matched = (value is not None) == bool(operand)
+        elif operator == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            matched = isinstance(value, str) and re.search(operand, value, flags) is not None
+        else:
+            matched = _compare(value, operator, operand)
+        if not matched:
+            return False
+    return True
+
+def match_document(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """The query subset the chatbot sends: comparisons, $in/$ne, $regex, $or/$and, $text"""
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(match_document(doc, clause) for clause in condition):
+                return False
+        elif field == "$and":
+            if not all(match_document(doc, clause) for clause in condition):
+                return False
+        elif field == "$text":
+            text = f"{doc.get('title', '')}\n{doc.get('description', '')}".lower()
+            if not set(_TOKEN.findall(condition["$search"].lower())) & set(_TOKEN.findall(text)):
+                return False
+        elif not match_condition(doc.get(field), condition):
+            return False
+    return True
+
+def apply_projection(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return dict(doc)
+    projected = {"_id": doc["_id"]} if projection.get("_id", 1) else {}
+    for field, spec in projection.items():
+        if spec == 1 and field in doc:
+            projected[field] = doc[field]
+        elif isinstance(spec, dict) and "$cond" in spec:
+            # {"$cond": [<$type is "string">, {"$substrCP": [...]}, ""]}
+            _, substring, otherwise = spec["$cond"]
+            source, start, length = substring["$substrCP"]
+            value = doc.get(source.lstrip("$"))
+            projected[field] = value[start:start + length] if isinstance(value, str) else otherwise
+    return projected
+
+class InMemoryCursor:
+    def __init__(self, collection: "InMemoryCollection", query: Dict[str, Any], projection: Optional[Dict[str, Any]]):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort: List = []
+        self._limit = 0
+
+    def sort(self, keys, direction=None):
+        self._sort = [(keys, direction)] if isinstance(keys, str) else list(keys)
+        return self
+
+    def limit(self, limit: int):
+        self._limit = limit
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self._collection.latency)
+        results = [doc for doc in self._collection.documents if match_document(doc, self._query)]
+        # Stable sorts, least significant key first; textScore sorts are ignored
+        for field, direction in reversed(self._sort):
+            if isinstance(direction, dict):
+                continue
+            results.sort(key=lambda doc: doc.get(field) or 0, reverse=direction == -1)
+        limit = min(value for value in (self._limit, length) if value) if (self._limit or length) else None
+        return [apply_projection(doc, self._projection) for doc in results[:limit]]
+
+class InMemoryCollection:
+    """Motor-shaped collection (find/find_one) with a simulated round-trip latency"""
+
+    def __init__(self, documents: List[Dict[str, Any]], latency: float = 0.0):
+        self.documents = documents
+        self.latency = latency
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> InMemoryCursor:
+        return InMemoryCursor(self, query or {}, projection)
+
+    async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        results = await self.find(query, projection).limit(1).to_list(length=1)
+        return results[0] if results else None
+
+class InMemoryDatabase:
+    def __init__(self, collections: Dict[str, InMemoryCollection]):
+        self._collections = collections
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self._collections.setdefault(name, InMemoryCollection([]))
+
+def seed_products(scale: int = 100, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    The sample export repeated `scale` times with deterministic ObjectIds and
+    jittered popularity, rating, price and stock, so sorts and filters see a
+    realistic spread
+    """
+    with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+    rng = random.Random(seed)
+    products = []
+    for copy in range(scale):
+        for index, sample in enumerate(samples):
+            doc = {key: value for key, value in sample.items() if key != "_id"}
+            doc["_id"] = ObjectId(f"{copy:08x}{index:016x}")
+            doc["productView"] = rng.randint(0, 20000)
+            doc["rating"] = round(rng.uniform(2.5, 5.0), 1)
+            doc["totalReviews"] = rng.randint(0, 300)
+            doc["salePrice"] = round(float(sample.get("salePrice", 0)) * rng.uniform(0.8, 1.3), -1)
+            doc["stockQuantity"] = rng.randint(0, 20)
+            products.append(doc)
+    return products
+
+# --- load generation ---
+
+def build_workload(products: List[Dict[str, Any]], size: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Shuffled request mix: 70% chat, 15% trending, 15% recommendations"""
+    rng = random.Random(seed)
+    product_ids = [str(doc["_id"]) for doc in products[:200]]
+    workload = []
+    for index in range(size):
+        kind = index % 20
+        if kind < 14:
+            scenario = CHAT_SCENARIOS[index % len(CHAT_SCENARIOS)]
+            workload.append({"endpoint": "/api/chat", "method": "POST", "json": {"message": scenario["message"]}})
+        elif kind < 17:
+            workload.append({"endpoint": "/api/trending", "method": "GET", "params": {"limit": 10}})
+        else:
+            workload.append({"endpoint": "/api/recommendations", "method": "POST", "json": {"productId": rng.choice(product_ids), "limit": 5}})
+    rng.shuffle(workload)
+    return workload
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+async def run_load(client: httpx.AsyncClient, workload: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    """Send the workload with `concurrency` requests in flight; per-request latencies by endpoint"""
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    pending = iter(workload)
+
+    async def worker():
+        for request in pending:
+            started = time.perf_counter()
+            try:
+                response = await client.request(request["method"], request["endpoint"], json=request.get("json"), params=request.get("params"))
+                failed = response.status_code != 200 or (request["endpoint"] == "/api/chat" and not response.json().get("success"))
+            except Exception as error:
+                print(f"Warning: {request['endpoint']} request failed: {error}", file=sys.__stderr__)
+                failed = True
+            latencies.setdefault(request["endpoint"], []).append(time.perf_counter() - started)
+            if failed:
+                errors[request["endpoint"]] = errors.get(request["endpoint"], 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors, "elapsed": time.perf_counter() - started}
+
+def summarize(run: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for endpoint, values in sorted(run["latencies"].items()):
+        ordered = sorted(values)
+        summary[endpoint] = {
+            "requests": len(ordered),
+            "errors": run["errors"].get(endpoint, 0),
+            "p50Ms": round(percentile(ordered, 0.50) * 1000, 1),
+            "p95Ms": round(percentile(ordered, 0.95) * 1000, 1),
+            "p99Ms": round(percentile(ordered, 0.99) * 1000, 1),
+            "requestsPerSecond": round(len(ordered) / run["elapsed"], 1)
+        }
+    total = sum(len(values) for values in run["latencies"].values())
+    summary["total"] = {
+        "requests": total,
+        "errors": sum(run["errors"].values()),
+        "requestsPerSecond": round(total / run["elapsed"], 1)
+    }
+    return summary
+
+def stage_snapshot() -> Dict[str, tuple]:
+    return {stage: (metrics.stage_duration.count(stage=stage), metrics.stage_duration.total(stage=stage)) for stage in REPORTED_STAGES}
+
+def stage_means(before: Dict[str, tuple], after: Dict[str, tuple]) -> Dict[str, float]:
+    """Mean milliseconds per stage during the measured run"""
+    means = {}
+    for stage in REPORTED_STAGES:
+        count = after[stage][0] - before[stage][0]
+        if count:
+            means[stage] = round((after[stage][1] - before[stage][1]) / count * 1000, 1)
+    return means
+
+async def run_benchmark(
+    concurrency: int = 10,
+    requests: int = 200,
+    llm_latency: float = 0.3,
+    chunk_delay: float = 0.02,
+    mongo_latency: float = 0.002,
+    scale: int = 100,
+    replica: bool = False,
+    warm: bool = False,
+    verbose: bool = False
+) -> Dict[str, Any]:
+    """
+    One benchmark run. `warm` keeps the response cache, Stage 1 memo and
+    request coalescing on (repeated messages become cache hits or share a
+    run); by default every chat runs the full pipeline.
+    """
+    server, base_url = start_fake_openai_server(llm_latency, chunk_delay)
+    products = seed_products(scale)
+    database = InMemoryDatabase({
+        "products": InMemoryCollection(products, mongo_latency),
+        "product_details": InMemoryCollection(products, mongo_latency)
+    })
+
+    saved_env = {key: os.environ.get(key) for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    saved = (get_stage1_memo(), cache.RESPONSE_CACHE_ENABLED, single_flight.CHAT_COALESCING_ENABLED, two_stage_llm.client)
+    os.environ["OPENAI_API_KEY"] = "load-test"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    two_stage_llm.client = None
+    load_catalog_metadata()
+    set_chatbot(ITStoreChatbot(database))
+    set_catalog_replica(CatalogReplica(products) if replica else None)
+    if not warm:
+        set_stage1_memo(None)
+        cache.RESPONSE_CACHE_ENABLED = False
+        single_flight.CHAT_COALESCING_ENABLED = False
+    cache.response_cache.clear()
+    single_flight.chat_coalescer.clear()
+
+    # Pipeline logging is part of the cost, but not of the report
+    logs = sys.stdout if verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(logs):
+            async with httpx.AsyncClient(app=app, base_url="http://load-test", timeout=120) as client:
+                # One untimed pass over the mix (imports, pools, schema caches)
+                await run_load(client, build_workload(products, 20), concurrency)
+                before = stage_snapshot()
+                run = await run_load(client, build_workload(products, requests), concurrency)
+                after = stage_snapshot()
+            await two_stage_llm.close_openai_client()
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        stage1_memo, cache.RESPONSE_CACHE_ENABLED, single_flight.CHAT_COALESCING_ENABLED, two_stage_llm.client = saved
+        set_stage1_memo(stage1_memo)
+        set_chatbot(None)
+        set_catalog_replica(None)
+        cache.response_cache.clear()
+        single_flight.chat_coalescer.clear()
+        server.should_exit = True
+
+    return {
+        "settings": {
+            "concurrency": concurrency, "requests": requests, "llmLatency": llm_latency,
+            "chunkDelay": chunk_delay, "mongoLatency": mongo_latency, "products": len(products),
+            "replica": replica, "warm": warm
+        },
+        "endpoints": summarize(run),
+        "stageMeansMs": stage_means(before, after)
+    }
+
+def print_report(report: Dict[str, Any]):
+    settings = report["settings"]
+    print(f"🧪 Load test: {settings['requests']} requests at concurrency {settings['concurrency']}, "
+          f"{settings['products']} products, LLM latency {settings['llmLatency']}s")
+    print("=" * 78)
+    print(f"{'Endpoint':<24}{'Requests':>9}{'Errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>8}")
+    for endpoint, row in report["endpoints"].items():
+        if endpoint == "total":
+            continue
+        print(f"{endpoint:<24}{row['requests']:>9}{row['errors']:>8}{row['p50Ms']:>10}{row['p95Ms']:>10}{row['p99Ms']:>10}{row['requestsPerSecond']:>8}")
+    total = report["endpoints"]["total"]
+    print(f"{'total':<24}{total['requests']:>9}{total['errors']:>8}{'':>30}{total['requestsPerSecond']:>8}")
+    if report["stageMeansMs"]:
+        print("Mean stage time: " + ", ".join(f"{stage} {ms} ms" for stage, ms in report["stageMeansMs"].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the chat API")
+    parser.add_argument("--concurrency", type=int, default=10, help="requests in flight")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake OpenAI seconds to first byte")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="fake OpenAI seconds between streamed chunks")
+    parser.add_argument("--mongo-latency", type=float, default=0.002, help="simulated MongoDB round trip in seconds")
+    parser.add_argument("--scale", type=int, default=100, help="copies of the sample catalog to seed")
+    parser.add_argument("--replica", action="store_true", help="serve product searches from the catalog replica")
+    parser.add_argument("--warm", action="store_true", help="keep the response cache, Stage 1 memo and request coalescing enabled")
+    parser.add_argument("--verbose", action="store_true", help="show pipeline logs")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(
+        concurrency=args.concurrency,
+        requests=args.requests,
+        llm_latency=args.llm_latency,
+        chunk_delay=args.chunk_delay,
+        mongo_latency=args.mongo_latency,
+        scale=args.scale,
+        replica=args.replica,
+        warm=args.warm,
+        verbose=args.verbose
+    ))
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for the async OpenAI client used by the three-stage pipeline
+Runs N parallel chats against a local fake completion server and checks they
+finish in about the time of one (no event-loop blocking)
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import json
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from app.models import Product
+from app.services import two_stage_llm
+from app.services.two_stage_llm import generate_two_stage_response, stage3_question_answerer
+
+FAKE_LATENCY_SECONDS = 0.5
+PARALLEL_CHATS = 10
+
+def create_fake_completion_app(latency: float) -> FastAPI:
+    """Minimal stand-in for the /v1/chat/completions endpoint"""
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(payload: dict):
+        await asyncio.sleep(latency)
+        if payload.get("stream"):
+            return StreamingResponse(stream_chunks(payload), media_type="text/event-stream")
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "คำตอบจากเซิร์ฟเวอร์จำลอง"},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        }
+
+    return app
+
+def stream_chunks(payload: dict):
+    """The same reply as chat.completion.chunk events (stream=True)"""
+    for index, content in enumerate(["คำตอบจาก", "เซิร์ฟเวอร์จำลอง", None]):
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "delta": {"content": content} if content else {},
+                "finish_reason": None if content else "stop"
+            }]
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+def start_fake_server(latency: float):
+    """Start the fake completion server on a free port in a background thread"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    config = uvicorn.Config(create_fake_completion_app(latency), host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+
+    while not server.started:
+        time.sleep(0.01)
+
+    return server, thread, f"http://127.0.0.1:{port}/v1"
+
+def make_product() -> Product:
+    return Product(
+        _id="685827c746b7696e78ce8765",
+        title="AMD RYZEN 5 5600G 3.9 GHz",
+        description="6 Cores 12 Threads, Radeon Graphics",
+        cateName="CPU",
+        price=4590,
+        salePrice=3990,
+        stockQuantity=12,
+        rating=4.8,
+        totalReviews=120,
+        productView=5400
+    )
+
+async def run_chat(product: Product) -> str:
+    """One chat worth of LLM calls: Stage 3 answer plus final response"""
+    stage1_result = {"processedTerms": {"used": ["Ryzen 5 5600G"], "remaining": []}, "query": {}}
+    answer = await stage3_question_answerer(
+        "Ryzen 5 5600G เล่นเกมได้ไหม", stage1_result, [product], ["เล่นเกมได้ไหม"]
+    )
+    response = await generate_two_stage_response("Ryzen 5 5600G เล่นเกมได้ไหม", stage1_result, [product])
+    return answer + response
+
+async def measure(parallel: int) -> float:
+    product = make_product()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_chat(product) for _ in range(parallel)))
+    elapsed = time.perf_counter() - started
+    assert all("เซิร์ฟเวอร์จำลอง" in result for result in results)
+    await two_stage_llm.close_openai_client()
+    return elapsed
+
+def test_parallel_chats_overlap_llm_waits():
+    """N parallel chats should take roughly as long as a single chat"""
+    server, thread, base_url = start_fake_server(FAKE_LATENCY_SECONDS)
+    saved_env = {key: os.environ.get(key) for key in ("OPENAI_API_KEY", "OPENAI_BASE_URL")}
+    os.environ["OPENAI_API_KEY"] = "sk-fake"
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    try:
+        single = asyncio.run(measure(1))
+        parallel = asyncio.run(measure(PARALLEL_CHATS))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+        # Restore the caller's environment so later tests don't see the fake key
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    print(f"  1 chat: {single:.2f}s")
+    print(f"  {PARALLEL_CHATS} parallel chats: {parallel:.2f}s")
+
+    # Sequential blocking calls would take PARALLEL_CHATS times longer
+    assert parallel < single * 2, f"parallel chats did not overlap ({parallel:.2f}s vs {single:.2f}s)"
+
+if __name__ == "__main__":
+    print("🧪 Testing async OpenAI client concurrency")
+    print("=" * 50)
+    test_parallel_chats_overlap_llm_waits()
+    print("✅ Parallel chats overlap their LLM waits")
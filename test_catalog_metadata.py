@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test the process-wide catalog metadata used by Stage 1
+"""
+
+import dataclasses
+import json
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services import catalog_metadata
+from app.services.catalog_metadata import (
+    get_catalog_metadata,
+    load_database_schema,
+    reload_catalog_metadata
+)
+
+def test_precomputed_fields_match_files():
+    """Precomputed fragments should equal what Stage 1 used to build per request"""
+    schema_data, categories_data, keyword_mapping = load_database_schema()
+    metadata = get_catalog_metadata()
+
+    assert metadata.actual_fields == tuple(schema_data['properties'].keys())
+    assert metadata.category_set == frozenset(categories_data)
+    assert metadata.categories_str == json.dumps(categories_data, ensure_ascii=False)
+    assert metadata.keyword_str == json.dumps(keyword_mapping, ensure_ascii=False, indent=2)
+    print(f"  ✅ {len(metadata.categories)} categories, {len(metadata.actual_fields)} fields")
+
+def test_metadata_is_immutable():
+    metadata = get_catalog_metadata()
+    try:
+        metadata.categories_str = "[]"
+        raise AssertionError("metadata attribute was reassigned")
+    except dataclasses.FrozenInstanceError:
+        pass
+    try:
+        metadata.keyword_mapping["new"] = ("Notebooks",)
+        raise AssertionError("keyword mapping was mutated")
+    except TypeError:
+        pass
+    print("  ✅ Metadata cannot be modified")
+
+def test_reload_swaps_instance():
+    before = get_catalog_metadata()
+    after = reload_catalog_metadata()
+    assert after is not before
+    assert get_catalog_metadata() is after
+    assert after == before
+    print("  ✅ Reload installs a fresh instance")
+
+def test_loaded_once():
+    """Repeated lookups must not touch the filesystem again"""
+    get_catalog_metadata()
+    original = catalog_metadata.load_database_schema
+    catalog_metadata.load_database_schema = lambda: (_ for _ in ()).throw(AssertionError("files re-read"))
+    try:
+        for _ in range(100):
+            get_catalog_metadata()
+    finally:
+        catalog_metadata.load_database_schema = original
+    print("  ✅ Metadata is served from memory")
+
+if __name__ == "__main__":
+    print("🧪 Testing catalog metadata")
+    print("=" * 50)
+    test_precomputed_fields_match_files()
+    test_metadata_is_immutable()
+    test_reload_swaps_instance()
+    test_loaded_once()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory catalog replica against a straightforward evaluation of
+the same queries over the sample product export
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services.catalog_replica import CatalogReplica, UnsupportedQuery, set_catalog_replica
+from app.services.chatbot import ITStoreChatbot
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), 'dashboard-ai-data.products.json')
+
+QUERIES = [
+    {"stockQuantity": {"$gt": 0}},
+    {"stockQuantity": {"$gt": 0}, "cateName": "Notebooks"},
+    {"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Notebooks", "Ultrathin Notebooks"]}},
+    {"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Notebooks", "Ultrathin Notebooks"]}, "salePrice": {"$lte": 15000}},
+    {"stockQuantity": {"$gt": 0}, "salePrice": {"$gte": 12000, "$lte": 16000}},
+    {"stockQuantity": {"$gt": 0}, "cateName": "Graphics Cards"},
+    {"stockQuantity": {"$gt": 0}, "$or": [
+        {"title": {"$regex": "vivobook|lenovo", "$options": "i"}},
+        {"description": {"$regex": "vivobook|lenovo", "$options": "i"}}
+    ]},
+    {"stockQuantity": {"$gt": 0}, "$or": [
+        {"title": {"$regex": "16GB|7520", "$options": "i"}},
+        {"description": {"$regex": "16GB|7520", "$options": "i"}}
+    ]}
+]
+
+def load_sample_documents():
+    with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    for doc in documents:
+        if isinstance(doc.get("_id"), dict):
+            doc["_id"] = doc["_id"]["$oid"]
+    return documents
+
+def reference_find(documents, query, limit=50):
+    """Plain filter + sort, mirroring what Mongo does for these queries"""
+    def matches(doc):
+        for field, condition in query.items():
+            if field == "stockQuantity" and not doc.get("stockQuantity", 0) > 0:
+                return False
+            if field == "cateName":
+                allowed = condition["$in"] if isinstance(condition, dict) else [condition]
+                if doc.get("cateName") not in allowed:
+                    return False
+            if field == "salePrice":
+                price = doc.get("salePrice", 0)
+                if "$lte" in condition and not price <= condition["$lte"]:
+                    return False
+                if "$gte" in condition and not price >= condition["$gte"]:
+                    return False
+            if field == "$or":
+                if not any(
+                    re.search(clause[key]["$regex"], doc.get(key, ""), re.IGNORECASE)
+                    for clause in condition for key in clause
+                ):
+                    return False
+        return True
+
+    found = [doc for doc in documents if matches(doc)]
+    found.sort(key=lambda doc: (doc.get("productView", 0), doc.get("rating", 0), doc.get("totalReviews", 0)), reverse=True)
+    return found[:limit]
+
+def test_replica_matches_reference():
+    documents = load_sample_documents()
+    replica = CatalogReplica(documents)
+    for query in QUERIES:
+        expected = [doc["_id"] for doc in reference_find(documents, query)]
+        actual = [doc["_id"] for doc in replica.find(query)]
+        assert actual == expected, f"{query}: {len(actual)} vs {len(expected)}"
+        print(f"  ✅ {len(actual):2d} products for {json.dumps(query, ensure_ascii=False)[:80]}")
+
+def test_limit_keeps_popularity_order():
+    documents = load_sample_documents()
+    replica = CatalogReplica(documents)
+    top = replica.find({"stockQuantity": {"$gt": 0}}, limit=3)
+    assert [doc["_id"] for doc in top] == [doc["_id"] for doc in reference_find(documents, {"stockQuantity": {"$gt": 0}}, limit=3)]
+
+def test_unsupported_operators():
+    replica = CatalogReplica(load_sample_documents())
+    for query in ({"title": {"$regex": "asus"}}, {"salePrice": {"$ne": 0}}, {"stockQuantity": {"$gt": 5}}):
+        try:
+            replica.find(query)
+        except UnsupportedQuery:
+            continue
+        raise AssertionError(f"{query} should not be evaluated by the replica")
+
+class UnusedCollection:
+    def find(self, *args, **kwargs):
+        raise AssertionError("MongoDB should not be queried")
+
+def test_chatbot_uses_replica():
+    set_catalog_replica(CatalogReplica(load_sample_documents()))
+    try:
+        chatbot = ITStoreChatbot({"products": UnusedCollection()})
+        products = asyncio.run(chatbot.search_products_precise(
+            {"stockQuantity": {"$gt": 0}, "cateName": "Notebooks", "salePrice": {"$lte": 20000}}
+        ))
+    finally:
+        set_catalog_replica(None)
+    assert products and all(p.cateName == "Notebooks" and p.salePrice <= 20000 for p in products)
+
+if __name__ == "__main__":
+    print("🧪 Testing In-Memory Catalog Replica")
+    print("=" * 50)
+    test_replica_matches_reference()
+    test_limit_keeps_popularity_order()
+    test_unsupported_operators()
+    test_chatbot_uses_replica()
+    print("✅ Catalog replica tests passed")
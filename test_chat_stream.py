@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Test the Server-Sent Events variant of /api/chat: event order, product cards
+before the response text, streamed tokens and cached replay
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import chat
+from app.services import cache, two_stage_llm
+from app.services import chatbot as chatbot_module
+from app.services.catalog_replica import CatalogReplica, set_catalog_replica
+from app.services.chatbot import ITStoreChatbot, set_chatbot
+from test_catalog_replica import load_sample_documents
+
+STAGE1_LATENCY = 0.2
+TOKEN_DELAY = 0.1
+TOKENS = ["แนะนำ ", "Lenovo ", "IdeaPad ", "ครับ"]
+
+STAGE1_RESULT = {
+    "query": {"stockQuantity": {"$gt": 0}, "cateName": "Notebooks"},
+    "processedTerms": {"category": "Notebooks", "used": ["โน้ตบุ๊ค"], "remaining": []},
+    "stageAssignments": {"stage1_filter": ["โน้ตบุ๊ค"], "stage2_content": [], "stage3_questions": ["ดีไหม"]},
+    "reasoning": "rule-based",
+    "stage1Path": "rule_based"
+}
+
+async def fake_stage1(user_input, metadata=None):
+    await asyncio.sleep(STAGE1_LATENCY)
+    return dict(STAGE1_RESULT)
+
+async def fake_stream_response(user_input, stage1_result, products):
+    for token in TOKENS:
+        await asyncio.sleep(TOKEN_DELAY)
+        yield token
+
+ANSWER_CHUNKS = ["ดีครับ ", "คะแนนรีวิวสูง"]
+
+async def fake_stage3(user_input, stage1_result, products, questions):
+    for chunk in ANSWER_CHUNKS:
+        yield chunk
+
+class UnusedCollection:
+    def find(self, *args, **kwargs):
+        raise AssertionError("MongoDB should not be queried")
+
+def parse_events(lines):
+    """(event, data, arrival time) from SSE lines"""
+    events, event = [], None
+    for line, arrived in lines:
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            events.append((event, json.loads(line[len("data: "):]), arrived))
+    return events
+
+def post_stream(client, message):
+    started = time.perf_counter()
+    with client.stream("POST", "/api/chat/stream", json={"message": message}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        lines = [(line, time.perf_counter() - started) for line in response.iter_lines()]
+    return parse_events(lines)
+
+def stream_directly(message):
+    """Events with real arrival times (TestClient buffers the whole body)"""
+    async def collect():
+        started = time.perf_counter()
+        lines = []
+        async for frame in chat.stream_chat_events(message, chatbot_module.get_chatbot()):
+            arrived = time.perf_counter() - started
+            lines.extend((line, arrived) for line in frame.splitlines())
+        return parse_events(lines)
+    return asyncio.run(collect())
+
+def run_with_fakes(test):
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+    originals = (
+        chatbot_module.stage1_context_analysis_and_query_builder,
+        chatbot_module.stream_two_stage_response,
+        chatbot_module.stream_stage3_answer
+    )
+    chatbot_module.stage1_context_analysis_and_query_builder = fake_stage1
+    chatbot_module.stream_two_stage_response = fake_stream_response
+    chatbot_module.stream_stage3_answer = fake_stage3
+    set_catalog_replica(CatalogReplica(load_sample_documents()))
+    set_chatbot(ITStoreChatbot({"products": UnusedCollection()}))
+    cache.response_cache.clear()
+    try:
+        return test(TestClient(app))
+    finally:
+        (chatbot_module.stage1_context_analysis_and_query_builder,
+         chatbot_module.stream_two_stage_response,
+         chatbot_module.stream_stage3_answer) = originals
+        set_catalog_replica(None)
+        set_chatbot(None)
+        cache.response_cache.clear()
+
+def test_event_order_and_timing():
+    over_http = run_with_fakes(lambda client: post_stream(client, "โน้ตบุ๊ค ดีไหม"))
+    events = run_with_fakes(lambda client: stream_directly("โน้ตบุ๊ค ดีไหม"))
+    names = [name for name, _, _ in events]
+    assert names == ["stage1", "products"] + ["token"] * len(TOKENS) + ["answer"] * len(ANSWER_CHUNKS) + ["done"], names
+    assert [name for name, _, _ in over_http] == names
+
+    by_name = {name: (data, arrived) for name, data, arrived in events}
+    stage1, _ = by_name["stage1"]
+    assert stage1["mongoQuery"] == STAGE1_RESULT["query"] and stage1["entities"]["category"] == "Notebooks"
+
+    products, products_at = by_name["products"]
+    assert products["products"] and all(card["cateName"] == "Notebooks" for card in products["products"])
+    assert "_id" in products["products"][0]
+
+    # Product cards arrive after Stage 1 only - before any response text
+    last_token_at = [arrived for name, _, arrived in events if name == "token"][-1]
+    print(f"  Products at {products_at:.2f}s, last token at {last_token_at:.2f}s")
+    assert products_at < STAGE1_LATENCY + TOKEN_DELAY
+    assert last_token_at >= STAGE1_LATENCY + TOKEN_DELAY * len(TOKENS) * 0.9
+    assert "".join(data["text"] for name, data, _ in events if name == "token") == "".join(TOKENS)
+    assert "".join(data["text"] for name, data, _ in events if name == "answer") == "ดีครับ คะแนนรีวิวสูง"
+
+def test_stream_result_is_cached_for_replay():
+    def two_requests(client):
+        first = post_stream(client, "โน้ตบุ๊ค ดีไหม")
+        cached = client.post("/api/chat", json={"message": "โน้ตบุ๊ค ดีไหม"}).json()
+        second = post_stream(client, "โน้ตบุ๊ค ดีไหม")
+        return first, cached, second
+
+    first, cached, second = run_with_fakes(two_requests)
+    assert "💬 คำตอบเพิ่มเติม" in cached["message"] and cached["message"].startswith("".join(TOKENS))
+    # Same event order as the live stream: the Stage 3 answer is not folded into the token
+    assert [name for name, _, _ in second] == ["stage1", "products", "token", "answer", "done"]
+    assert second[2][1]["text"] == "".join(TOKENS)
+    assert second[3][1]["text"] == "".join(ANSWER_CHUNKS)
+    assert second[-1][1]["cached"] is True
+    assert second[1][1]["products"] == first[1][1]["products"]
+
+def test_error_event():
+    async def failing_stage1(user_input, metadata=None):
+        raise RuntimeError("boom")
+
+    def failing(client):
+        chatbot_module.stage1_context_analysis_and_query_builder = failing_stage1
+        return post_stream(client, "โน้ตบุ๊ค")
+
+    events = run_with_fakes(failing)
+    assert [name for name, _, _ in events] == ["error"]
+    assert events[0][1]["success"] is False
+
+class FakeStream:
+    def __init__(self, contents, fail_after=None):
+        self.contents = contents
+        self.fail_after = fail_after
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for index, content in enumerate(self.contents):
+            if self.fail_after is not None and index == self.fail_after:
+                raise RuntimeError("connection dropped")
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+
+def collect_stream(create):
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    original = two_stage_llm.client
+    two_stage_llm.client = client
+    try:
+        products = ITStoreChatbot({"products": None}).parse_products(load_sample_documents()[:2])
+
+        async def collect():
+            return [chunk async for chunk in two_stage_llm.stream_two_stage_response("โน้ตบุ๊ค", STAGE1_RESULT, products)]
+        return asyncio.run(collect())
+    finally:
+        two_stage_llm.client = original
+
+def test_stream_two_stage_response_chunks():
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return FakeStream(["สวัสดี", None, "ครับ"])
+
+    assert collect_stream(create) == ["สวัสดี", "ครับ"]
+
+def test_stream_two_stage_response_fallbacks():
+    async def unavailable(**kwargs):
+        raise RuntimeError("503")
+
+    async def dropped(**kwargs):
+        return FakeStream(["แนะนำ", "ต่อ"], fail_after=1)
+
+    fallback = collect_stream(unavailable)
+    assert len(fallback) == 1 and "พบสินค้า" in fallback[0]
+    # Text already sent is kept; no fallback appended mid-answer
+    assert collect_stream(dropped) == ["แนะนำ"]
+
+if __name__ == "__main__":
+    print("🧪 Testing /api/chat/stream")
+    print("=" * 50)
+    test_event_order_and_timing()
+    test_stream_result_is_cached_for_replay()
+    test_error_event()
+    test_stream_two_stage_response_chunks()
+    test_stream_two_stage_response_fallbacks()
+    print("✅ Chat streaming tests passed")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test that the routers share one process-wide ITStoreChatbot
+"""
+
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import insights, trending
+from app.services import catalog_metadata
+from app.services.chatbot import ITStoreChatbot, get_chatbot, init_chatbot, set_chatbot
+
+class FakeDatabase(dict):
+    def __init__(self):
+        super().__init__(products=object(), product_details=object())
+
+class CountingChatbot(ITStoreChatbot):
+    instances = 0
+
+    def __init__(self, database):
+        super().__init__(database)
+        CountingChatbot.instances += 1
+        self.calls = 0
+
+    async def get_trending_products(self, limit: int = 10):
+        self.calls += 1
+        return []
+
+    async def get_search_insights(self, query):
+        self.calls += 1
+        return {"totalResults": 0}
+
+def test_get_chatbot_returns_shared_instance():
+    try:
+        chatbot = init_chatbot(FakeDatabase())
+        assert get_chatbot() is chatbot
+        assert get_chatbot() is get_chatbot()
+    finally:
+        set_chatbot(None)
+
+def test_routers_reuse_instance_across_requests():
+    app = FastAPI()
+    app.include_router(trending.router, prefix="/api")
+    app.include_router(insights.router, prefix="/api")
+    CountingChatbot.instances = 0
+    chatbot = CountingChatbot(FakeDatabase())
+    set_chatbot(chatbot)
+    try:
+        client = TestClient(app)
+        for _ in range(3):
+            assert client.get("/api/trending").status_code == 200
+        assert client.post("/api/insights", json={"query": {}}).status_code == 200
+    finally:
+        set_chatbot(None)
+    assert CountingChatbot.instances == 1
+    assert chatbot.calls == 4
+
+def test_long_lived_instance_sees_metadata_reload():
+    chatbot = ITStoreChatbot(FakeDatabase())
+    before = chatbot.metadata
+    reloaded = catalog_metadata.reload_catalog_metadata()
+    assert chatbot.metadata is reloaded and reloaded is not before
+
+if __name__ == "__main__":
+    print("🧪 Testing Shared Chatbot Instance")
+    print("=" * 50)
+    test_get_chatbot_returns_shared_instance()
+    test_routers_reuse_instance_across_requests()
+    test_long_lived_instance_sees_metadata_reload()
+    print("✅ Shared chatbot tests passed")
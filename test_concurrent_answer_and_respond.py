@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Test that Stage 3 answering and final response generation run concurrently,
+and that a slow branch falls back instead of holding up the reply
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.models import Product
+from app.services import chatbot as chatbot_module
+from app.services.chatbot import ITStoreChatbot
+
+QUESTION = "Ryzen 5 5600G เล่นเกมได้ไหม"
+STAGE1_RESULT = {"processedTerms": {"used": ["Ryzen 5 5600G"], "remaining": []}, "query": {}}
+
+def make_product() -> Product:
+    return Product(
+        _id="685827c746b7696e78ce8765",
+        title="AMD RYZEN 5 5600G 3.9 GHz",
+        description="6 Cores 12 Threads, Radeon Graphics",
+        cateName="CPU",
+        price=4590,
+        salePrice=3990,
+        stockQuantity=12,
+        rating=4.8,
+        totalReviews=120,
+        productView=5400
+    )
+
+def make_chatbot() -> ITStoreChatbot:
+    return ITStoreChatbot({"products": None})
+
+def test_branches_run_concurrently():
+    """Both branches sleep 0.3s; together they should take ~0.3s, not 0.6s"""
+    async def fake_stage3(*args, **kwargs):
+        await asyncio.sleep(0.3)
+        return "stage3"
+
+    async def fake_response(*args, **kwargs):
+        await asyncio.sleep(0.3)
+        return "response"
+
+    original = chatbot_module.stage3_question_answerer, chatbot_module.generate_two_stage_response
+    chatbot_module.stage3_question_answerer, chatbot_module.generate_two_stage_response = fake_stage3, fake_response
+    try:
+        started = time.perf_counter()
+        answer, response = asyncio.run(
+            make_chatbot().answer_and_respond(QUESTION, STAGE1_RESULT, [make_product()], ["เล่นเกมได้ไหม"])
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        chatbot_module.stage3_question_answerer, chatbot_module.generate_two_stage_response = original
+
+    print(f"  Elapsed: {elapsed:.2f}s")
+    assert (answer, response) == ("stage3", "response")
+    assert elapsed < 0.5
+
+def test_slow_branch_uses_fallback():
+    """A branch exceeding its timeout is replaced by the fallback generator"""
+    async def slow_stage3(*args, **kwargs):
+        await asyncio.sleep(5)
+        return "never"
+
+    async def fake_response(*args, **kwargs):
+        return "response"
+
+    original = (chatbot_module.stage3_question_answerer, chatbot_module.generate_two_stage_response,
+                chatbot_module.STAGE3_TIMEOUT_SECONDS)
+    chatbot_module.stage3_question_answerer = slow_stage3
+    chatbot_module.generate_two_stage_response = fake_response
+    chatbot_module.STAGE3_TIMEOUT_SECONDS = 0.1
+    try:
+        answer, response = asyncio.run(
+            make_chatbot().answer_and_respond(QUESTION, STAGE1_RESULT, [make_product()], ["เล่นเกมได้ไหม"])
+        )
+    finally:
+        (chatbot_module.stage3_question_answerer, chatbot_module.generate_two_stage_response,
+         chatbot_module.STAGE3_TIMEOUT_SECONDS) = original
+
+    print(f"  Fallback answer: {answer}")
+    assert "เล่นเกมได้ไหม" in answer
+    assert response == "response"
+
+if __name__ == "__main__":
+    print("🧪 Testing concurrent Stage 3 / response generation")
+    print("=" * 50)
+    test_branches_run_concurrently()
+    print("✅ Branches overlap")
+    test_slow_branch_uses_fallback()
+    print("✅ Slow branch falls back")
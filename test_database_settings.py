@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test MongoDB connection settings, read preference, pool warm-up and
+checkout wait metrics
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from pymongo import ReadPreference
+
+from app import database
+from app.database import DatabaseSettings, PoolCheckoutMetrics, warm_up_pool
+
+def test_settings_from_environment():
+    overrides = {
+        "MONGODB_URI": "mongodb://db.example:27017",
+        "MONGODB_MAX_POOL_SIZE": "16",
+        "MONGODB_MIN_POOL_SIZE": "4",
+        "MONGODB_COMPRESSORS": ""
+    }
+    saved = {key: os.environ.get(key) for key in overrides}
+    os.environ.update(overrides)
+    try:
+        settings = DatabaseSettings()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    options = settings.client_options()
+    assert settings.uri == "mongodb://db.example:27017"
+    assert options["maxPoolSize"] == 16 and options["minPoolSize"] == 4
+    assert options["serverSelectionTimeoutMS"] == 5000
+    assert "compressors" not in options
+
+def test_default_options_are_accepted_by_motor():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    client = AsyncIOMotorClient("mongodb://localhost:27017", **DatabaseSettings(uri=None).client_options())
+    try:
+        pool = client.options.pool_options
+        assert pool.max_pool_size == 50 and pool.min_pool_size == 5
+        assert client.options.server_selection_timeout == 5
+    finally:
+        client.close()
+
+def test_checkout_wait_is_measured_per_thread():
+    metrics = PoolCheckoutMetrics()
+
+    def checkout(delay):
+        metrics.connection_check_out_started(None)
+        time.sleep(delay)
+        metrics.connection_checked_out(None)
+
+    threads = [threading.Thread(target=checkout, args=(delay,)) for delay in (0.01, 0.05)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics.connection_check_out_started(None)
+    metrics.connection_check_out_failed(None)
+
+    stats = metrics.stats()
+    assert stats["checkouts"] == 2 and stats["failures"] == 1
+    assert 40 <= stats["maxWaitMs"] < 200, stats
+    assert stats["avgWaitMs"] >= 25, stats
+
+class FakeAdmin:
+    def __init__(self, fail_every=0):
+        self.pings = 0
+        self.fail_every = fail_every
+
+    async def command(self, name):
+        self.pings += 1
+        if self.fail_every and self.pings % self.fail_every == 0:
+            raise RuntimeError("connection refused")
+        return {"ok": 1}
+
+class FakeClient:
+    def __init__(self, admin, secondaries=(), secondary_admin=None):
+        self.admin = admin
+        self.secondaries = set(secondaries)
+        self.secondary_admin = secondary_admin
+        self.read_preferences = []
+
+    def get_database(self, name, read_preference=None):
+        self.read_preferences.append(read_preference)
+        return self.secondary_admin
+
+def test_warm_up_opens_min_pool():
+    admin = FakeAdmin()
+    assert asyncio.run(warm_up_pool(FakeClient(admin), 5)) == 5
+    assert admin.pings == 5
+    assert asyncio.run(warm_up_pool(FakeClient(FakeAdmin()), 0)) == 0
+
+def test_warm_up_failure_is_not_fatal():
+    assert asyncio.run(warm_up_pool(FakeClient(FakeAdmin(fail_every=2)), 4)) == 2
+
+def test_warm_up_reaches_secondaries():
+    """Pings through the read preference open connections on every secondary"""
+    admin, secondary_admin = FakeAdmin(), FakeAdmin()
+    client = FakeClient(admin, secondaries=[("db2", 27017), ("db3", 27017)], secondary_admin=secondary_admin)
+    assert asyncio.run(warm_up_pool(client, 3, ReadPreference.SECONDARY_PREFERRED)) == 9
+    assert admin.pings == 3 and secondary_admin.pings == 6
+    assert client.read_preferences == [ReadPreference.SECONDARY_PREFERRED]
+
+    # Primary reads only warm the primary
+    client = FakeClient(FakeAdmin(), secondary_admin=FakeAdmin())
+    assert asyncio.run(warm_up_pool(client, 3, ReadPreference.PRIMARY)) == 3
+    assert client.read_preferences == []
+
+def test_read_preference_applies_to_products_only():
+    settings = DatabaseSettings(uri="mongodb://localhost:1", min_pool_size=0, server_selection_timeout_ms=50)
+    try:
+        asyncio.run(database.connect_to_mongodb(settings))
+        assert database.db.products.read_preference == ReadPreference.SECONDARY_PREFERRED
+        assert database.db.database.read_preference == ReadPreference.PRIMARY
+    finally:
+        database.db.client.close()
+        database.db.client = database.db.database = database.db.products = None
+        database.db.text_index_ready = False
+
+if __name__ == "__main__":
+    print("🧪 Testing Database Settings")
+    print("=" * 50)
+    test_settings_from_environment()
+    test_default_options_are_accepted_by_motor()
+    test_checkout_wait_is_measured_per_thread()
+    test_warm_up_opens_min_pool()
+    test_warm_up_failure_is_not_fatal()
+    test_warm_up_reaches_secondaries()
+    test_read_preference_applies_to_products_only()
+    print("✅ Database settings tests passed")
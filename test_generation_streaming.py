@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test token streaming in the response and Stage 3 generators: string
+wrappers, fallback iterators, first-chunk timeouts and early cancellation
+"""
+
+import asyncio
+import os
+import sys
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.models import Product
+from app.services import two_stage_llm
+from app.services.chatbot import ITStoreChatbot
+from app.services.two_stage_llm import (
+    generate_stage3_fallback_answer,
+    generate_two_stage_response,
+    iterate_text,
+    stage3_question_answerer,
+    stream_stage3_answer,
+    stream_two_stage_response
+)
+
+QUESTIONS = ["เล่นเกมได้ไหม"]
+STAGE1_RESULT = {"processedTerms": {"used": ["Ryzen 5 5600G"], "remaining": []}, "query": {}}
+
+def make_product() -> Product:
+    return Product(
+        _id="685827c746b7696e78ce8765",
+        title="AMD RYZEN 5 5600G 3.9 GHz",
+        description="6 Cores 12 Threads, Radeon Graphics",
+        cateName="CPU",
+        price=4590,
+        salePrice=3990,
+        stockQuantity=12,
+        rating=4.8,
+        totalReviews=120,
+        productView=5400
+    )
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+class FakeStream:
+    """Mimics openai's AsyncStream: chunk objects plus the underlying HTTP response"""
+
+    def __init__(self, contents, delay=0.0):
+        self.contents = contents
+        self.delay = delay
+        self.response = FakeResponse()
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for content in self.contents:
+            await asyncio.sleep(self.delay)
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))])
+
+class FakeCompletions:
+    def __init__(self, contents=None, delay=0.0, error=None):
+        self.contents = contents or []
+        self.delay = delay
+        self.error = error
+        self.streams = []
+
+    async def create(self, **kwargs):
+        assert kwargs["stream"] is True
+        if self.error:
+            raise self.error
+        self.streams.append(FakeStream(self.contents, self.delay))
+        return self.streams[-1]
+
+def with_client(completions, coroutine_factory):
+    original = two_stage_llm.client
+    two_stage_llm.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    try:
+        return asyncio.run(coroutine_factory())
+    finally:
+        two_stage_llm.client = original
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+def test_string_apis_join_the_stream():
+    completions = FakeCompletions([" แนะนำ", " Ryzen 5 ", "ครับ "])
+
+    async def run():
+        response = await generate_two_stage_response("ryzen", STAGE1_RESULT, [make_product()])
+        answer = await stage3_question_answerer("ryzen", STAGE1_RESULT, [make_product()], QUESTIONS)
+        return response, answer
+
+    response, answer = with_client(completions, run)
+    assert response == answer == "แนะนำ Ryzen 5 ครับ"
+    assert all(stream.response.closed for stream in completions.streams)
+
+def test_stage3_stream_chunks_and_skip():
+    completions = FakeCompletions(["เล่น", "ได้", None, "ครับ"])
+    chunks = with_client(completions, lambda: collect(stream_stage3_answer("ryzen", STAGE1_RESULT, [make_product()], QUESTIONS)))
+    assert chunks == ["เล่น", "ได้", "ครับ"]
+    # No questions: nothing to stream and no LLM call
+    assert with_client(completions, lambda: collect(stream_stage3_answer("ryzen", STAGE1_RESULT, [make_product()], []))) == []
+    assert len(completions.streams) == 1
+
+def test_failed_llm_streams_fallback_text():
+    completions = FakeCompletions(error=RuntimeError("503"))
+    answer = with_client(completions, lambda: collect(stream_stage3_answer("ryzen", STAGE1_RESULT, [make_product()], QUESTIONS)))
+    assert answer == [generate_stage3_fallback_answer(QUESTIONS, [make_product()])]
+    response = with_client(completions, lambda: generate_two_stage_response("ryzen", STAGE1_RESULT, [make_product()]))
+    assert "AMD RYZEN 5 5600G" in response
+
+def test_iterate_text():
+    assert asyncio.run(collect(iterate_text("ข้อความ"))) == ["ข้อความ"]
+    assert asyncio.run(collect(iterate_text(""))) == []
+
+def test_first_chunk_timeout_uses_fallback():
+    chatbot = ITStoreChatbot({"products": None})
+    completions = FakeCompletions(["ช้า"], delay=1.0)
+
+    async def run():
+        return await collect(chatbot.stream_with_fallback(
+            stream_stage3_answer("ryzen", STAGE1_RESULT, [make_product()], QUESTIONS),
+            lambda: iterate_text("fallback"),
+            first_chunk_timeout=0.1
+        ))
+
+    assert with_client(completions, run) == ["fallback"]
+    assert completions.streams[0].response.closed
+
+def test_consumer_stop_closes_stream():
+    """Stopping after the first chunk (client disconnect) closes the LLM response"""
+    completions = FakeCompletions(["หนึ่ง", "สอง", "สาม"], delay=0.01)
+
+    async def run():
+        chunks = stream_two_stage_response("ryzen", STAGE1_RESULT, [make_product()])
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    assert with_client(completions, run) == "หนึ่ง"
+    assert completions.streams[0].response.closed
+
+def test_cancelled_consumer_closes_stream():
+    completions = FakeCompletions(["หนึ่ง", "สอง", "สาม"], delay=0.2)
+    received = []
+
+    async def consume():
+        async for chunk in stream_two_stage_response("ryzen", STAGE1_RESULT, [make_product()]):
+            received.append(chunk)
+
+    async def run():
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.3)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    with_client(completions, run)
+    assert received == ["หนึ่ง"]
+    assert completions.streams[0].response.closed
+
+if __name__ == "__main__":
+    print("🧪 Testing Generation Streaming")
+    print("=" * 50)
+    test_string_apis_join_the_stream()
+    test_stage3_stream_chunks_and_skip()
+    test_failed_llm_streams_fallback_text()
+    test_iterate_text()
+    test_first_chunk_timeout_uses_fallback()
+    test_consumer_stop_closes_stream()
+    test_cancelled_consumer_closes_stream()
+    print("✅ Generation streaming tests passed")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test index provisioning for the product query shapes.
+
+The explain() checks need a real mongod: set MONGODB_TEST_URI (default
+mongodb://localhost:27017) - they are skipped when none is reachable.
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services.index_manager import PRODUCT_INDEXES, backfill_search_tokens, ensure_product_indexes, index_satisfied, search_tokens_query
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), 'dashboard-ai-data.products.json')
+TEST_URI = os.getenv("MONGODB_TEST_URI", "mongodb://localhost:27017")
+TEST_DATABASE = "chatbot_index_provisioning_test"
+
+POPULARITY_SORT = [("productView", -1), ("rating", -1), ("totalReviews", -1)]
+
+# Filter/sort shapes emitted by search_products_precise, the fallback tiers,
+# get_recommendations and get_trending_products
+HOT_QUERIES = {
+    "precise_category_budget": ({"stockQuantity": {"$gt": 0}, "cateName": "Notebooks", "salePrice": {"$lte": 20000}}, POPULARITY_SORT),
+    "precise_categories_budget": ({"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Notebooks", "Gaming Notebooks"]}, "salePrice": {"$gte": 10000, "$lte": 30000}}, POPULARITY_SORT),
+    "fallback_no_budget": ({"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Notebooks", "Gaming Notebooks"]}}, POPULARITY_SORT),
+    "fallback_category": ({"stockQuantity": {"$gt": 0}, "cateName": "Notebooks"}, POPULARITY_SORT),
+    "budget_only": ({"stockQuantity": {"$gt": 0}, "salePrice": {"$lte": 15000}}, POPULARITY_SORT),
+    "stock_only": ({"stockQuantity": {"$gt": 0}}, POPULARITY_SORT),
+    "recommendations": ({"stockQuantity": {"$gt": 0}, "_id": {"$ne": "missing"}, "$or": [
+        {"cateName": "Notebooks"}, {"salePrice": {"$gte": 12000, "$lte": 18000}}
+    ]}, POPULARITY_SORT),
+    "trending": ({"stockQuantity": {"$gt": 0}, "rating": {"$gte": 3}, "totalReviews": {"$gte": 1}}, [("productView", -1), ("totalReviews", -1)])
+}
+
+class FakeProducts:
+    def __init__(self, indexes=None):
+        self.indexes = indexes or {"_id_": {"key": [("_id", 1)]}}
+        self.created = []
+
+    async def index_information(self):
+        return self.indexes
+
+    async def create_index(self, keys, **options):
+        self.created.append((keys, options))
+        self.indexes[options["name"]] = {"key": keys}
+        return options["name"]
+
+def test_creates_declared_indexes_once():
+    products = FakeProducts()
+    ready = asyncio.run(ensure_product_indexes(products))
+    assert ready == {spec.name for spec in PRODUCT_INDEXES}
+    assert len(products.created) == len(PRODUCT_INDEXES)
+
+    # Second startup: nothing to build
+    products.created = []
+    assert asyncio.run(ensure_product_indexes(products)) == ready
+    assert products.created == []
+
+def test_existing_index_under_other_name_is_reused():
+    spec = PRODUCT_INDEXES[0]
+    products = FakeProducts({
+        "_id_": {"key": [("_id", 1)]},
+        "legacy_name": {"key": [(field, float(direction)) for field, direction in spec.keys]}
+    })
+    assert index_satisfied(spec, products.indexes)
+    asyncio.run(ensure_product_indexes(products))
+    assert spec.name not in [options["name"] for _, options in products.created]
+
+def test_failed_build_is_not_fatal():
+    class FailingProducts(FakeProducts):
+        async def create_index(self, keys, **options):
+            raise RuntimeError("not authorized")
+
+    assert asyncio.run(ensure_product_indexes(FailingProducts())) == set()
+
+def test_sort_follows_equality_fields():
+    """ESR: the popularity sort directly follows the equality field(s) in each compound index"""
+    for spec in PRODUCT_INDEXES:
+        fields = [field for field, _ in spec.keys]
+        if "productView" in fields:
+            start = fields.index("productView")
+            assert fields[:start] in ([], ["cateName"]), spec.name
+            assert set(fields[start:]) >= {"productView", "totalReviews", "stockQuantity"}, spec.name
+    popularity = [spec for spec in PRODUCT_INDEXES if list(spec.keys[:3]) == POPULARITY_SORT or list(spec.keys[1:4]) == POPULARITY_SORT]
+    assert len(popularity) == 2
+
+def plan_stages(plan):
+    """Every stage name in an explain() plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(plan_stages(item))
+    return stages
+
+def connect_test_database():
+    """Seeded test database on a local mongod, or None when there is none"""
+    try:
+        from pymongo import MongoClient
+        client = MongoClient(TEST_URI, serverSelectionTimeoutMS=500)
+        client.admin.command("ping")
+    except Exception as error:
+        print(f"  ⚠️ No local mongod ({error.__class__.__name__}) - skipping explain() checks")
+        return None, None
+
+    with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    for doc in documents:
+        doc.pop("_id", None)
+    client.drop_database(TEST_DATABASE)
+    client[TEST_DATABASE]["products"].insert_many(documents)
+    return client, client[TEST_DATABASE]
+
+def test_hot_queries_use_indexes():
+    client, database = connect_test_database()
+    if client is None:
+        if "pytest" in sys.modules:
+            import pytest
+            pytest.skip("no local mongod")
+        return
+
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        async def provision():
+            motor_client = AsyncIOMotorClient(TEST_URI)
+            try:
+                ready = await ensure_product_indexes(motor_client[TEST_DATABASE]["products"])
+                await backfill_search_tokens(motor_client[TEST_DATABASE]["products"])
+                return ready
+            finally:
+                motor_client.close()
+
+        assert asyncio.run(provision()) == {spec.name for spec in PRODUCT_INDEXES}
+
+        for name, (query, sort) in HOT_QUERIES.items():
+            explain = database["products"].find(query).sort(sort).limit(50).explain()
+            stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+            assert "COLLSCAN" not in stages, f"{name}: {stages}"
+            assert "SORT" not in stages, f"{name}: blocking sort {stages}"
+            print(f"  ✅ {name}: {' <- '.join(stages)}")
+
+        # Text fallback: trigram candidates come from the multikey index (the
+        # few candidates are sorted in memory)
+        text_query = {"stockQuantity": {"$gt": 0}, "searchTokens": search_tokens_query(["rtx", "เกม"])}
+        stages = plan_stages(database["products"].find(text_query).sort(POPULARITY_SORT).limit(20).explain()["queryPlanner"]["winningPlan"])
+        assert "COLLSCAN" not in stages, f"text_search: {stages}"
+        print(f"  ✅ text_search: {' <- '.join(stages)}")
+    finally:
+        client.drop_database(TEST_DATABASE)
+        client.close()
+
+if __name__ == "__main__":
+    print("🧪 Testing Index Provisioning")
+    print("=" * 50)
+    test_creates_declared_indexes_once()
+    test_existing_index_under_other_name_is_reused()
+    test_failed_build_is_not_fatal()
+    test_sort_follows_equality_fields()
+    test_hot_queries_use_indexes()
+    print("✅ Index provisioning tests passed")
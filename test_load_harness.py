@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Smoke test for the offline load-test harness (benchmark_load.py): the
+in-memory Mongo stand-in, the fake OpenAI server and a short run
+"""
+
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services.catalog_replica import CatalogReplica
+from app.services.chatbot import RANKING_DESCRIPTION_CHARS, RANKING_PROJECTION
+from benchmark_load import (
+    CHAT_SCENARIOS,
+    InMemoryCollection,
+    apply_projection,
+    match_document,
+    percentile,
+    run_benchmark,
+    seed_products
+)
+
+def test_seeded_catalog_is_deterministic():
+    first, second = seed_products(scale=3), seed_products(scale=3)
+    assert len(first) == 42 and first == second
+    assert len({doc["_id"] for doc in first}) == len(first)
+
+def test_matcher_agrees_with_catalog_replica():
+    products = seed_products(scale=5)
+    replica = CatalogReplica(products)
+    queries = [
+        {"stockQuantity": {"$gt": 0}},
+        {"stockQuantity": {"$gt": 0}, "cateName": "Notebooks", "salePrice": {"$lte": 13000}},
+        {"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Notebooks", "Ultrathin Notebooks"]}, "salePrice": {"$gte": 12000, "$lt": 15000}},
+        {"stockQuantity": {"$gt": 0}, "$or": [{"title": {"$regex": "lenovo|msi", "$options": "i"}}, {"description": {"$regex": "lenovo|msi", "$options": "i"}}]}
+    ]
+    for query in queries:
+        expected = {str(doc["_id"]) for doc in replica.find(query, limit=len(products))}
+        assert {str(doc["_id"]) for doc in products if match_document(doc, query)} == expected, query
+
+def test_cursor_sort_limit_and_projection():
+    products = seed_products(scale=2)
+    collection = InMemoryCollection(products)
+    results = asyncio.run(collection.find({"rating": {"$gte": 3}}, {"title": 1, "productView": 1}).sort([("productView", -1)]).limit(5).to_list(length=5))
+    assert len(results) == 5 and set(results[0]) == {"_id", "title", "productView"}
+    assert [doc["productView"] for doc in results] == sorted((doc["productView"] for doc in products if doc["rating"] >= 3), reverse=True)[:5]
+
+    slim = apply_projection(products[0], {"description": RANKING_PROJECTION["description"]})
+    assert slim["description"] == products[0]["description"][:RANKING_DESCRIPTION_CHARS]
+    assert apply_projection({"_id": 1, "description": 42}, {"description": RANKING_PROJECTION["description"]})["description"] == ""
+
+def test_percentile():
+    values = [float(value) for value in range(1, 101)]
+    assert (percentile(values, 0.5), percentile(values, 0.95), percentile(values, 0.99)) == (50.0, 95.0, 99.0)
+    assert percentile([], 0.5) == 0.0
+
+def test_short_run_reports_every_endpoint():
+    report = asyncio.run(run_benchmark(concurrency=4, requests=40, llm_latency=0.01, chunk_delay=0.0, mongo_latency=0.0, scale=5))
+    endpoints = report["endpoints"]
+    print(f"  {endpoints['total']['requests']} requests, {endpoints['total']['requestsPerSecond']} req/s")
+    assert set(endpoints) == {"/api/chat", "/api/trending", "/api/recommendations", "total"}
+    assert endpoints["total"]["requests"] == 40 and endpoints["total"]["errors"] == 0
+    for endpoint in ("/api/chat", "/api/trending", "/api/recommendations"):
+        row = endpoints[endpoint]
+        assert row["p50Ms"] <= row["p95Ms"] <= row["p99Ms"]
+    assert report["stageMeansMs"]["request"] > 0
+    assert all(scenario["message"] for scenario in CHAT_SCENARIOS)
+
+if __name__ == "__main__":
+    print("🧪 Testing Load-Test Harness")
+    print("=" * 50)
+    test_seeded_catalog_is_deterministic()
+    test_matcher_agrees_with_catalog_replica()
+    test_cursor_sort_limit_and_projection()
+    test_percentile()
+    test_short_run_reports_every_endpoint()
+    print("✅ Load-test harness tests passed")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test parallel progressive fallback search: all tiers in flight at once,
+highest-priority non-empty tier wins, the rest are cancelled
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services import chatbot as chatbot_module
+from app.services.chatbot import ITStoreChatbot
+
+QUERY_LATENCY = 0.2
+
+def product_doc(index: int, cate_name: str) -> dict:
+    return {
+        "_id": f"68582{index:019d}",
+        "title": f"Product {index}",
+        "description": "test product",
+        "cateName": cate_name,
+        "price": 20000,
+        "salePrice": 18000,
+        "stockQuantity": 3,
+        "rating": 4,
+        "totalReviews": 2,
+        "productView": 100
+    }
+
+class FakeCursor:
+    def __init__(self, collection, query):
+        self._collection = collection
+        self._query = query
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    async def to_list(self, length=None):
+        tier = self._collection.tier_of(self._query)
+        self._collection.started.append(tier)
+        try:
+            await asyncio.sleep(self._collection.latency.get(tier, QUERY_LATENCY))
+        except asyncio.CancelledError:
+            self._collection.cancelled.append(tier)
+            raise
+        return list(self._collection.results.get(tier, []))
+
+class FakeCollection:
+    """Answers each fallback tier's query after a delay with canned documents"""
+
+    def __init__(self, results, latency=None):
+        self.results = results
+        self.latency = latency or {}
+        self.started = []
+        self.cancelled = []
+
+    @staticmethod
+    def tier_of(query):
+        if "$or" in query:
+            return "text_search"
+        if "salePrice" in query:
+            return "primary"
+        if isinstance(query.get("cateName"), dict):
+            return "no_budget"
+        return "category"
+
+    def find(self, query, projection=None):
+        return FakeCursor(self, query)
+
+PROCESSED_TERMS = {
+    "category": "Gaming Notebooks",
+    "remaining": ["RTX 4060"],
+    "used": ["โน้ตบุ๊คเกมมิ่ง", "งบ 5000"]
+}
+PRIMARY_QUERY = {
+    "stockQuantity": {"$gt": 0},
+    "cateName": {"$in": ["Gaming Notebooks", "Notebooks"]},
+    "salePrice": {"$lte": 5000}
+}
+
+def run_fallback(collection):
+    chatbot = ITStoreChatbot({"products": collection})
+    started = time.perf_counter()
+    products, tier = asyncio.run(chatbot.search_fallback_tiers(PROCESSED_TERMS, PRIMARY_QUERY))
+    return products, tier, time.perf_counter() - started
+
+def test_tiers_run_concurrently():
+    collection = FakeCollection({"text_search": [product_doc(1, "Gaming Notebooks")]})
+    products, tier, elapsed = run_fallback(collection)
+    assert tier == "text_search" and len(products) == 1
+    assert sorted(collection.started) == ["category", "no_budget", "text_search"]
+    # Three serial round trips would take 3x the latency
+    assert elapsed < QUERY_LATENCY * 2, f"tiers ran serially ({elapsed:.2f}s)"
+    print(f"  ✅ 3 tiers in {elapsed:.2f}s (latency {QUERY_LATENCY}s each)")
+
+def test_highest_priority_tier_wins():
+    """A faster lower-priority result does not beat a non-empty higher tier"""
+    collection = FakeCollection(
+        results={
+            "no_budget": [product_doc(1, "Gaming Notebooks")],
+            "text_search": [product_doc(2, "Graphics Cards")]
+        },
+        latency={"no_budget": 0.2, "category": 0.4, "text_search": 0.05}
+    )
+    products, tier, _ = run_fallback(collection)
+    assert tier == "no_budget"
+    assert products[0].title == "Product 1"
+    assert collection.cancelled == ["category"]
+
+def test_sequential_mode():
+    chatbot_module.FALLBACK_SEARCH_MODE = "sequential"
+    try:
+        collection = FakeCollection({"category": [product_doc(1, "Gaming Notebooks")]})
+        products, tier, _ = run_fallback(collection)
+    finally:
+        chatbot_module.FALLBACK_SEARCH_MODE = "parallel"
+    assert tier == "category"
+    assert collection.started == ["no_budget", "category"]
+
+def test_no_results():
+    products, tier, _ = run_fallback(FakeCollection({}))
+    assert products == [] and tier is None
+
+if __name__ == "__main__":
+    print("🧪 Testing Parallel Fallback Search")
+    print("=" * 50)
+    test_tiers_run_concurrently()
+    test_highest_priority_tier_wins()
+    test_sequential_mode()
+    test_no_results()
+    print("✅ Parallel fallback tests passed")
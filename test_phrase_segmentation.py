@@ -5,11 +5,54 @@ Test script for improved contextual phrase segmentation
 
 import sys
 import os
+import time
 
 # Add backend to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
-from app.services.two_stage_llm import contextual_phrase_segmentation, extract_basic_entities
+from app.services.two_stage_llm import (
+    contextual_phrase_segmentation,
+    enhanced_contextual_phrase_segmentation,
+    extract_basic_entities
+)
+from app.services.phrase_segmenter import default_segmenter
+
+# Stage assignments produced by the original per-request segmentation loop;
+# the compiled segmenter must reproduce them exactly
+GOLDEN_STAGE_ASSIGNMENTS = {
+    "อยากได้คอมทำงานกราฟิก แนะนำหน่อย": {
+        "stage1_filter": ["อยากได้คอม"], "stage1_inference": [],
+        "stage2_content": ["ทำงานกราฟิก"], "stage3_questions": ["แนะนำหน่อย"]
+    },
+    "โน้ตบุ๊ค ASUS งบ 20000": {
+        "stage1_filter": ["โน้ตบุ๊ค", "งบ 20000"], "stage1_inference": [],
+        "stage2_content": ["asus"], "stage3_questions": []
+    },
+    "การ์ดจอเล่นเกม RTX 4060": {
+        "stage1_filter": [], "stage1_inference": ["rtx 4060"],
+        "stage2_content": ["เล่นเกม"], "stage3_questions": []
+    },
+    "เมาส์เกมมิ่งไร้สาย RGB ไม่เกิน 3000": {
+        "stage1_filter": ["ไม่เกิน 3000"], "stage1_inference": [],
+        "stage2_content": ["ไร้สาย", "rgb"], "stage3_questions": []
+    },
+    "คีย์บอร์ด mechanical สำหรับทำงาน": {
+        "stage1_filter": ["คีย์บอร์ด"], "stage1_inference": [],
+        "stage2_content": ["สำหรับทำงาน", "mechanical"], "stage3_questions": []
+    },
+    "Ryzen 5 5600G เล่นเกมได้ไหม": {
+        "stage1_filter": [], "stage1_inference": ["ryzen 5 5600g"],
+        "stage2_content": [], "stage3_questions": ["เล่นเกมได้ไหม"]
+    },
+    "จอ 27 นิ้ว ราคา 8000 ดีไหม": {
+        "stage1_filter": ["ราคา 800"], "stage1_inference": [],
+        "stage2_content": [], "stage3_questions": ["ดีไหม"]
+    },
+    "ขอ ssd": {
+        "stage1_filter": [], "stage1_inference": [],
+        "stage2_content": ["ขอ ssd"], "stage3_questions": []
+    }
+}
 
 def test_phrase_segmentation():
     """Test the improved phrase segmentation"""
@@ -97,8 +140,39 @@ def test_entity_extraction():
         except Exception as e:
             print(f"❌ Error: {e}")
 
+def test_golden_stage_assignments():
+    """Compiled segmenter keeps the original stage assignments"""
+    print("\n🧪 Testing Stage Assignments Against Golden Output")
+    print("=" * 50)
+
+    for text, expected in GOLDEN_STAGE_ASSIGNMENTS.items():
+        result = enhanced_contextual_phrase_segmentation(text)
+        assert result["stage_assignments"] == expected, f"{text}: {result['stage_assignments']}"
+        print(f"  ✅ {text}")
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def test_segmentation_latency(iterations: int = 2000):
+    """Per-request segmentation time (p50/p99) for the test phrases"""
+    print("\n🧪 Benchmarking Phrase Segmentation")
+    print("=" * 50)
+
+    for text in GOLDEN_STAGE_ASSIGNMENTS:
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            default_segmenter.segment(text)
+            samples.append((time.perf_counter() - started) * 1_000_000)
+        p50 = _percentile(samples, 0.50)
+        p99 = _percentile(samples, 0.99)
+        print(f"  {text}: p50 {p50:.1f}µs  p99 {p99:.1f}µs")
+
 if __name__ == "__main__":
     test_phrase_segmentation()
     test_entity_extraction()
+    test_golden_stage_assignments()
+    test_segmentation_latency()
     
     print("\n🎉 Testing completed!")
\ No newline at end of file
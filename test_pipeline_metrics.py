@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test per-stage timing spans, Mongo query timings by fallback tier, LLM token
+counts from response.usage and the Prometheus text on /metrics
+"""
+
+import asyncio
+import json
+import os
+import sys
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import metrics, two_stage_llm
+from app.services.catalog_replica import CatalogReplica, set_catalog_replica
+from app.services.chatbot import ITStoreChatbot
+from app.services.stage1_memo import get_stage1_memo, set_stage1_memo
+from test_catalog_replica import load_sample_documents
+from test_stage1_memo import LLM_OUTPUT as KEYBOARD_OUTPUT, LLM_QUERY
+
+# The sample catalog has notebooks but no keyboards
+LLM_OUTPUT = json.loads(json.dumps(KEYBOARD_OUTPUT).replace("Mechanical & Gaming Keyboard", "Notebooks"))
+
+STAGE1_USAGE = {"prompt_tokens": 3200, "completion_tokens": 180}
+STREAM_USAGE = {"prompt_tokens": 900, "completion_tokens": 60}
+
+class FakeStream:
+    """Content chunks followed by the usage-only chunk stream_options.include_usage adds"""
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        for content in ["แนะนำ", "ครับ"]:
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=content))], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=dict(STREAM_USAGE))
+
+class FakeCompletions:
+    def __init__(self):
+        self.stream_kwargs = []
+
+    async def create(self, **kwargs):
+        if kwargs.get("stream"):
+            self.stream_kwargs.append(kwargs)
+            return FakeStream()
+        message = types.SimpleNamespace(content=json.dumps(LLM_OUTPUT, ensure_ascii=False))
+        usage = types.SimpleNamespace(**STAGE1_USAGE, total_tokens=sum(STAGE1_USAGE.values()))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+class UnusedCollection:
+    def find(self, *args, **kwargs):
+        raise AssertionError("MongoDB should not be queried")
+
+def run_pipeline(message):
+    completions = FakeCompletions()
+    original_client, original_store = two_stage_llm.client, get_stage1_memo()
+    two_stage_llm.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    set_stage1_memo(None)
+    set_catalog_replica(CatalogReplica(load_sample_documents()))
+    try:
+        result = asyncio.run(ITStoreChatbot({"products": UnusedCollection()}).process_user_input(message))
+    finally:
+        two_stage_llm.client = original_client
+        set_stage1_memo(original_store)
+        set_catalog_replica(None)
+    return result, completions
+
+def test_histogram_and_counter_rendering():
+    registry = metrics.MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo latency", ["stage"], buckets=(0.1, 1.0))
+    tokens = registry.counter("demo_tokens_total", "Demo tokens", ["kind"])
+    latency.observe(0.05, stage="a")
+    latency.observe(0.5, stage="a")
+    latency.observe(5, stage="a")
+    tokens.inc(12, kind='pro"mpt')
+    registry.gauge_callback("demo_gauge", "Demo gauge", lambda: 2.5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_sum{stage="a"} 5.55' in lines
+    assert 'demo_seconds_count{stage="a"} 3' in lines
+    assert 'demo_tokens_total{kind="pro\\"mpt"} 12' in lines
+    assert "demo_gauge 2.5" in lines
+
+    try:
+        registry.counter("demo_tokens_total", "Duplicate")
+        assert False, "duplicate metric names must be rejected"
+    except ValueError:
+        pass
+
+def test_pipeline_records_spans_and_tokens():
+    stages = ["request", "segmentation", "stage1", "stage1_llm", "stage2", "hydrate", "response"]
+    before = {stage: metrics.stage_duration.count(stage=stage) for stage in stages}
+    prompt_before = metrics.llm_tokens_total.value(stage="stage1", kind="prompt")
+    response_before = metrics.llm_tokens_total.value(stage="response", kind="completion")
+    requests_before = metrics.request_tokens.count(kind="prompt")
+    request_prompt_before = metrics.request_tokens.total(kind="prompt")
+    replica_before = metrics.mongo_query_duration.count(tier="primary", source="replica")
+
+    result, completions = run_pipeline(LLM_QUERY)
+    assert result["stage1Path"] == "llm" and result["response"] == "แนะนำครับ"
+    assert completions.stream_kwargs[0]["extra_body"] == {"stream_options": {"include_usage": True}}
+
+    for stage in stages:
+        assert metrics.stage_duration.count(stage=stage) == before[stage] + 1, stage
+    assert metrics.mongo_query_duration.count(tier="primary", source="replica") == replica_before + 1
+    assert metrics.llm_tokens_total.value(stage="stage1", kind="prompt") == prompt_before + STAGE1_USAGE["prompt_tokens"]
+    assert metrics.llm_tokens_total.value(stage="response", kind="completion") == response_before + STREAM_USAGE["completion_tokens"]
+    assert metrics.llm_first_chunk.count(stage="response") > 0
+
+    # Per-request token spend sums every LLM call of the request
+    assert metrics.request_tokens.count(kind="prompt") == requests_before + 1
+    assert metrics.request_tokens.total(kind="prompt") - request_prompt_before == STAGE1_USAGE["prompt_tokens"] + STREAM_USAGE["prompt_tokens"]
+
+def test_fallback_tiers_are_labelled():
+    chatbot = ITStoreChatbot({"products": UnusedCollection()})
+    set_catalog_replica(CatalogReplica(load_sample_documents()))
+    before = metrics.mongo_query_duration.count(tier="category", source="replica")
+    try:
+        products, tier = asyncio.run(chatbot.search_fallback_tiers(
+            {"category": "Notebooks"},
+            {"stockQuantity": {"$gt": 0}, "cateName": "Notebooks", "salePrice": {"$lte": 1}}
+        ))
+    finally:
+        set_catalog_replica(None)
+    assert products
+    assert metrics.mongo_query_duration.count(tier="category", source="replica") == before + 1
+
+def test_usage_counts_shapes():
+    assert metrics.usage_counts(None) == (0, 0)
+    assert metrics.usage_counts({"prompt_tokens": 5, "completion_tokens": 2}) == (5, 2)
+    assert metrics.usage_counts(types.SimpleNamespace(prompt_tokens=7, completion_tokens=None)) == (7, 0)
+
+def test_metrics_endpoint():
+    run_pipeline(LLM_QUERY)
+    response = TestClient(app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    print(f"  /metrics: {len(body.splitlines())} lines")
+    assert 'chatbot_stage_duration_seconds_bucket{stage="stage1_llm",le="+Inf"}' in body
+    assert 'chatbot_llm_tokens_total{stage="stage1",kind="prompt"}' in body
+    assert "# TYPE chatbot_request_tokens histogram" in body
+    assert "mongo_pool_checkouts" in body
+
+if __name__ == "__main__":
+    print("🧪 Testing Pipeline Metrics")
+    print("=" * 50)
+    test_histogram_and_counter_rendering()
+    test_pipeline_records_spans_and_tokens()
+    test_fallback_tiers_are_labelled()
+    test_usage_counts_shapes()
+    test_metrics_endpoint()
+    print("✅ Pipeline metrics tests passed")
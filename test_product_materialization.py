@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test the lightweight ProductRecord path and benchmark allocations against
+validating a full Product for every candidate
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.models import ChatResponse, Product, ProductRecord
+from app.services.chatbot import ITStoreChatbot
+from app.services.content_scorer import ContentScorer
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), 'dashboard-ai-data.products.json')
+CANDIDATES = 50
+RETURNED = 8
+
+def load_candidates(count: int = CANDIDATES):
+    """`count` Mongo-shaped documents (ObjectId _id) cycled from the sample export"""
+    with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    candidates = []
+    for index in range(count):
+        doc = dict(documents[index % len(documents)])
+        doc["_id"] = ObjectId(doc["_id"]["$oid"]) if isinstance(doc["_id"], dict) else ObjectId()
+        candidates.append(doc)
+    return candidates
+
+def legacy_request(documents):
+    """Previous path: full Product per candidate, then FastAPI re-validation via response_model"""
+    products = []
+    for result in documents:
+        product_data = {
+            "id": result.get("_id"),
+            "title": result.get("title", ""),
+            "description": result.get("description", ""),
+            "cateName": result.get("cateName", ""),
+            "price": float(result.get("price", 0)),
+            "salePrice": float(result.get("salePrice", 0)),
+            "stockQuantity": int(result.get("stockQuantity", 0)),
+            "rating": float(result.get("rating", 0)),
+            "totalReviews": int(result.get("totalReviews", 0)),
+            "productView": int(result.get("productView", 0)),
+            "images": result.get("images", {}),
+            "freeShipping": result.get("freeShipping", False),
+            "product_warranty_2_year": result.get("product_warranty_2_year"),
+            "product_warranty_3_year": result.get("product_warranty_3_year"),
+            "categoryId": result.get("categoryId"),
+            "cateId": result.get("cateId"),
+            "productCode": result.get("productCode", "")
+        }
+        products.append(Product(**product_data))
+    response = ChatResponse(message="ok", products=products[:RETURNED], success=True)
+    revalidated = ChatResponse.model_validate(response.model_dump(by_alias=True))
+    return jsonable_encoder(revalidated)
+
+def record_request(documents):
+    """Current path: records for every candidate, Product only for what is returned"""
+    chatbot = ITStoreChatbot({"products": None})
+    records = chatbot.parse_products(documents)
+    response = ChatResponse(message="ok", products=chatbot.to_response_products(records[:RETURNED]), success=True)
+    return jsonable_encoder(response)
+
+def measure(request, documents, rounds: int = 20):
+    """Average per-request peak of traced memory above the starting point, and time"""
+    request(documents)  # warm-up (imports, schema caches)
+    tracemalloc.start()
+    peaks = []
+    for _ in range(rounds):
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        request(documents)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        request(documents)
+    elapsed = (time.perf_counter() - started) / rounds
+    return {"peakKB": sum(peaks) / len(peaks) / 1024, "ms": elapsed * 1000}
+
+def test_record_matches_product():
+    documents = load_candidates(14)
+    for doc in documents:
+        record = ProductRecord.from_document(doc)
+        assert record.id == str(doc["_id"])
+        assert record.to_product().model_dump() == Product(**{**doc, "_id": str(doc["_id"])}).model_dump()
+
+def test_inconsistent_documents_are_skipped():
+    good = load_candidates(1)[0]
+    chatbot = ITStoreChatbot({"products": None})
+    records = chatbot.parse_products([
+        good,
+        {**good, "_id": None},
+        {**good, "cateName": None},
+        {**good, "price": "n/a"}
+    ])
+    assert [record.id for record in records] == [str(good["_id"])]
+
+def test_records_flow_through_ranking():
+    records = ITStoreChatbot({"products": None}).parse_products(load_candidates())
+    ranked = ContentScorer(["16GB"]).rank(records)
+    assert ranked and len(ranked) <= RETURNED
+    assert all(isinstance(record, ProductRecord) for record in ranked)
+
+def test_response_output_unchanged():
+    documents = load_candidates()
+    assert record_request(documents) == legacy_request(documents)
+
+def test_allocation_benchmark():
+    documents = load_candidates()
+    before = measure(legacy_request, documents)
+    after = measure(record_request, documents)
+    print(f"  Before: {before['peakKB']:.1f} KB peak/request, {before['ms']:.2f} ms ({CANDIDATES} candidates, {RETURNED} returned)")
+    print(f"  After:  {after['peakKB']:.1f} KB peak/request, {after['ms']:.2f} ms")
+    assert after["peakKB"] < before["peakKB"]
+
+if __name__ == "__main__":
+    print("🧪 Testing Product Materialization")
+    print("=" * 50)
+    test_record_matches_product()
+    test_inconsistent_documents_are_skipped()
+    test_records_flow_through_ranking()
+    test_response_output_unchanged()
+    test_allocation_benchmark()
+    print("✅ Product materialization tests passed")
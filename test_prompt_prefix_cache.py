@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test the prefix-stable prompt layout: a static system message per LLM call
+(identical across requests, so the provider can cache it) followed by a small
+per-request user message, and cached prompt tokens read from response.usage
+"""
+
+import asyncio
+import json
+import os
+import sys
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services import metrics, two_stage_llm
+from app.services.catalog_metadata import get_catalog_metadata
+from app.services.stage1_memo import get_stage1_memo, set_stage1_memo
+from app.services.two_stage_llm import (
+    build_stage1_messages,
+    build_stage3_messages,
+    build_two_stage_response_messages,
+    enhanced_contextual_phrase_segmentation,
+    stage1_context_analysis_and_query_builder,
+    stage2_llm_content_analyzer
+)
+from test_generation_streaming import make_product
+from test_stage1_memo import LLM_OUTPUT, LLM_QUERY
+
+INPUTS = ["โน้ตบุ๊ค ASUS งบ 20000", "Ryzen 5 5600G เล่นเกมได้ไหม", "ขอของขวัญให้แฟน"]
+STAGE1_RESULT = {"processedTerms": {"used": ["Ryzen 5 5600G"], "remaining": ["เล่นเกม"]}, "query": {"cateName": "CPU"}, "reasoning": "CPU"}
+CACHED_USAGE = {"prompt_tokens": 2100, "completion_tokens": 150, "prompt_tokens_details": {"cached_tokens": 1792}}
+
+def stage1_messages(user_input, compact=True):
+    phrase_analysis = enhanced_contextual_phrase_segmentation(user_input)
+    original = two_stage_llm.STAGE1_COMPACT_PROMPT
+    two_stage_llm.STAGE1_COMPACT_PROMPT = compact
+    try:
+        return build_stage1_messages(user_input, phrase_analysis, phrase_analysis["stage_assignments"], get_catalog_metadata())
+    finally:
+        two_stage_llm.STAGE1_COMPACT_PROMPT = original
+
+def fake_client(create):
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+def test_stage1_system_prompt_is_static():
+    for compact in (True, False):
+        layouts = [stage1_messages(user_input, compact) for user_input in INPUTS]
+        assert all([message["role"] for message in messages] == ["system", "user"] for messages in layouts)
+        assert len({messages[0]["content"] for messages in layouts}) == 1
+        # Built once per catalog version and mode
+        assert layouts[0][0]["content"] is layouts[1][0]["content"]
+        for user_input, (_, user) in zip(INPUTS, layouts):
+            assert f'"{user_input}"' in user["content"]
+    for system, user in (stage1_messages(user_input) for user_input in INPUTS):
+        print(f"  stage1: {len(system['content']):,} static + {len(user['content']):,} per-request chars")
+        assert len(user["content"]) < len(system["content"]) / 5
+
+def test_response_and_stage3_system_prompts_are_static():
+    product = make_product()
+    responses = [build_two_stage_response_messages(user_input, STAGE1_RESULT, [product]) for user_input in INPUTS]
+    answers = [build_stage3_messages(user_input, [product], ["เล่นเกมได้ไหม"]) for user_input in INPUTS]
+    for layouts, system_prompt in ((responses, two_stage_llm.RESPONSE_SYSTEM_PROMPT), (answers, two_stage_llm.STAGE3_SYSTEM_PROMPT)):
+        for user_input, (system, user) in zip(INPUTS, layouts):
+            assert system == {"role": "system", "content": system_prompt}
+            assert f'"{user_input}"' in user["content"] and product.title in user["content"]
+    # Per-request terms for the search-process footer come with the results
+    assert "Ryzen 5 5600G" in responses[0][1]["content"] and "Ryzen 5 5600G" not in two_stage_llm.RESPONSE_SYSTEM_PROMPT
+
+def test_stage2_llm_uses_static_system_prompt():
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs["messages"])
+        content = json.dumps({"selectedProducts": [{"index": 0, "score": 95}]})
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))], usage=None)
+
+    original_client = two_stage_llm.client
+    two_stage_llm.client = fake_client(create)
+    try:
+        for user_input in INPUTS[:2]:
+            asyncio.run(stage2_llm_content_analyzer(user_input, STAGE1_RESULT, [make_product()], ["เล่นเกม"], [], {}))
+    finally:
+        two_stage_llm.client = original_client
+
+    assert calls[0][0] == calls[1][0] == {"role": "system", "content": two_stage_llm.STAGE2_SYSTEM_PROMPT}
+    assert f'"{INPUTS[1]}"' in calls[1][1]["content"]
+
+def test_cached_tokens_are_recorded():
+    assert metrics.cached_prompt_tokens(None) == 0
+    assert metrics.cached_prompt_tokens({"prompt_tokens": 5}) == 0
+    assert metrics.cached_prompt_tokens(CACHED_USAGE) == 1792
+    details = types.SimpleNamespace(cached_tokens=1024)
+    assert metrics.cached_prompt_tokens(types.SimpleNamespace(prompt_tokens=1500, prompt_tokens_details=details)) == 1024
+
+    async def create(**kwargs):
+        message = types.SimpleNamespace(content=json.dumps(LLM_OUTPUT, ensure_ascii=False))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=CACHED_USAGE)
+
+    original_client, original_store = two_stage_llm.client, get_stage1_memo()
+    two_stage_llm.client = fake_client(create)
+    set_stage1_memo(None)
+    before = metrics.llm_tokens_total.value(stage="stage1", kind="cached")
+    try:
+        with metrics.track_request() as usage:
+            asyncio.run(stage1_context_analysis_and_query_builder(LLM_QUERY))
+    finally:
+        two_stage_llm.client = original_client
+        set_stage1_memo(original_store)
+
+    assert metrics.llm_tokens_total.value(stage="stage1", kind="cached") == before + 1792
+    assert usage == {"prompt": 2100, "completion": 150, "cached": 1792}
+
+if __name__ == "__main__":
+    print("🧪 Testing Prefix-Stable Prompts")
+    print("=" * 50)
+    test_stage1_system_prompt_is_static()
+    test_response_and_stage3_system_prompts_are_static()
+    test_stage2_llm_uses_static_system_prompt()
+    test_cached_tokens_are_recorded()
+    print("✅ Prefix-stable prompt tests passed")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Test single-flight request coalescing: identical concurrent chat queries
+share one pipeline run, the post-completion window, failures and
+cancellation, and the /api/chat integration
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers import chat
+from app.services import cache, metrics, single_flight
+from app.services.chatbot import set_chatbot
+from app.services.single_flight import SingleFlight
+
+MESSAGE = "การ์ดจอ RTX 4060 ราคาเท่าไหร่"
+# Spacing/case variants normalize to the same key
+VARIANTS = [MESSAGE, "การ์ดจอ  RTX 4060 ราคาเท่าไหร่", "การ์ดจอ rtx 4060 ราคาเท่าไหร่"]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+class CountingCompute:
+    def __init__(self, delay=0.05, result="shared", error=None):
+        self.calls = 0
+        self.delay = delay
+        self.result = result
+        self.error = error
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"value": self.result, "run": self.calls}
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    compute = CountingCompute()
+    before = metrics.coalesced_requests.value(when="in_flight")
+
+    async def burst():
+        return await asyncio.gather(*(flight.run("key", compute) for _ in range(5)))
+
+    results = asyncio.run(burst())
+    assert compute.calls == 1
+    assert all(result is results[0] for result in results)
+    assert metrics.coalesced_requests.value(when="in_flight") == before + 4
+    stats = flight.stats()
+    assert stats["leaders"] == 1 and stats["collapsedInFlight"] == 4 and stats["inFlight"] == 0
+    assert stats["collapseRate"] == 0.8
+
+    # Different keys don't coalesce
+    async def distinct():
+        return await asyncio.gather(flight.run("a", compute), flight.run("b", compute))
+    asyncio.run(distinct())
+    assert compute.calls == 3
+
+def test_window_reuses_finished_result():
+    clock = FakeClock()
+    flight = SingleFlight(window_seconds=2.0, clock=clock)
+    compute = CountingCompute(delay=0)
+
+    first = asyncio.run(flight.run("key", compute))
+    clock.now += 1.5
+    assert asyncio.run(flight.run("key", compute)) is first
+    assert flight.stats()["collapsedWindow"] == 1
+    clock.now += 1.0
+    assert asyncio.run(flight.run("key", compute))["run"] == 2
+
+    # keep=False results (e.g. error responses) are shared in flight only
+    asyncio.run(flight.run("rejected", compute, keep=lambda result: False))
+    asyncio.run(flight.run("rejected", compute, keep=lambda result: False))
+    assert compute.calls == 4
+
+    # A zero window shares only while in flight
+    unwindowed = SingleFlight(window_seconds=0, clock=clock)
+    asyncio.run(unwindowed.run("key", compute))
+    asyncio.run(unwindowed.run("key", compute))
+    assert compute.calls == 6
+
+def test_failure_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight(window_seconds=60)
+    compute = CountingCompute(error=RuntimeError("pipeline down"))
+
+    async def burst():
+        return await asyncio.gather(*(flight.run("key", compute) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(burst())
+    assert compute.calls == 1 and all(isinstance(error, RuntimeError) for error in errors)
+    compute.error = None
+    assert asyncio.run(flight.run("key", compute))["run"] == 2
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    compute = CountingCompute(delay=0.1)
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(flight.run("key", compute))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader.cancelled()
+
+    result, leader_cancelled = asyncio.run(scenario())
+    assert leader_cancelled and result["value"] == "shared" and compute.calls == 1
+
+class SlowChatbot:
+    """Stands in for ITStoreChatbot: counts full pipeline runs"""
+
+    def __init__(self, delay=0.2, fail=False):
+        self.runs = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def process_user_input(self, user_input):
+        self.runs += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return {
+                "products": [],
+                "response": "ขออภัย เกิดข้อผิดพลาดในการค้นหาสินค้า กรุณาลองใหม่อีกครั้ง 🔧",
+                "reasoning": None,
+                "queryReasoning": None,
+                "mongoQuery": None,
+                "stage1": None,
+                "searchMethod": "error",
+                "error": "pipeline down"
+            }
+        return {
+            "products": [],
+            "response": f"ราคา RTX 4060 (run {self.runs})",
+            "reasoning": "coalesced",
+            "queryReasoning": None,
+            "mongoQuery": {"stockQuantity": {"$gt": 0}},
+            "stage1": None
+        }
+
+def run_endpoint_test(test, chatbot=None):
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/api")
+    chatbot = chatbot or SlowChatbot()
+    original_flight, original_cache = single_flight.chat_coalescer, cache.RESPONSE_CACHE_ENABLED
+    single_flight.chat_coalescer = SingleFlight(window_seconds=0)
+    # Coalescing alone, without the response cache answering repeats
+    cache.RESPONSE_CACHE_ENABLED = False
+    set_chatbot(chatbot)
+    try:
+        async def run():
+            async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+                return await test(client)
+        return chatbot, asyncio.run(run())
+    finally:
+        single_flight.chat_coalescer = original_flight
+        cache.RESPONSE_CACHE_ENABLED = original_cache
+        set_chatbot(None)
+
+def test_chat_endpoint_coalesces_identical_queries():
+    async def burst(client):
+        responses = await asyncio.gather(*(
+            client.post("/api/chat", json={"message": VARIANTS[index % len(VARIANTS)]}) for index in range(6)
+        ))
+        stats = (await client.get("/api/chat/coalescing/stats")).json()
+        return [response.json() for response in responses], stats
+
+    chatbot, (bodies, stats) = run_endpoint_test(burst)
+    print(f"  6 concurrent requests -> {chatbot.runs} pipeline run")
+    assert chatbot.runs == 1
+    assert {body["message"] for body in bodies} == {"ราคา RTX 4060 (run 1)"}
+    assert stats["leaders"] == 1 and stats["collapsedInFlight"] == 5
+
+def test_stream_joins_in_flight_chat_run():
+    async def mixed(client):
+        chat_request = asyncio.ensure_future(client.post("/api/chat", json={"message": MESSAGE}))
+        await asyncio.sleep(0.05)
+        stream = await client.post("/api/chat/stream", json={"message": VARIANTS[1]})
+        return (await chat_request).json(), stream.text
+
+    chatbot, (body, stream_text) = run_endpoint_test(mixed)
+    events = [line[len("event: "):] for line in stream_text.splitlines() if line.startswith("event: ")]
+    tokens = [json.loads(line[len("data: "):]) for line in stream_text.splitlines() if line.startswith("data: ")]
+    assert chatbot.runs == 1
+    assert events == ["stage1", "products", "token", "done"]
+    assert tokens[2]["text"] == body["message"]
+
+def test_stream_joining_failed_run_gets_error_event():
+    async def mixed(client):
+        chat_request = asyncio.ensure_future(client.post("/api/chat", json={"message": MESSAGE}))
+        await asyncio.sleep(0.05)
+        stream = await client.post("/api/chat/stream", json={"message": VARIANTS[1]})
+        return (await chat_request).json(), stream.text
+
+    chatbot, (body, stream_text) = run_endpoint_test(mixed, SlowChatbot(fail=True))
+    events = [line[len("event: "):] for line in stream_text.splitlines() if line.startswith("event: ")]
+    payloads = [json.loads(line[len("data: "):]) for line in stream_text.splitlines() if line.startswith("data: ")]
+    assert chatbot.runs == 1
+    assert events == ["error"] and payloads[0]["success"] is False
+
+if __name__ == "__main__":
+    print("🧪 Testing Request Coalescing")
+    print("=" * 50)
+    test_concurrent_calls_share_one_run()
+    test_window_reuses_finished_result()
+    test_failure_reaches_every_waiter_and_is_not_kept()
+    test_cancelled_leader_does_not_cancel_followers()
+    test_chat_endpoint_coalesces_identical_queries()
+    test_stream_joins_in_flight_chat_run()
+    test_stream_joining_failed_run_gets_error_event()
+    print("✅ Request coalescing tests passed")
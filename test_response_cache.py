@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test the chat response cache: TTL/LRU behaviour, key normalization,
+cache hits skipping the chatbot, and invalidation on product changes
+"""
+
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.models import ChatRequest, Product
+from app.routers import chat
+from app.services import cache, single_flight
+from app.services.cache import TTLCache, build_response_cache_key, watch_product_changes
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class CountingChatbot:
+    """Stand-in for ITStoreChatbot that counts full pipeline runs"""
+    calls = 0
+
+    def __init__(self, database, metadata=None):
+        pass
+
+    async def process_user_input(self, user_input: str):
+        CountingChatbot.calls += 1
+        product = Product(
+            _id="685827c746b7696e78ce8765",
+            title="ASUS TUF Gaming F15",
+            description="RTX 4050, 16GB RAM",
+            cateName="Gaming Notebooks",
+            price=32990,
+            salePrice=29990,
+            stockQuantity=5,
+            rating=4.6,
+            totalReviews=80,
+            productView=3200
+        )
+        return {
+            "products": [product],
+            "response": "แนะนำ ASUS TUF Gaming F15",
+            "reasoning": None,
+            "stage1": {"processedTerms": {"category": "Gaming Notebooks", "used": [], "remaining": []}},
+            "queryReasoning": "rule-based",
+            "mongoQuery": {"stockQuantity": {"$gt": 0}},
+            "stage1Path": "rule_based",
+            "searchMethod": "three_stage_llm"
+        }
+
+class FakeChangeStream:
+    def __init__(self, changes):
+        self._changes = list(changes)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._changes:
+            raise StopAsyncIteration
+        return self._changes.pop(0)
+
+class FakeCollection:
+    def __init__(self, changes=None, error=None):
+        self._changes = changes or []
+        self._error = error
+        self.pipeline = None
+
+    def watch(self, pipeline):
+        self.pipeline = pipeline
+        if self._error:
+            raise self._error
+        return FakeChangeStream(self._changes)
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    store = TTLCache(max_entries=10, ttl_seconds=60, clock=clock)
+    store.set("a", 1)
+    assert store.get("a") == 1
+    clock.now = 61
+    assert store.get("a") is None
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+def test_lru_eviction():
+    store = TTLCache(max_entries=2, ttl_seconds=60)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")       # "b" is now least recently used
+    store.set("c", 3)
+    assert store.get("b") is None
+    assert store.get("a") == 1 and store.get("c") == 3
+    assert store.evictions == 1
+
+def test_key_normalizes_variants():
+    """Spelling, spacing and case variants share one cache entry"""
+    base = build_response_cache_key("โน้ตบุ๊ค ASUS งบ 20000")
+    assert build_response_cache_key("โน๊ตบุ๊ค  asus งบ 20000") == base
+    assert build_response_cache_key("โน้ตบุ๊ค ASUS งบ 30000") != base
+    assert base == "โน้ตบุ๊ก asus งบ 20000"
+
+def test_cache_hit_skips_pipeline():
+    chatbot = CountingChatbot(None)
+    CountingChatbot.calls = 0
+    cache.response_cache.clear()
+    first = asyncio.run(chat.chat_endpoint(ChatRequest(message="โน้ตบุ๊คเล่นเกม แนะนำหน่อย"), chatbot=chatbot))
+    second = asyncio.run(chat.chat_endpoint(ChatRequest(message="โน๊ตบุ๊คเล่นเกม แนะนำหน่อย"), chatbot=chatbot))
+
+    assert CountingChatbot.calls == 1
+    assert second.model_dump() == first.model_dump()
+    assert second.products[0].title == "ASUS TUF Gaming F15"
+    print(f"  Cache stats: {cache.response_cache.stats()}")
+
+def test_price_change_invalidates():
+    cache.response_cache.set("key", {"message": "cached"})
+    # Results kept for the coalescing window go stale too
+    single_flight.chat_coalescer._recent["key"] = (float("inf"), {"message": "coalesced"})
+    collection = FakeCollection(changes=[{
+        "operationType": "update",
+        "updateDescription": {"updatedFields": {"salePrice": 19990}}
+    }])
+    asyncio.run(watch_product_changes(collection))
+    assert len(cache.response_cache) == 0
+    assert "key" not in single_flight.chat_coalescer._recent
+    assert "$match" in collection.pipeline[0]
+
+def test_watcher_without_replica_set():
+    """Standalone servers reject change streams - the watcher logs and stops"""
+    cache.response_cache.set("key", {"message": "cached"})
+    asyncio.run(watch_product_changes(FakeCollection(error=RuntimeError("not a replica set"))))
+    assert len(cache.response_cache) == 1
+    cache.response_cache.clear()
+
+if __name__ == "__main__":
+    print("🧪 Testing Chat Response Cache")
+    print("=" * 50)
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_key_normalizes_variants()
+    test_cache_hit_skips_pipeline()
+    test_price_change_invalidates()
+    test_watcher_without_replica_set()
+    print("✅ Response cache tests passed")
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Test Stage 1 memoization: memory and SQLite stores, lock contention,
+metadata versioning, and the Stage 1 LLM being skipped on a memo hit
+"""
+
+import asyncio
+import dataclasses
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services import two_stage_llm
+from app.services.catalog_metadata import get_catalog_metadata
+from app.services.stage1_memo import (
+    MemoryStage1Store,
+    SQLiteStage1Store,
+    get_stage1_memo,
+    memo_get,
+    memo_set,
+    set_stage1_memo,
+    stage1_memo_key
+)
+from app.services.two_stage_llm import stage1_context_analysis_and_query_builder
+
+# Content phrases keep this query off the rule-based fast path
+LLM_QUERY = "คีย์บอร์ด mechanical สำหรับทำงาน"
+
+LLM_OUTPUT = {
+    "mongoQuery": {"stockQuantity": {"$gt": 0}, "cateName": "Mechanical & Gaming Keyboard"},
+    "processedTerms": {
+        "stage1_filter_used": ["คีย์บอร์ด"],
+        "stage1_inference_used": [],
+        "stage2_content_phrases": ["mechanical", "สำหรับทำงาน"],
+        "stage3_question_phrases": [],
+        "category": "Mechanical & Gaming Keyboard",
+        "used": ["คีย์บอร์ด"],
+        "remaining": ["mechanical", "สำหรับทำงาน"]
+    },
+    "reasoning": "คีย์บอร์ด → Mechanical & Gaming Keyboard",
+    "queryType": "three_stage_analysis"
+}
+
+class CountingCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        message = types.SimpleNamespace(content=json.dumps(LLM_OUTPUT, ensure_ascii=False))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+def run_stage1_twice(store):
+    completions = CountingCompletions()
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    original_get_client = two_stage_llm.get_client
+    original_store = get_stage1_memo()
+    two_stage_llm.get_client = lambda: client
+    set_stage1_memo(store)
+    try:
+        first = asyncio.run(stage1_context_analysis_and_query_builder(LLM_QUERY))
+        # Spelling/spacing variant of the same query
+        second = asyncio.run(stage1_context_analysis_and_query_builder("คีบอร์ด  mechanical สำหรับทำงาน"))
+    finally:
+        two_stage_llm.get_client = original_get_client
+        set_stage1_memo(original_store)
+    return completions.calls, first, second
+
+def test_memory_memo_skips_llm():
+    calls, first, second = run_stage1_twice(MemoryStage1Store())
+    assert calls == 1
+    assert first["stage1Path"] == "llm" and second["stage1Path"] == "memo"
+    assert second["query"] == first["query"]
+    assert second["processedTerms"] == first["processedTerms"]
+    assert second["reasoning"] == first["reasoning"]
+
+def test_sqlite_memo_shared_across_instances():
+    """A second store on the same file (another worker, or after a restart) sees the entry"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "memo.sqlite3")
+        writer = SQLiteStage1Store(path=path)
+        writer.set("key", {"query": {"cateName": "Notebooks"}})
+        reader = SQLiteStage1Store(path=path)
+        assert reader.get("key") == {"query": {"cateName": "Notebooks"}}
+
+        calls, first, second = run_stage1_twice(SQLiteStage1Store(path=path))
+        assert calls == 1 and second["stage1Path"] == "memo"
+
+        for store in (writer, reader):
+            store.close()
+
+def test_sqlite_ttl_and_lru():
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteStage1Store(path=os.path.join(directory, "memo.sqlite3"), max_entries=2, ttl_seconds=60)
+        for key in ("a", "b", "c"):
+            store.set(key, {"key": key})
+        assert store.get("a") is None
+        assert store.get("c") == {"key": "c"}
+
+        store.ttl_seconds = -1
+        store.set("expired", {"key": "expired"})
+        assert store.get("expired") is None
+        store.close()
+
+def test_sqlite_locked_by_another_worker():
+    """A held write lock skips the write instead of blocking; reads still hit"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "memo.sqlite3")
+        store = SQLiteStage1Store(path=path)
+        store.set("key", {"key": "cached"})
+        other_worker = sqlite3.connect(path, isolation_level=None)
+        other_worker.execute("BEGIN IMMEDIATE")
+        try:
+            started = time.perf_counter()
+            store.set("new", {"key": "new"})
+            assert store.get("key") == {"key": "cached"}
+            assert time.perf_counter() - started < 1
+            assert store.stats()["locked"] == 2   # the write and the LRU bump
+        finally:
+            other_worker.execute("ROLLBACK")
+            other_worker.close()
+        assert store.get("new") is None
+        store.close()
+
+def test_sqlite_calls_run_off_the_event_loop():
+    threads = []
+
+    class RecordingStore(MemoryStage1Store):
+        blocking = True
+
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+        def set(self, key, value):
+            threads.append(threading.current_thread())
+            super().set(key, value)
+
+    async def roundtrip(store):
+        await memo_set(store, "key", {"key": "value"})
+        return await memo_get(store, "key")
+
+    assert asyncio.run(roundtrip(RecordingStore())) == {"key": "value"}
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    # In-process stores are used directly
+    assert asyncio.run(roundtrip(MemoryStage1Store())) == {"key": "value"}
+
+def test_metadata_version_in_key():
+    """Changing the catalog metadata changes the memo key"""
+    metadata = get_catalog_metadata()
+    changed = dataclasses.replace(metadata, version="0" * 16)
+    assert stage1_memo_key(LLM_QUERY, metadata) != stage1_memo_key(LLM_QUERY, changed)
+    assert stage1_memo_key(LLM_QUERY, metadata) == stage1_memo_key("คีบอร์ด mechanical  สำหรับทำงาน", metadata)
+
+if __name__ == "__main__":
+    print("🧪 Testing Stage 1 Memo")
+    print("=" * 50)
+    test_memory_memo_skips_llm()
+    test_sqlite_memo_shared_across_instances()
+    test_sqlite_ttl_and_lru()
+    test_sqlite_locked_by_another_worker()
+    test_sqlite_calls_run_off_the_event_loop()
+    test_metadata_version_in_key()
+    print("✅ Stage 1 memo tests passed")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test the compact Stage 1 prompt: candidate categories preselected with the
+local keyword index, compact JSON, and prompt-size metrics
+"""
+
+import asyncio
+import json
+import os
+import sys
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services import metrics, two_stage_llm
+from app.services.catalog_metadata import get_catalog_metadata
+from app.services.stage1_memo import get_stage1_memo, set_stage1_memo
+from app.services.two_stage_llm import (
+    build_stage1_messages,
+    enhanced_contextual_phrase_segmentation,
+    preselect_categories,
+    stage1_context_analysis_and_query_builder
+)
+from test_stage1_memo import LLM_OUTPUT, LLM_QUERY
+
+SAMPLE_INPUTS = [
+    "โน้ตบุ๊ค ASUS งบ 20000",
+    "อยากได้คอมทำงานกราฟิก แนะนำหน่อย",
+    "Ryzen 5 5600G เล่นเกมได้ไหม",
+    "คีย์บอร์ด mechanical สำหรับทำงาน",
+    "ขอของขวัญให้แฟน"
+]
+
+def messages_for(user_input, compact=True):
+    phrase_analysis = enhanced_contextual_phrase_segmentation(user_input)
+    summary = {stage: phrases for stage, phrases in phrase_analysis["stage_assignments"].items()}
+    original = two_stage_llm.STAGE1_COMPACT_PROMPT
+    two_stage_llm.STAGE1_COMPACT_PROMPT = compact
+    try:
+        return build_stage1_messages(user_input, phrase_analysis, summary, get_catalog_metadata())
+    finally:
+        two_stage_llm.STAGE1_COMPACT_PROMPT = original
+
+def prompt_for(user_input, compact=True):
+    return "".join(message["content"] for message in messages_for(user_input, compact))
+
+def candidates_for(user_input):
+    phrase_analysis = enhanced_contextual_phrase_segmentation(user_input)
+    return preselect_categories(user_input, phrase_analysis, get_catalog_metadata())
+
+def test_candidates_come_from_keyword_index():
+    matched, candidates = candidates_for("โน้ตบุ๊ค ASUS งบ 20000")
+    assert "Notebooks" in candidates and matched
+    assert all(category in get_catalog_metadata().category_set for category in candidates)
+
+    _, candidates = candidates_for("Ryzen 5 5600G เล่นเกมได้ไหม")
+    assert "CPU" in candidates
+
+    _, candidates = candidates_for("คีย์บอร์ด mechanical")
+    assert "Mechanical & Gaming Keyboard" in candidates
+
+def test_ascii_keywords_match_whole_words():
+    matched, _ = candidates_for("program ตัดต่อ")
+    assert "ram" not in matched
+    matched, _ = candidates_for("แรม ram 16GB")
+    assert "ram" in matched
+
+def test_no_match_lists_all_categories():
+    _, candidates = candidates_for("ขอของขวัญให้แฟน")
+    assert candidates == []
+    system, user = messages_for("ขอของขวัญให้แฟน")
+    assert json.dumps(list(get_catalog_metadata().categories), ensure_ascii=False, separators=(",", ":")) in system["content"]
+    assert "AVAILABLE CATEGORIES" in user["content"]
+
+def test_compact_prompt_is_much_smaller():
+    metadata = get_catalog_metadata()
+    for user_input in SAMPLE_INPUTS:
+        legacy, compact = prompt_for(user_input, compact=False), prompt_for(user_input)
+        print(f"  {user_input}: {len(legacy):,} -> {len(compact):,} chars")
+        assert metadata.keyword_str in legacy and metadata.mapping_str in legacy
+        assert metadata.keyword_str not in compact and len(compact) < len(legacy) / 2
+        # Instructions and examples are unchanged and close the system prompt
+        system, user = messages_for(user_input)
+        assert system["content"].endswith(two_stage_llm.STAGE1_INSTRUCTIONS)
+        assert f'"{user_input}"' in user["content"]
+
+def test_llm_call_sends_compact_prompt_and_records_size():
+    prompts = []
+
+    async def create(**kwargs):
+        prompts.append(kwargs["messages"])
+        message = types.SimpleNamespace(content=json.dumps(LLM_OUTPUT, ensure_ascii=False))
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    original_client, original_store = two_stage_llm.client, get_stage1_memo()
+    two_stage_llm.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    set_stage1_memo(None)
+    before = metrics.prompt_chars.count(stage="stage1"), metrics.prompt_chars.total(stage="stage1")
+    try:
+        result = asyncio.run(stage1_context_analysis_and_query_builder(LLM_QUERY))
+    finally:
+        two_stage_llm.client = original_client
+        set_stage1_memo(original_store)
+
+    assert result["stage1Path"] == "llm"
+    user = prompts[0][-1]["content"]
+    assert '"Mechanical & Gaming Keyboard"' in user and '"Graphics Cards"' not in user
+    assert metrics.prompt_chars.count(stage="stage1") == before[0] + 1
+    assert metrics.prompt_chars.total(stage="stage1") - before[1] == sum(len(message["content"]) for message in prompts[0])
+
+if __name__ == "__main__":
+    print("🧪 Testing Compact Stage 1 Prompt")
+    print("=" * 50)
+    test_candidates_come_from_keyword_index()
+    test_ascii_keywords_match_whole_words()
+    test_no_match_lists_all_categories()
+    test_compact_prompt_is_much_smaller()
+    test_llm_call_sends_compact_prompt_and_records_size()
+    print("✅ Compact Stage 1 prompt tests passed")
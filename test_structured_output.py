@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test JSON-schema structured output for Stage 1 and the Stage 2 LLM re-rank:
+strict schemas built from the typed models, response_format on the request
+and replies parsed into typed objects instead of fence-stripping
+"""
+
+import asyncio
+import json
+import os
+import sys
+import types
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services import two_stage_llm
+from app.services.llm_schemas import (
+    STAGE1_RESPONSE_FORMAT,
+    STAGE2_RESPONSE_FORMAT,
+    Stage1Output,
+    strict_json_schema
+)
+from app.services.stage1_memo import get_stage1_memo, set_stage1_memo
+from app.services.two_stage_llm import stage1_context_analysis_and_query_builder, stage2_llm_content_analyzer
+from test_generation_streaming import make_product
+from test_stage1_memo import LLM_QUERY
+
+STAGE1_REPLY = {
+    "mongoQuery": {
+        "cateName": {"$in": ["Mechanical & Gaming Keyboard", "Keyboard"]},
+        "salePrice": {"$gte": None, "$gt": None, "$lte": 3000, "$lt": None}
+    },
+    "processedTerms": {
+        "stage1_filter_used": ["คีย์บอร์ด"],
+        "stage1_inference_used": [],
+        "stage2_content_phrases": ["mechanical", "สำหรับทำงาน"],
+        "stage3_question_phrases": [],
+        "category": None,
+        "budget": {"max": 3000, "min": None},
+        "used": ["คีย์บอร์ด"],
+        "remaining": ["mechanical", "สำหรับทำงาน"]
+    },
+    "reasoning": "คีย์บอร์ด → keyboard categories",
+    "queryType": "three_stage_analysis"
+}
+
+def fake_client(content, calls):
+    async def create(**kwargs):
+        calls.append(kwargs)
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+def run_stage1(content, response_format="json_schema"):
+    calls = []
+    original_client, original_store = two_stage_llm.client, get_stage1_memo()
+    original_format = two_stage_llm.LLM_RESPONSE_FORMAT
+    two_stage_llm.client = fake_client(content, calls)
+    two_stage_llm.LLM_RESPONSE_FORMAT = response_format
+    set_stage1_memo(None)
+    try:
+        result = asyncio.run(stage1_context_analysis_and_query_builder(LLM_QUERY))
+    finally:
+        two_stage_llm.client = original_client
+        two_stage_llm.LLM_RESPONSE_FORMAT = original_format
+        set_stage1_memo(original_store)
+    return result, calls[0]
+
+def strict_objects(node):
+    if isinstance(node, dict):
+        if "properties" in node:
+            yield node
+        for value in node.values():
+            yield from strict_objects(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from strict_objects(value)
+
+def test_schemas_are_strict():
+    for response_format in (STAGE1_RESPONSE_FORMAT, STAGE2_RESPONSE_FORMAT):
+        assert response_format["type"] == "json_schema" and response_format["json_schema"]["strict"] is True
+        schema = response_format["json_schema"]["schema"]
+        objects = list(strict_objects(schema))
+        assert objects
+        for node in objects:
+            assert node["required"] == list(node["properties"]) and node["additionalProperties"] is False
+        assert '"default"' not in json.dumps(schema)
+    # Mongo operator names are the schema property names
+    assert set(STAGE1_RESPONSE_FORMAT["json_schema"]["schema"]["$defs"]["PriceRange"]["properties"]) == {"$gte", "$gt", "$lte", "$lt"}
+    assert strict_json_schema(Stage1Output) == STAGE1_RESPONSE_FORMAT["json_schema"]["schema"]
+
+def test_stage1_parses_typed_output():
+    result, call = run_stage1(json.dumps(STAGE1_REPLY, ensure_ascii=False))
+    assert call["response_format"] == STAGE1_RESPONSE_FORMAT
+    assert result["stage1Path"] == "llm"
+    assert result["query"] == {
+        "stockQuantity": {"$gt": 0},
+        "cateName": {"$in": ["Mechanical & Gaming Keyboard", "Keyboard"]},
+        "salePrice": {"$lte": 3000}
+    }
+    # Unset fields are absent, as in the rule-based and fallback results
+    assert "category" not in result["processedTerms"] and result["processedTerms"]["budget"] == {"max": 3000}
+    assert result["stageAssignments"]["stage2_content"] == ["mechanical", "สำหรับทำงาน"]
+    # The schema replaces the JSON example in the prompt
+    assert two_stage_llm.STAGE1_JSON_FORMAT not in call["messages"][0]["content"]
+
+def test_empty_operators_are_dropped():
+    """All-null price ranges and empty $in lists would match nothing"""
+    for mongo_query in (
+        {"cateName": {"$in": []}, "salePrice": {"$gte": None, "$gt": None, "$lte": None, "$lt": None}},
+        {"cateName": "", "salePrice": None}
+    ):
+        reply = dict(STAGE1_REPLY, mongoQuery=mongo_query)
+        reply["processedTerms"] = dict(STAGE1_REPLY["processedTerms"], budget={"max": None, "min": None})
+        result, _ = run_stage1(json.dumps(reply, ensure_ascii=False))
+        assert result["stage1Path"] == "llm"
+        assert result["query"] == {"stockQuantity": {"$gt": 0}}, result["query"]
+        assert "budget" not in result["processedTerms"]
+
+    # Blank names are dropped from a non-empty $in
+    reply = dict(STAGE1_REPLY, mongoQuery={"cateName": {"$in": ["Keyboard", " "]}, "salePrice": None})
+    result, _ = run_stage1(json.dumps(reply, ensure_ascii=False))
+    assert result["query"] == {"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Keyboard"]}}
+
+def test_unparseable_output_falls_back():
+    fenced = "```json\n" + json.dumps(STAGE1_REPLY, ensure_ascii=False) + "\n```"
+    result, _ = run_stage1(fenced)
+    assert result["stage1Path"] == "fallback"
+
+def test_json_object_mode():
+    result, call = run_stage1(json.dumps(STAGE1_REPLY, ensure_ascii=False), response_format="json_object")
+    assert call["response_format"] == {"type": "json_object"}
+    assert call["messages"][0]["content"].endswith(two_stage_llm.STAGE1_JSON_FORMAT)
+    assert result["stage1Path"] == "llm" and result["query"]["salePrice"] == {"$lte": 3000}
+
+def test_stage2_selects_by_typed_index():
+    products = [make_product().model_copy(update={"title": f"Product {index}"}) for index in range(3)]
+    reply = {"selectedProducts": [{"index": 2, "score": 95}, {"index": 7, "score": 90}, {"index": 0, "score": 60}]}
+    calls = []
+    original_client = two_stage_llm.client
+    two_stage_llm.client = fake_client(json.dumps(reply), calls)
+    try:
+        selected = asyncio.run(stage2_llm_content_analyzer("คีย์บอร์ด", {}, products, ["mechanical"], [], {}))
+    finally:
+        two_stage_llm.client = original_client
+    assert calls[0]["response_format"] == STAGE2_RESPONSE_FORMAT
+    assert [product.title for product in selected] == ["Product 2", "Product 0"]
+
+if __name__ == "__main__":
+    print("🧪 Testing Structured LLM Output")
+    print("=" * 50)
+    test_schemas_are_strict()
+    test_stage1_parses_typed_output()
+    test_empty_operators_are_dropped()
+    test_unparseable_output_falls_back()
+    test_json_object_mode()
+    test_stage2_selects_by_typed_index()
+    print("✅ Structured output tests passed")
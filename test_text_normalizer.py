@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Test and benchmark the compiled single-pass Thai normalization engine
+Checks identical output to the previous sequential re.sub implementation on a
+golden corpus, and compares throughput
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services.text_normalizer import ThaiTextNormalizer, default_normalizer, normalize_many
+from app.services.two_stage_llm import normalize_text_advanced
+
+# (input, output of the previous normalize_text_advanced)
+GOLDEN_CORPUS = [
+    ('อยากได้คอมทำงานกราฟิก แนะนำหน่อย', 'อยากได้คอมพิวเตอร์ทำงานการ์ดมอนิเตอร์ แนะนำหน่อย'),
+    ('โน้ตบุ๊ค ASUS งบ 20000', 'โน้ตบุ๊ก asus งบ 20000'),
+    ('การ์ดจอเล่นเกม RTX 4060', 'การ์ดมอนิเตอร์เล่นเกม rtx 4060'),
+    ('เมาส์เกมมิ่งไร้สาย RGB ไม่เกิน 3000', 'เมาส์เกมมิ่งไร้สาย rgb ไม่เกิน 3000'),
+    ('คีย์บอร์ด mechanical สำหรับทำงาน', 'คีย์บอร์ด mechanical สำหรับทำงาน'),
+    ('Ryzen 5 5600G เล่นเกมได้ไหม', 'ryzen 5 5600g เล่นเกมได้ไหม'),
+    ('โน้ตบุ๊ค ASUS งบ 20000 ดีไหม', 'โน้ตบุ๊ก asus งบ 20000 ดีไหม'),
+    ('การ์ดจอ RTX 4060 ใช้งานเป็นอย่างไร', 'การ์ดมอนิเตอร์ rtx 4060 ใช้งานเป็นอย่างไร'),
+    ('การ์จอ RTX 4060 ไม่เกิน 15000', 'การ์ดมอนิเตอร์ rtx 4060 ไม่เกิน 15000'),
+    ('โน๊ตบุ๊คเล่นเกม แนะนำหน่อย', 'โน้ตบุ๊กเล่นเกม แนะนำหน่อย'),
+    ('แนะนำโน้ตบุ๊คเล่นเกม', 'แนะนำโน้ตบุ๊กเล่นเกม'),
+    ('โน๊ตบุ๊คเล่นเกม แนะนำหน่อย', 'โน้ตบุ๊กเล่นเกม แนะนำหน่อย'),
+    ('โนตบุ๊ก Lenovo ราคาไม่เกิน 15,000', 'โน้ตบุ๊ก lenovo ราคาไม่เกิน 15,000'),
+    ('โนคบุค ทำงาน excel', 'โน้ตบุ๊ก ทำงาน excel'),
+    ('laptop for gaming', 'โน้ตบุ๊ก for gaming'),
+    ('Notebook Dell Inspiron', 'โน้ตบุ๊ก dell inspiron'),
+    ('Gaming Laptop RTX 4070', 'gaming โน้ตบุ๊ก rtx 4070'),
+    ('วีจีเอ ราคาถูก', 'การ์ดมอนิเตอร์ ราคาถูก'),
+    ('ฟีจีเอ มือสอง', 'การ์ดมอนิเตอร์ มือสอง'),
+    ('กราฟฟิก การ์ด', 'กราฟฟิก การ์ด'),
+    ('VGA GTX 1660 Super', 'การ์ดมอนิเตอร์ gtx 1660 super'),
+    ('Graphics card 8GB', 'การ์ดมอนิเตอร์ card 8gb'),
+    ('คอมพิวเตอร์ตั้งโต๊ะ งบ 30000', 'คอมพิวเตอร์ตั้งโต๊ะ งบ 30000'),
+    ('คอมพิวตอร์ทำงาน', 'คอมพิวเตอร์ทำงาน'),
+    ('เครื่องคอมเล่นเกม', 'คอมพิวเตอร์คอมพิวเตอร์เล่นเกม'),
+    ('เครื่องพิมพ์ inkjet', 'เครื่องพิมพ์ inkjet'),
+    ('ขอเครื่อง pc ประกอบ', 'ขอคอมพิวเตอร์ คอมพิวเตอร์ ประกอบ'),
+    ('desktop pc ทำงานตัดต่อ', 'คอมตั้งโต๊ะ คอมพิวเตอร์ ทำงานตัดต่อ'),
+    ('PC Gaming งบ 40000', 'คอมพิวเตอร์ gaming งบ 40000'),
+    ('คีบอร์ด ไร้สาย', 'คีย์บอร์ด ไร้สาย'),
+    ('คีบอด RGB', 'คีบอด rgb'),
+    ('เม้าส์ Logitech', 'เมาส์ logitech'),
+    ('ซีพียู Intel Core i5', 'ซีพียู intel core i5'),
+    ('CPU AMD', 'ซีพียู amd'),
+    ('แรม 16GB', 'แรม 16gb'),
+    ('RAM DDR5 32GB', 'แรม ddr5 32gb'),
+    ('memory 8gb', 'แรม 8gb'),
+    ('หูฟัง gaming', 'หูฟัง gaming'),
+    ('Headphone Sony', 'หูฟัง sony'),
+    ('จอ 27 นิ้ว 144Hz', 'มอนิเตอร์ 27 นิ้ว 144hz'),
+    ('จอคอม 24 นิ้ว', 'จอคอมพิวเตอร์ 24 นิ้ว'),
+    ('หน้าจอ 4K', 'หน้ามอนิเตอร์ 4k'),
+    ('Monitor ASUS 27"', 'มอนิเตอร์ asus 27"'),
+    ('โปรเซสเซอร์ Ryzen 7', 'โปรเซสเซอร์ ryzen 7'),
+    ('โปรเซสซอร์ intel', 'ซีพียู intel'),
+    ('การ์ดจอคอม', 'การ์ดจอคอมพิวเตอร์'),
+    ('หาคอมพิวเตอร์ All in One', 'หาคอมพิวเตอร์ all in one'),
+    ('ซื้อ notebook กับ mouse', 'ซื้อ โน้ตบุ๊ก กับ mouse'),
+    ('จอ pc gaming', 'มอนิเตอร์ คอมพิวเตอร์ gaming'),
+    ('เครื่อง\nคอม', 'เครื่อง\nคอมพิวเตอร์'),
+    ('vga กับ ram', 'การ์ดมอนิเตอร์ กับ แรม'),
+    ('ไม่เกิน 25,000 บาท', 'ไม่เกิน 25,000 บาท'),
+    ('', ''),
+    ('   ', '   '),
+    ('abc', 'abc'),
+    ('MacBook Pro M3', 'macbook pro m3'),
+    ('กราฟิวีจีเอ', 'การ์ดมอนิเตอร์าร์ดมอนิเตอร์'),
+    ('กราฟวีจีเอ', 'การ์ดมอนิเตอร์าร์ดมอนิเตอร์'),
+]
+
+def legacy_normalize_text_advanced(text: str) -> str:
+    """Verbatim copy of the previous per-call implementation (benchmark baseline)"""
+    normalized = text.lower()
+    
+    # Notebook variations - comprehensive patterns
+    notebook_patterns = [
+        (r'โน้?[ดต๊]บุ๊?[คก]', 'โน้ตบุ๊ก'),
+        (r'โนต?บุ[๊ค]+', 'โน้ตบุ๊ก'),
+        (r'โน๊ตบุ[๊ค]+', 'โน้ตบุ๊ก'),
+        (r'โนคบุค', 'โน้ตบุ๊ก'),
+        (r'โน้ตบุค', 'โน้ตบุ๊ก'),
+        (r'laptop', 'โน้ตบุ๊ก'),
+        (r'notebook', 'โน้ตบุ๊ก')
+    ]
+    
+    # Graphics card variations
+    graphics_patterns = [
+        (r'การ์[จด]อ', 'การ์ดจอ'),
+        (r'[วฟ]ีจีเอ', 'การ์ดจอ'),
+        (r'กราฟิ?[คกข]', 'การ์ดจอ'),
+        (r'vga', 'การ์ดจอ'),
+        (r'graphics', 'การ์ดจอ')
+    ]
+    
+    # Computer variations - important for Thai context
+    computer_patterns = [
+        (r'คอมพิ?วเ?ตอร์', 'คอมพิวเตอร์'),
+        (r'คอม(?!พิ)', 'คอมพิวเตอร์'),  # "คอม" but not "คอมพิ"
+        (r'เครื่อง(?=.*คอม|.*pc)', 'คอมพิวเตอร์'),
+        (r'desktop', 'คอมตั้งโต๊ะ'),
+        (r'pc', 'คอมพิวเตอร์')
+    ]
+    
+    # Other components
+    component_patterns = [
+        (r'คีบอร์?ด', 'คีย์บอร์ด'),
+        (r'เม้าส์', 'เมาส์'),
+        (r'ซีพียู', 'ซีพียู'),
+        (r'cpu', 'ซีพียู'),
+        (r'แรม', 'แรม'),
+        (r'ram', 'แรม'),
+        (r'memory', 'แรม'),
+        (r'หูฟัง', 'หูฟัง'),
+        (r'headphone', 'หูฟัง'),
+        (r'จอ(?!คอม)', 'มอนิเตอร์'),
+        (r'monitor', 'มอนิเตอร์'),
+        (r'โปรเซส[เซส]อร์', 'ซีพียู')
+    ]
+    
+    # Apply all patterns
+    all_patterns = notebook_patterns + graphics_patterns + computer_patterns + component_patterns
+    
+    for pattern, replacement in all_patterns:
+        normalized = re.sub(pattern, replacement, normalized, flags=re.IGNORECASE)
+    
+    return normalized
+
+
+def test_golden_corpus():
+    """Engine output must be identical to the previous implementation"""
+    for text, expected in GOLDEN_CORPUS:
+        assert default_normalizer.normalize(text) == expected, text
+        assert normalize_text_advanced(text) == expected, text
+        assert legacy_normalize_text_advanced(text) == expected, text
+    print(f"  ✅ {len(GOLDEN_CORPUS)} golden cases identical")
+
+def test_normalize_many():
+    texts = [text for text, _ in GOLDEN_CORPUS]
+    assert normalize_many(texts) == [expected for _, expected in GOLDEN_CORPUS]
+    print("  ✅ normalize_many matches per-text normalization")
+
+def test_randomized_against_legacy():
+    """Random concatenations of rule variants, including adversarial joins"""
+    vocab = [
+        'โน้ตบุ๊ค', 'โนตบุ๊ก', 'โน๊ตบุ๊ค', 'โนคบุค', 'laptop', 'notebook', 'การ์จอ', 'การ์ดจอ', 'วีจีเอ',
+        'กราฟิก', 'กราฟิค', 'vga', 'graphics', 'คอมพิวเตอร์', 'คอม', 'เครื่อง', 'desktop', 'pc', 'คีบอร์ด',
+        'เม้าส์', 'cpu', 'ram', 'memory', 'headphone', 'จอ', 'monitor', 'โปรเซสเซอร์', 'งบ', '20000',
+        ' ', '\n', 'เล่นเกม', 'แนะนำหน่อย', 'RTX 4060', 'ค', 'อม', 'p', 'c', 'am', 'าร์จอ', 'ราฟิก'
+    ]
+    rng = random.Random(42)
+    for _ in range(20000):
+        text = ''.join(rng.choice(vocab) for _ in range(rng.randint(1, 8)))
+        assert default_normalizer.normalize(text) == legacy_normalize_text_advanced(text), repr(text)
+    print("  ✅ 20,000 randomized inputs identical")
+
+def test_randomized_partial_word_joins():
+    """Prefixes and suffixes of rule variants glued to whole variants ("กราฟิ" + "วีจีเอ")"""
+    words = [
+        'โน้ตบุ๊ค', 'โน๊ตบุ๊ค', 'โนคบุค', 'laptop', 'notebook', 'การ์จอ', 'การ์ดจอ', 'วีจีเอ', 'ฟีจีเอ',
+        'กราฟิก', 'กราฟข', 'vga', 'graphics', 'คอมพิวเตอร์', 'คอม', 'เครื่อง', 'desktop', 'pc',
+        'คีบอร์ด', 'เม้าส์', 'cpu', 'ram', 'memory', 'headphone', 'จอ', 'monitor', 'โปรเซสเซอร์'
+    ]
+    pieces = words + [word[:cut] for word in words for cut in range(1, len(word))] + [
+        word[cut:] for word in words for cut in range(1, len(word))
+    ]
+    rng = random.Random(7)
+    for _ in range(30000):
+        text = ''.join(rng.choice(pieces if index % 2 else words) for index in range(rng.randint(2, 5)))
+        assert default_normalizer.normalize(text) == legacy_normalize_text_advanced(text), repr(text)
+    print("  ✅ 30,000 partial-word joins identical")
+
+def benchmark(rounds: int = 200):
+    """Throughput of the previous function vs the compiled engine"""
+    texts = [text for text, _ in GOLDEN_CORPUS]
+    engine = ThaiTextNormalizer()
+    total = rounds * len(texts)
+
+    results = {}
+    for name, fn in [
+        ("legacy (30x re.sub)", lambda: [legacy_normalize_text_advanced(t) for t in texts]),
+        ("compiled sequential", lambda: [engine.normalize_sequential(t) for t in texts]),
+        ("single pass", lambda: [engine.normalize(t) for t in texts]),
+        ("normalize_many", lambda: engine.normalize_many(texts)),
+    ]:
+        fn()
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        elapsed = time.perf_counter() - started
+        results[name] = total / elapsed
+        print(f"  {name:<22} {results[name]:>12,.0f} texts/s  ({elapsed / total * 1e6:.1f} µs/text)")
+
+    print(f"  Speedup: {results['single pass'] / results['legacy (30x re.sub)']:.1f}x")
+
+if __name__ == "__main__":
+    print("🧪 Testing Thai normalization engine")
+    print("=" * 50)
+    test_golden_corpus()
+    test_normalize_many()
+    test_randomized_against_legacy()
+    test_randomized_partial_word_joins()
+
+    print("\n⏱️ Normalization microbenchmark")
+    print("=" * 50)
+    benchmark()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Test the indexed text search paths: the searchTokens trigram index, the
+$text index and the escaped $regex behind them
+"""
+
+import asyncio
+import os
+import sys
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.database import PRODUCT_TEXT_INDEX_NAME, db, ensure_indexes
+from app.services.index_manager import (
+    SEARCH_TOKENS_INDEX_NAME,
+    SEARCH_TOKENS_VERSION,
+    product_search_tokens,
+    search_term_gram
+)
+from app.services import catalog_replica
+from app.services.catalog_replica import CatalogReplica
+from app.services.chatbot import ITStoreChatbot
+
+class FakeProducts:
+    def __init__(self, indexes=None, fail=False, documents=None, fail_writes=False):
+        self.indexes = indexes or {"_id_": {"key": [("_id", 1)]}}
+        self.fail = fail
+        self.fail_writes = fail_writes
+        self.documents = documents or []
+        self.created = []
+        self.find_calls = []
+        self.updates = []
+
+    async def index_information(self):
+        if self.fail:
+            raise RuntimeError("not authorized")
+        return self.indexes
+
+    async def create_index(self, keys, **options):
+        self.created.append((keys, options))
+        return options["name"]
+
+    def find(self, query, projection=None):
+        self.find_calls.append((query, projection))
+        return FakeCursor(self.find_calls, self.documents)
+
+    async def bulk_write(self, requests, ordered=True):
+        if self.fail_writes:
+            raise RuntimeError("not authorized")
+        self.updates.extend(requests)
+
+class FakeCursor:
+    def __init__(self, calls, documents=()):
+        self._calls = calls
+        self._documents = list(documents)
+
+    def sort(self, sort):
+        self._calls.append(("sort", sort))
+        return self
+
+    def limit(self, limit):
+        return self
+
+    async def to_list(self, length=None):
+        return []
+
+    def __aiter__(self):
+        async def documents():
+            for doc in self._documents:
+                yield doc
+        return documents()
+
+class TierCollection:
+    """Answers each fallback tier with canned documents and records the order they start in"""
+
+    def __init__(self, results):
+        self.results = results
+        self.started = []
+
+    def find(self, query, projection=None):
+        if "$text" in query:
+            tier = "text_search"
+        elif "$or" in query:
+            tier = "text_substring"
+        elif "salePrice" in query:
+            tier = "primary"
+        else:
+            tier = "category" if isinstance(query.get("cateName"), str) else "no_budget"
+        self.started.append(tier)
+        return TierCursor(self.results.get(tier, []))
+
+class TierCursor(FakeCursor):
+    def __init__(self, documents):
+        super().__init__([], documents)
+
+    async def to_list(self, length=None):
+        return self._documents
+
+def reset_search_flags():
+    db.text_index_ready = db.search_tokens_ready = False
+
+def fallback_tiers(remaining, text_index=False, search_tokens=False):
+    chatbot = ITStoreChatbot({"products": FakeProducts()})
+    db.text_index_ready, db.search_tokens_ready = text_index, search_tokens
+    try:
+        return dict(chatbot.build_fallback_tiers({"remaining": remaining}, {"stockQuantity": {"$gt": 0}}))
+    finally:
+        reset_search_flags()
+
+def test_ensure_indexes_creates_indexes_and_backfills_tokens():
+    products = FakeProducts(documents=[{"_id": "1", "title": "MSI RTX4060", "description": "การ์ดจอเล่นเกม"}])
+    try:
+        assert asyncio.run(ensure_indexes({"products": products})) is True
+        assert db.text_index_ready and db.search_tokens_ready
+    finally:
+        reset_search_flags()
+    keys, options = next(entry for entry in products.created if entry[1]["name"] == PRODUCT_TEXT_INDEX_NAME)
+    assert keys == [("title", "text"), ("description", "text")]
+    assert options["default_language"] == "none"
+    assert ([("searchTokens", 1)], {"name": SEARCH_TOKENS_INDEX_NAME}) in products.created
+
+    # Only products without current tokens are read
+    backfill_filter, _ = products.find_calls[0]
+    assert backfill_filter == {"searchTokensVersion": {"$ne": SEARCH_TOKENS_VERSION}}
+    (update,) = products.updates
+    tokens = update._doc["$set"]["searchTokens"]
+    assert {"rtx", "406", "060", "การ", "เกม"} <= set(tokens)
+    assert tokens == product_search_tokens({"title": "msi rtx4060", "description": "การ์ดจอเล่นเกม"})
+
+def test_ensure_indexes_reuses_existing_text_index():
+    products = FakeProducts(indexes={
+        "_id_": {"key": [("_id", 1)]},
+        "title_text": {"key": [("_fts", "text"), ("_ftsx", 1)]}
+    })
+    assert asyncio.run(ensure_indexes({"products": products})) is True
+    reset_search_flags()
+    assert PRODUCT_TEXT_INDEX_NAME not in [options["name"] for _, options in products.created]
+
+def test_ensure_indexes_failure_is_not_fatal():
+    assert asyncio.run(ensure_indexes({"products": FakeProducts(fail=True)})) is False
+    assert db.text_index_ready is False and db.search_tokens_ready is False
+
+    # A read-only user can build nothing new but keeps the $text path
+    products = FakeProducts(documents=[{"_id": "1", "title": "HP 15"}], fail_writes=True)
+    try:
+        assert asyncio.run(ensure_indexes({"products": products})) is True
+        assert db.text_index_ready and not db.search_tokens_ready
+    finally:
+        reset_search_flags()
+
+def test_token_tier_covers_substrings_through_the_index():
+    tiers = fallback_tiers(["RTX ทำงานกราฟิก"], text_index=True, search_tokens=True)
+    assert list(tiers) == ["text_search"]
+    query = tiers["text_search"]
+    # One trigram per term selects candidates; null keeps products not backfilled yet
+    assert query["searchTokens"] == {"$in": [search_term_gram("rtx"), search_term_gram("ทำงานกราฟิก"), None]}
+    assert query["$or"][0]["title"]["$regex"] == "RTX|ทำงานกราฟิก"
+
+def test_text_tier_uses_index():
+    tiers = fallback_tiers(["RTX 4060 gaming"], text_index=True)
+    assert tiers["text_search"] == {"stockQuantity": {"$gt": 0}, "$text": {"$search": "RTX 4060 gaming"}}
+    # Substrings the $text index can't match get the escaped $regex tier
+    assert tiers["text_substring"]["$or"][0]["title"]["$regex"] == "RTX|4060|gaming"
+
+def test_thai_terms_skip_text_index():
+    """The $text index never isolates a Thai word inside unspaced Thai text"""
+    tiers = fallback_tiers(["ทำงานกราฟิก"], text_index=True)
+    assert list(tiers) == ["text_search"] and "$text" not in tiers["text_search"]
+
+def test_regex_fallback_is_escaped():
+    """Without an index, user terms are escaped before going into $regex"""
+    pattern = fallback_tiers(["c++ (pro)"])["text_search"]["$or"][0]["title"]["$regex"]
+    assert pattern == r"c\+\+|\(pro\)"
+
+def test_regex_scan_runs_only_after_every_tier_is_empty():
+    """The unindexed text_substring scan stays out of the parallel batch"""
+    processed_terms = {"category": "Graphics Cards", "remaining": ["RTX"]}
+    primary_query = {"stockQuantity": {"$gt": 0}, "cateName": {"$in": ["Graphics Cards"]}, "salePrice": {"$lte": 5000}}
+    card = {"_id": "1", "title": "MSI RTX4060", "description": "", "cateName": "Graphics Cards", "salePrice": 11900, "stockQuantity": 2}
+    db.text_index_ready = True
+    try:
+        found = TierCollection({"category": [card]})
+        products, tier = asyncio.run(ITStoreChatbot({"products": found}).search_fallback_tiers(processed_terms, primary_query))
+        assert tier == "category" and "text_substring" not in found.started
+
+        empty = TierCollection({"text_substring": [card]})
+        products, tier = asyncio.run(ITStoreChatbot({"products": empty}).search_fallback_tiers(processed_terms, primary_query))
+        assert tier == "text_substring" and [product.title for product in products] == ["MSI RTX4060"]
+        assert empty.started[-1] == "text_substring" and empty.started.count("text_substring") == 1
+    finally:
+        reset_search_flags()
+
+def test_text_query_sorted_by_score():
+    products = FakeProducts()
+    chatbot = ITStoreChatbot({"products": products})
+    asyncio.run(chatbot.search_products_precise({"stockQuantity": {"$gt": 0}, "$text": {"$search": "rtx"}}))
+    (_, projection), (_, sort) = products.find_calls
+    assert projection["score"] == {"$meta": "textScore"}
+    assert sort[0] == ("score", {"$meta": "textScore"})
+
+def test_replica_evaluates_text_query():
+    replica = CatalogReplica([
+        {"_id": "1", "title": "ASUS TUF RTX 4060", "description": "", "cateName": "Gaming Notebooks", "stockQuantity": 2, "productView": 5},
+        {"_id": "2", "title": "HP 15", "description": "Intel UHD", "cateName": "Notebooks", "stockQuantity": 2, "productView": 9},
+        {"_id": "3", "title": "MSI RTX4060", "description": "", "cateName": "Graphics Cards", "stockQuantity": 2, "productView": 7}
+    ])
+    found = replica.find({"stockQuantity": {"$gt": 0}, "$text": {"$search": "RTX uhd"}})
+    # Whole-token matching like Mongo's text index
+    assert [doc["_id"] for doc in found] == ["2", "1"]
+
+def test_glued_terms_still_match():
+    """"RTX" finds "MSI RTX4060" and Thai terms match inside unspaced Thai text"""
+    replica = CatalogReplica([
+        {"_id": "1", "title": "MSI RTX4060", "description": "", "cateName": "Graphics Cards", "stockQuantity": 2, "productView": 7},
+        {"_id": "2", "title": "HP 15", "description": "โน้ตบุ๊กสำหรับทำงานกราฟิก", "cateName": "Notebooks", "stockQuantity": 2, "productView": 9}
+    ])
+    original_replica = catalog_replica.get_catalog_replica()
+    catalog_replica.set_catalog_replica(replica)
+    try:
+        chatbot = ITStoreChatbot({"products": FakeProducts()})
+        for flags in ({"search_tokens_ready": True}, {"text_index_ready": True}):
+            for name, value in flags.items():
+                setattr(db, name, value)
+            for remaining, expected in ((["RTX"], "MSI RTX4060"), (["ทำงานกราฟิก"], "HP 15")):
+                products, tier = asyncio.run(chatbot.search_fallback_tiers({"remaining": remaining}, {"stockQuantity": {"$gt": 0}}))
+                assert [product.title for product in products] == [expected], remaining
+                print(f"  ✅ {remaining[0]} → {expected} ({tier})")
+            reset_search_flags()
+    finally:
+        reset_search_flags()
+        catalog_replica.set_catalog_replica(original_replica)
+
+if __name__ == "__main__":
+    print("🧪 Testing Text Index Search")
+    print("=" * 50)
+    test_ensure_indexes_creates_indexes_and_backfills_tokens()
+    test_ensure_indexes_reuses_existing_text_index()
+    test_ensure_indexes_failure_is_not_fatal()
+    test_token_tier_covers_substrings_through_the_index()
+    test_text_tier_uses_index()
+    test_thai_terms_skip_text_index()
+    test_regex_fallback_is_escaped()
+    test_regex_scan_runs_only_after_every_tier_is_empty()
+    test_text_query_sorted_by_score()
+    test_replica_evaluates_text_query()
+    test_glued_terms_still_match()
+    print("✅ Text index search tests passed")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test the two-phase product fetch: slim projection for candidate ranking,
+full documents only for the returned products
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
+
+import bson
+from bson import ObjectId
+
+from app.services import chatbot as chatbot_module
+from app.services.chatbot import PRODUCT_PROJECTION, RANKING_PROJECTION, RANKING_DESCRIPTION_CHARS, ITStoreChatbot
+from app.services.catalog_replica import CatalogReplica, set_catalog_replica
+
+SAMPLE_PATH = os.path.join(os.path.dirname(__file__), 'dashboard-ai-data.products.json')
+CANDIDATES = 50
+RETURNED = 8
+
+def load_documents():
+    with open(SAMPLE_PATH, 'r', encoding='utf-8') as f:
+        documents = json.load(f)
+    for doc in documents:
+        doc["_id"] = ObjectId(doc["_id"]["$oid"])
+    return documents
+
+def project(doc, projection):
+    """Apply the two projection shapes the chatbot sends"""
+    projected = {}
+    for field, spec in projection.items():
+        if field not in doc:
+            continue
+        if isinstance(spec, dict) and "$cond" in spec:
+            _, start, length = spec["$cond"][1]["$substrCP"]
+            value = doc.get(field)
+            projected[field] = value[start:start + length] if isinstance(value, str) else ""
+        elif spec == 1:
+            projected[field] = doc[field]
+    return projected
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    def sort(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    async def to_list(self, length=None):
+        return self._documents
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.finds = []
+
+    def find(self, query, projection=None):
+        self.finds.append((query, projection))
+        if "_id" in query:
+            wanted = set(query["_id"]["$in"])
+            return FakeCursor([project(doc, projection) for doc in self.documents if doc["_id"] in wanted])
+        return FakeCursor([project(doc, projection) for doc in self.documents])
+
+def test_ranking_uses_slim_projection():
+    collection = FakeCollection(load_documents())
+    chatbot = ITStoreChatbot({"products": collection})
+    records = asyncio.run(chatbot.search_products_precise({"stockQuantity": {"$gt": 0}}))
+    (_, projection), = collection.finds
+    assert "images" not in projection and "$substrCP" in projection["description"]["$cond"][1]
+    # Non-string descriptions are projected as "" instead of failing the query
+    assert projection["description"]["$cond"][0] == {"$eq": [{"$type": "$description"}, "string"]}
+    assert records and not any(record.complete for record in records)
+    assert all(len(record.description) <= RANKING_DESCRIPTION_CHARS and record.images == {} for record in records)
+
+def test_hydration_keeps_order_and_drops_missing():
+    documents = load_documents()
+    collection = FakeCollection(documents)
+    chatbot = ITStoreChatbot({"products": collection})
+    slim = asyncio.run(chatbot.search_products_precise({"stockQuantity": {"$gt": 0}}))
+    ranked = list(reversed(slim[:RETURNED]))
+    collection.documents = [doc for doc in documents if str(doc["_id"]) != ranked[1].id]  # deleted meanwhile
+
+    hydrated = asyncio.run(chatbot.hydrate_products(ranked))
+    query, projection = collection.finds[-1]
+    assert projection == PRODUCT_PROJECTION
+    assert all(isinstance(product_id, ObjectId) for product_id in query["_id"]["$in"])
+    assert [record.id for record in hydrated] == [record.id for record in ranked if record.id != ranked[1].id]
+    by_id = {str(doc["_id"]): doc for doc in documents}
+    assert all(record.complete and record.description == by_id[record.id]["description"] for record in hydrated)
+    assert all(record.images for record in hydrated)
+
+def test_hydration_failure_keeps_slim_records():
+    class BrokenCollection(FakeCollection):
+        def find(self, query, projection=None):
+            if "_id" in query:
+                raise RuntimeError("connection reset")
+            return super().find(query, projection)
+
+    chatbot = ITStoreChatbot({"products": BrokenCollection(load_documents())})
+    slim = asyncio.run(chatbot.search_products_precise({"stockQuantity": {"$gt": 0}}))
+    assert asyncio.run(chatbot.hydrate_products(slim[:3])) == slim[:3]
+
+def test_replica_records_skip_hydration():
+    collection = FakeCollection([])
+    set_catalog_replica(CatalogReplica(load_documents()))
+    try:
+        chatbot = ITStoreChatbot({"products": collection})
+        records = asyncio.run(chatbot.search_products_precise({"stockQuantity": {"$gt": 0}}))
+        assert all(record.complete for record in records)
+        asyncio.run(chatbot.hydrate_products(records[:RETURNED]))
+    finally:
+        set_catalog_replica(None)
+    assert collection.finds == []
+
+def test_single_phase_mode():
+    chatbot_module.TWO_PHASE_FETCH_ENABLED = False
+    try:
+        collection = FakeCollection(load_documents())
+        records = asyncio.run(ITStoreChatbot({"products": collection}).search_products_precise({"stockQuantity": {"$gt": 0}}))
+    finally:
+        chatbot_module.TWO_PHASE_FETCH_ENABLED = True
+    assert collection.finds[0][1] == PRODUCT_PROJECTION
+    assert all(record.complete for record in records)
+
+def test_wire_bytes_and_decode_time():
+    documents = load_documents()
+    candidates = [documents[index % len(documents)] for index in range(CANDIDATES)]
+    full = [bson.encode(project(doc, PRODUCT_PROJECTION)) for doc in candidates]
+    slim = [bson.encode(project(doc, RANKING_PROJECTION)) for doc in candidates]
+
+    def decode_ms(batch, rounds=200):
+        payload = b"".join(batch)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            bson.decode_all(payload)
+        return (time.perf_counter() - started) / rounds * 1000
+
+    before = sum(map(len, full))
+    after = sum(map(len, slim)) + sum(map(len, full[:RETURNED]))
+    print(f"  Per candidate: {before / CANDIDATES:.0f} B full vs {sum(map(len, slim)) / CANDIDATES:.0f} B slim")
+    print(f"  Per request ({CANDIDATES} ranked, {RETURNED} hydrated): {before} B -> {after} B")
+    print(f"  Candidate decode: {decode_ms(full):.3f} ms -> {decode_ms(slim):.3f} ms")
+    assert sum(map(len, slim)) * 2 < before
+    assert after < before * 0.6
+
+if __name__ == "__main__":
+    print("🧪 Testing Two-Phase Product Fetch")
+    print("=" * 50)
+    test_ranking_uses_slim_projection()
+    test_hydration_keeps_order_and_drops_missing()
+    test_hydration_failure_keeps_slim_records()
+    test_replica_records_skip_hydration()
+    test_single_phase_mode()
+    test_wire_bytes_and_decode_time()
+    print("✅ Two-phase fetch tests passed")